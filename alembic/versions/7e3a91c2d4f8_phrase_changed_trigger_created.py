@@ -0,0 +1,42 @@
+"""Phrase changed trigger created
+
+Revision ID: 7e3a91c2d4f8
+Revises: 5d0b8a6e3f17
+Create Date: 2026-10-18 14:05:12.418032
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7e3a91c2d4f8'
+down_revision: Union[str, None] = '5d0b8a6e3f17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE FUNCTION notify_phrase_changed() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('phrase_changed', '');
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER phrase_changed
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON phrase
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_phrase_changed()
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER phrase_changed ON phrase")
+    op.execute("DROP FUNCTION notify_phrase_changed()")
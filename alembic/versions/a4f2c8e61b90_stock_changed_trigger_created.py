@@ -0,0 +1,42 @@
+"""Stock changed trigger created
+
+Revision ID: a4f2c8e61b90
+Revises: 7e3a91c2d4f8
+Create Date: 2026-10-18 15:12:40.905117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4f2c8e61b90'
+down_revision: Union[str, None] = '7e3a91c2d4f8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE FUNCTION notify_stock_changed() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('stock_changed', '');
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER stock_changed
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON stock
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_stock_changed()
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER stock_changed ON stock")
+    op.execute("DROP FUNCTION notify_stock_changed()")
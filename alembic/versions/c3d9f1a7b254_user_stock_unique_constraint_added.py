@@ -0,0 +1,55 @@
+"""User stock unique constraint added
+
+Revision ID: c3d9f1a7b254
+Revises: a4f2c8e61b90
+Create Date: 2026-10-18 16:05:12.418305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d9f1a7b254'
+down_revision: Union[str, None] = 'a4f2c8e61b90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Повторные строки одной акции игрока сливаются в первую.
+    op.execute(
+        """
+        UPDATE user_stock
+        SET total_quantity = duplicates.total_quantity
+        FROM (
+            SELECT min(id) AS id, sum(total_quantity) AS total_quantity
+            FROM user_stock
+            GROUP BY user_id, game_id, stock_id
+            HAVING count(*) > 1
+        ) AS duplicates
+        WHERE user_stock.id = duplicates.id
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM user_stock
+        USING user_stock AS kept
+        WHERE user_stock.user_id = kept.user_id
+            AND user_stock.game_id = kept.game_id
+            AND user_stock.stock_id = kept.stock_id
+            AND user_stock.id > kept.id
+        """
+    )
+    op.create_unique_constraint(
+        'user_game_stock_unique_constraint',
+        'user_stock',
+        ['user_id', 'game_id', 'stock_id'],
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint(
+        'user_game_stock_unique_constraint', 'user_stock', type_='unique'
+    )
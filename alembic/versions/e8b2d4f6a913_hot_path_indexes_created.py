@@ -0,0 +1,34 @@
+"""Hot path indexes created
+
+Revision ID: e8b2d4f6a913
+Revises: c3d9f1a7b254
+Create Date: 2026-10-18 16:48:27.602194
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b2d4f6a913'
+down_revision: Union[str, None] = 'c3d9f1a7b254'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_game_active_chat', 'game', ['chat_id', 'id'], unique=False, postgresql_where=sa.text('is_active IS true'))
+    op.create_index('ix_game_user_game', 'game_user', ['game_id'], unique=False)
+    op.create_index('ix_session_game', 'session', ['game_id', 'id'], unique=False)
+    op.create_index('ix_session_stock_session', 'session_stock', ['session_id', 'stock_id'], unique=False)
+    op.create_index('ix_exchange_user', 'exchange', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_exchange_user', table_name='exchange')
+    op.drop_index('ix_session_stock_session', table_name='session_stock')
+    op.drop_index('ix_session_game', table_name='session')
+    op.drop_index('ix_game_user_game', table_name='game_user')
+    op.drop_index('ix_game_active_chat', table_name='game', postgresql_where=sa.text('is_active IS true'))
@@ -0,0 +1,31 @@
+"""Exchange log indexes created
+
+Revision ID: f1c7a3e9d542
+Revises: e8b2d4f6a913
+Create Date: 2026-10-18 17:21:40.815337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c7a3e9d542'
+down_revision: Union[str, None] = 'e8b2d4f6a913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_exchange_time', 'exchange', ['execution_time', 'id'], unique=False)
+    op.create_index('ix_exchange_user_time', 'exchange', ['user_id', 'execution_time', 'id'], unique=False)
+    op.create_index('ix_exchange_session_time', 'exchange', ['session_id', 'execution_time', 'id'], unique=False)
+    op.drop_index('ix_exchange_user', table_name='exchange')
+
+
+def downgrade() -> None:
+    op.create_index('ix_exchange_user', 'exchange', ['user_id'], unique=False)
+    op.drop_index('ix_exchange_session_time', table_name='exchange')
+    op.drop_index('ix_exchange_user_time', table_name='exchange')
+    op.drop_index('ix_exchange_time', table_name='exchange')
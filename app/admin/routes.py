@@ -7,7 +7,14 @@ __all__ = ("setup_routes",)
 
 
 def setup_routes(app: "Application"):
-    from app.admin.views import AdminCurrentView, AdminLoginView
+    from app.admin.views import (
+        AdminCurrentView,
+        AdminLoginView,
+        AdminMetricsView,
+        AdminPhrasesReloadView,
+    )
 
     app.router.add_view("/admin.login", AdminLoginView)
     app.router.add_view("/admin.current", AdminCurrentView)
+    app.router.add_view("/admin.metrics", AdminMetricsView)
+    app.router.add_view("/admin.phrases.reload", AdminPhrasesReloadView)
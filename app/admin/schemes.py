@@ -5,6 +5,8 @@ from app.web.schemes import OkResponseSchema
 __all__ = (
     "AdminResponseSchema",
     "AdminSchema",
+    "PhrasesReloadResponseSchema",
+    "PhrasesReloadSchema",
 )
 
 
@@ -16,3 +18,11 @@ class AdminSchema(Schema):
 
 class AdminResponseSchema(OkResponseSchema):
     data = fields.Nested(AdminSchema)
+
+
+class PhrasesReloadSchema(Schema):
+    phrases = fields.Int()
+
+
+class PhrasesReloadResponseSchema(OkResponseSchema):
+    data = fields.Nested(PhrasesReloadSchema)
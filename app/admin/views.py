@@ -2,15 +2,18 @@ from aiohttp.web_exceptions import HTTPForbidden
 from aiohttp_apispec import docs, request_schema, response_schema
 from aiohttp_session import new_session
 
-from app.admin.schemes import AdminSchema
+from app.admin.schemes import AdminSchema, PhrasesReloadResponseSchema
 from app.store.admin.accessor import validate_password
 from app.web.app import View
 from app.web.mixins import AuthRequiredMixin
+from app.web.schemes import OkResponseSchema
 from app.web.utils import json_response
 
 __all__ = (
     "AdminCurrentView",
     "AdminLoginView",
+    "AdminMetricsView",
+    "AdminPhrasesReloadView",
 )
 
 
@@ -46,3 +49,26 @@ class AdminCurrentView(AuthRequiredMixin, View):
     @response_schema(AdminSchema, 200)
     async def get(self):
         return json_response(data=AdminSchema().dump(self.request.admin))
+
+
+class AdminMetricsView(AuthRequiredMixin, View):
+    @docs(
+        tags=["admin"],
+        summary="Get bot metrics",
+        description="Get runtime counters, gauges and summaries of the bot",
+    )
+    @response_schema(OkResponseSchema, 200)
+    async def get(self):
+        return json_response(data=self.request.app.metrics.snapshot())
+
+
+class AdminPhrasesReloadView(AuthRequiredMixin, View):
+    @docs(
+        tags=["admin"],
+        summary="Reload bot phrases",
+        description="Reload the in-memory phrase catalog from the database",
+    )
+    @response_schema(PhrasesReloadResponseSchema, 200)
+    async def post(self):
+        phrases = await self.request.app.game.phrases.load()
+        return json_response(data={"phrases": phrases})
@@ -10,12 +10,22 @@ class Game:
     DEFAULT_CASH_BALANCE: float = 100.0
 
     def __init__(self, app: "Application"):
+        from app.game.phrases import PhraseCatalog
         from app.game.service import GameService, ReplyMarkupService
+        from app.game.stocks import StockCatalog
 
         self.app = app
         self.service = GameService(app)
         self.reply_markup = ReplyMarkupService(app)
+        self.phrases = PhraseCatalog(app)
+        self.stocks = StockCatalog(app)
 
 
 def setup_game(app: "Application"):
     app.game = Game(app)
+    # Фразы и акции нужны боту с первого обновления: загружаются
+    # самим подключением к базе, до запуска бота.
+    app.database.on_connect.append(app.game.phrases.connect)
+    app.database.on_connect.append(app.game.stocks.connect)
+    app.database.on_disconnect.append(app.game.phrases.disconnect)
+    app.database.on_disconnect.append(app.game.stocks.disconnect)
@@ -0,0 +1,76 @@
+import csv
+import io
+import zlib
+from collections.abc import Sequence
+
+import msgspec
+
+__all__ = ("CONTENT_TYPES", "CSV", "NDJSON", "ExportEncoder")
+
+NDJSON = "ndjson"
+CSV = "csv"
+
+CONTENT_TYPES = {
+    NDJSON: "application/x-ndjson",
+    CSV: "text/csv; charset=utf-8",
+}
+GZIP_CONTENT_TYPE = "application/gzip"
+
+
+class ExportEncoder:
+    """Перевод пачек строк выгрузки в байты NDJSON или CSV.
+
+    Пачки кодируются по одной, поэтому память не зависит от размера
+    выгрузки. При `compress` результат сжимается одним потоком gzip:
+    склеенные куски `header`, `encode` и `finish` образуют один файл.
+    """
+
+    def __init__(
+        self, columns: Sequence[str], export_format: str, compress: bool
+    ):
+        self.columns = tuple(columns)
+        self.export_format = export_format
+        self._json = msgspec.json.Encoder()
+        # wbits=31: заголовок и контрольная сумма gzip.
+        self._compressor = zlib.compressobj(wbits=31) if compress else None
+
+    @property
+    def content_type(self) -> str:
+        if self._compressor is not None:
+            return GZIP_CONTENT_TYPE
+        return CONTENT_TYPES[self.export_format]
+
+    @property
+    def filename(self) -> str:
+        suffix = ".gz" if self._compressor is not None else ""
+        return f"exchanges.{self.export_format}{suffix}"
+
+    def header(self) -> bytes:
+        if self.export_format != CSV:
+            return self._compress(b"")
+        return self._compress(self._csv([self.columns]))
+
+    def encode(self, rows: Sequence[Sequence]) -> bytes:
+        if self.export_format == CSV:
+            return self._compress(self._csv(rows))
+        return self._compress(
+            self._json.encode_lines(
+                [dict(zip(self.columns, row, strict=True)) for row in rows]
+            )
+        )
+
+    def finish(self) -> bytes:
+        if self._compressor is None:
+            return b""
+        return self._compressor.flush()
+
+    @staticmethod
+    def _csv(rows: Sequence[Sequence]) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode()
+
+    def _compress(self, data: bytes) -> bytes:
+        if self._compressor is None:
+            return data
+        return self._compressor.compress(data)
@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import ForeignKey, UniqueConstraint
+from sqlalchemy import ForeignKey, Index, UniqueConstraint, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.store.database.sqlalchemy_base import BaseModel
@@ -37,6 +37,17 @@ class GameModel(BaseModel):
         back_populates="game",
     )
 
+    __table_args__ = (
+        # Поиск активной игры чата, последней по id. Условие записано
+        # так же, как фильтр is_(True) в запросах, иначе индекс не выбирается.
+        Index(
+            "ix_game_active_chat",
+            "chat_id",
+            "id",
+            postgresql_where=text("is_active IS true"),
+        ),
+    )
+
 
 class GameUser(BaseModel):
     __tablename__ = "game_user"
@@ -61,6 +72,7 @@ class GameUser(BaseModel):
         UniqueConstraint(
             "user_id", "game_id", name="user_game_unique_constraint"
         ),
+        Index("ix_game_user_game", "game_id"),
     )
 
 
@@ -84,6 +96,8 @@ class Session(BaseModel):
         back_populates="session",
     )
 
+    __table_args__ = (Index("ix_session_game", "game_id", "id"),)
+
 
 class Stock(BaseModel):
     __tablename__ = "stock"
@@ -127,6 +141,10 @@ class SessionStock(BaseModel):
         "Stock", back_populates="sessions", lazy="joined"
     )
 
+    __table_args__ = (
+        Index("ix_session_stock_session", "session_id", "stock_id"),
+    )
+
 
 class UserStock(BaseModel):
     __tablename__ = "user_stock"
@@ -152,6 +170,15 @@ class UserStock(BaseModel):
         "GameModel", back_populates="stocks"
     )
 
+    __table_args__ = (
+        UniqueConstraint(
+            "user_id",
+            "game_id",
+            "stock_id",
+            name="user_game_stock_unique_constraint",
+        ),
+    )
+
 
 class Phrase(BaseModel):
     __tablename__ = "phrase"
@@ -189,3 +216,10 @@ class Exchange(BaseModel):
     stock: Mapped["Stock"] = relationship(
         "Stock", back_populates="exchanges", lazy="joined"
     )
+
+    # Журнал сделок листается по (execution_time, id) от новых к старым.
+    __table_args__ = (
+        Index("ix_exchange_time", "execution_time", "id"),
+        Index("ix_exchange_user_time", "user_id", "execution_time", "id"),
+        Index("ix_exchange_session_time", "session_id", "execution_time", "id"),
+    )
@@ -0,0 +1,62 @@
+from collections.abc import Mapping
+from logging import getLogger
+from types import MappingProxyType
+from typing import TYPE_CHECKING
+
+from app.store.database.listener import ChangeListener
+
+if TYPE_CHECKING:
+    from app.web.app import Application
+
+__all__ = ("PHRASE_CHANNEL", "PhraseCatalog")
+
+# Канал уведомлений триггера на таблице phrase.
+PHRASE_CHANNEL = "phrase_changed"
+
+
+class PhraseCatalog:
+    """Фразы бота в памяти процесса.
+
+    Загружаются из таблицы phrase при запуске и перечитываются целиком
+    по уведомлению триггера (LISTEN/NOTIFY) или по запросу администратора.
+    Каталог неизменяемый и заменяется новым при перезагрузке, поэтому
+    формирование сообщений не обращается к базе.
+    """
+
+    def __init__(self, app: "Application"):
+        self.app = app
+        self.logger = getLogger("PhraseCatalog")
+        self._phrases: Mapping[str, str] = MappingProxyType({})
+        self._missing: set[str] = set()
+        self._listener = ChangeListener(app, PHRASE_CHANNEL, self.load)
+
+    def get(self, key: str, default: str | None = None) -> str:
+        """Фраза по ключу. Для отсутствующего ключа возвращается
+        `default`, а без него сам ключ, чтобы пропуск был заметен.
+        """
+        phrase = self._phrases.get(key)
+        if phrase is not None:
+            return phrase
+        if key not in self._missing:
+            self._missing.add(key)
+            self.logger.warning("phrase %s is missing", key)
+        return key if default is None else default
+
+    def __len__(self) -> int:
+        return len(self._phrases)
+
+    async def load(self) -> int:
+        """Перечитывание всех фраз из базы."""
+        self._phrases = MappingProxyType(
+            await self.app.store.game.get_phrases()
+        )
+        self._missing.clear()
+        self.logger.info("%d phrases loaded", len(self._phrases))
+        return len(self._phrases)
+
+    async def connect(self, app: "Application") -> None:
+        await self._listener.start()
+        await self.load()
+
+    async def disconnect(self, app: "Application") -> None:
+        await self._listener.stop()
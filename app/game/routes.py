@@ -1,6 +1,12 @@
 from typing import TYPE_CHECKING
 
-from app.game.views import ExchangeListView
+from app.game.views import (
+    ExchangeExportView,
+    ExchangeListView,
+    StockAddView,
+    StockListView,
+    StockUpdateView,
+)
 
 if TYPE_CHECKING:
     from app.web.app import Application
@@ -8,3 +14,7 @@ if TYPE_CHECKING:
 
 def setup_routes(app: "Application"):
     app.router.add_view("/exchange_logs", ExchangeListView)
+    app.router.add_view("/exchange_logs.export", ExchangeExportView)
+    app.router.add_view("/stock.list", StockListView)
+    app.router.add_view("/stock.add", StockAddView)
+    app.router.add_view("/stock.update", StockUpdateView)
@@ -1,4 +1,11 @@
-from marshmallow import Schema, fields
+import base64
+import binascii
+from datetime import datetime
+
+from marshmallow import Schema, ValidationError, fields, validate
+
+from app.game.export import CSV, NDJSON
+from app.telegram_bot import Bot
 
 
 class UserSchema(Schema):
@@ -11,7 +18,18 @@ class UserSchema(Schema):
 
 class StockSchema(Schema):
     id = fields.Int()
-    title = fields.Str()
+    # Название входит в callback_data кнопок и в вопрос бота.
+    title = fields.Str(
+        required=True, validate=validate.Regexp(r"^[^\s_?]{1,32}$")
+    )
+
+
+class StockUpdateSchema(StockSchema):
+    id = fields.Int(required=True)
+
+
+class StockListSchema(Schema):
+    stocks = fields.Nested(StockSchema, many=True)
 
 
 class ExchangeSchema(Schema):
@@ -25,9 +43,51 @@ class ExchangeSchema(Schema):
     execution_time = fields.DateTime()
 
 
+def encode_exchange_cursor(key: tuple[datetime, int]) -> str:
+    """Ключ (execution_time, id) последней сделки страницы в виде
+    непрозрачной строки для следующего запроса.
+    """
+    execution_time, exchange_id = key
+    token = f"{execution_time.isoformat()}|{exchange_id}"
+    return base64.urlsafe_b64encode(token.encode()).decode()
+
+
+class ExchangeCursor(fields.Field):
+    def _serialize(self, value, attr, obj, **kwargs):
+        if value is None:
+            return None
+        return encode_exchange_cursor(value)
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        try:
+            token = base64.urlsafe_b64decode(value.encode()).decode()
+            execution_time, exchange_id = token.split("|")
+            return datetime.fromisoformat(execution_time), int(exchange_id)
+        except (binascii.Error, UnicodeError, ValueError) as e:
+            raise ValidationError("Invalid cursor.") from e
+
+
 class ExchangeListSchema(Schema):
-    users = fields.Nested(ExchangeSchema, many=True)
+    exchanges = fields.Nested(ExchangeSchema, many=True)
+    next_cursor = ExchangeCursor(allow_none=True)
 
 
-class UserIdSchema(Schema):
+class ExchangeListQuerySchema(Schema):
+    chat_id = fields.Str()
+    game_id = fields.Int()
+    session_id = fields.Int()
     user_id = fields.Int()
+    stock_id = fields.Int()
+    action = fields.Str(validate=validate.OneOf([Bot.BUY, Bot.SELL]))
+    # Время сделок хранится без часового пояса.
+    since = fields.NaiveDateTime()
+    until = fields.NaiveDateTime()
+    limit = fields.Int(validate=validate.Range(min=1))
+    cursor = ExchangeCursor()
+
+
+class ExchangeExportQuerySchema(Schema):
+    format = fields.Str(
+        load_default=NDJSON, validate=validate.OneOf([NDJSON, CSV])
+    )
+    gzip = fields.Bool(load_default=False)
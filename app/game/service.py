@@ -1,15 +1,17 @@
 import random
 import re
+from collections.abc import Mapping
 from datetime import datetime
+from functools import cache
 from logging import getLogger
 from typing import TYPE_CHECKING
 
+import msgspec
+
 from app.game.models import (
     GameModel,
     GameUser,
     Session,
-    SessionStock,
-    UserStock,
 )
 from app.telegram_bot.dataclasses import (
     ForceReply,
@@ -25,16 +27,23 @@ __all__ = ("GameService", "ReplyMarkupService")
 
 
 class ReplyMarkupService:
-    """Класс для управления сообщениями и создания инлайн-клавиатур."""
+    """Класс для управления сообщениями и создания инлайн-клавиатур.
+
+    Клавиатуры хранятся уже закодированными в JSON (msgspec.Raw) и
+    вставляются в запрос к Bot API без повторного кодирования.
+    Клавиатура раунда строится заново при смене версии каталога акций.
+    """
 
     def __init__(self, app: "Application"):
         self.app = app
         self.logger = getLogger("ReplyMarkupService")
+        self._keyboards: dict[str, msgspec.Raw] = {}
+        self._session_keyboard: tuple[int, msgspec.Raw] | None = None
 
     @staticmethod
     def _get_reply_markup(
         inline_buttons: list[InlineKeyboardButton],
-    ) -> dict[str, InlineKeyboardMarkup]:
+    ) -> msgspec.Raw:
         """Формирование инлайн-клавиатуры."""
         inline_keyboard_markup = InlineKeyboardMarkup(inline_keyboard=[])
 
@@ -42,30 +51,42 @@ class ReplyMarkupService:
             inline_buttons[i : i + 2] for i in range(0, len(inline_buttons), 2)
         ]
 
-        return {
-            "inline_keyboard": [
-                [button.to_dict() for button in row]
-                for row in inline_keyboard_markup.inline_keyboard
-            ]
-        }
+        return msgspec.Raw(
+            msgspec.json.encode(
+                {
+                    "inline_keyboard": [
+                        [button.to_dict() for button in row]
+                        for row in inline_keyboard_markup.inline_keyboard
+                    ]
+                }
+            )
+        )
 
-    def create_start(
-        self,
-    ) -> dict[str, InlineKeyboardMarkup] | None:
+    def create_start(self) -> msgspec.Raw:
         """Создание кнопки для присоединения к игре."""
-        inline_button = [
-            InlineKeyboardButton(
-                text="Присоединиться к игре ☝",
-                callback_data="Join_the_game",
+        keyboard = self._keyboards.get("start")
+        if keyboard is None:
+            inline_button = [
+                InlineKeyboardButton(
+                    text="Присоединиться к игре ☝",
+                    callback_data="Join_the_game",
+                )
+            ]
+            keyboard = self._keyboards["start"] = self._get_reply_markup(
+                inline_button
             )
-        ]
-        return self._get_reply_markup(inline_button)
+        return keyboard
 
-    async def create_session(self) -> dict[str, InlineKeyboardMarkup] | None:
+    def create_session(self) -> msgspec.Raw:
         """Создание игровых кнопок."""
-        stocks = await self.app.store.game.get_stocks()
+        catalog = self.app.game.stocks
+        if (
+            self._session_keyboard
+            and self._session_keyboard[0] == catalog.version
+        ):
+            return self._session_keyboard[1]
         inline_buttons = []
-        for stock in stocks:
+        for stock in catalog.all():
             inline_buttons.append(
                 InlineKeyboardButton(
                     text=f"Купить {stock.title}",
@@ -84,27 +105,35 @@ class ReplyMarkupService:
                 callback_data=self.app.bot.SKIP,
             )
         )
-        return self._get_reply_markup(inline_buttons)
+        keyboard = self._get_reply_markup(inline_buttons)
+        self._session_keyboard = (catalog.version, keyboard)
+        return keyboard
 
     @staticmethod
-    def get_force_reply_markup(placeholder_text: str) -> dict:
+    @cache
+    def get_force_reply_markup(placeholder_text: str) -> msgspec.Raw:
         """Создание интерфейса ответа пользователя на вопросы от бота."""
         force_reply = ForceReply(
             force_reply=True,
             input_field_placeholder=placeholder_text,
             selective=True,
         )
-        return force_reply.to_dict()
+        return msgspec.Raw(msgspec.json.encode(force_reply.to_dict()))
 
-    def continue_further(self) -> dict[str, InlineKeyboardMarkup]:
+    def continue_further(self) -> msgspec.Raw:
         """Создание кнопки 'Продолжить'."""
-        inline_buttons = [
-            InlineKeyboardButton(
-                text="Продолжить",
-                callback_data=self.app.bot.CONTINUE,
+        keyboard = self._keyboards.get("continue")
+        if keyboard is None:
+            inline_buttons = [
+                InlineKeyboardButton(
+                    text="Продолжить",
+                    callback_data=self.app.bot.CONTINUE,
+                )
+            ]
+            keyboard = self._keyboards["continue"] = self._get_reply_markup(
+                inline_buttons
             )
-        ]
-        return self._get_reply_markup(inline_buttons)
+        return keyboard
 
 
 class GameService:
@@ -127,8 +156,10 @@ class GameService:
         )
         return await self.app.store.game.save_game(game=game)
 
-    async def join_user_to_game(self, game: GameModel, data: From) -> None:
-        """Добавление пользователя в игру."""
+    async def join_user_to_game(self, game: GameModel, data: From) -> bool:
+        """Добавление пользователя в игру.
+        Возвращает False, если пользователь уже участвует в ней.
+        """
         user = await self.app.user.service.create_user(data=data)
         game_user = await self.app.store.game.find_game_user(
             user_id=user.id, game_id=game.id
@@ -140,47 +171,36 @@ class GameService:
                 cash_balance=self.app.game.DEFAULT_CASH_BALANCE,
             )
             await self.app.store.game.save_game_user(game_user=game_user)
+            return True
+        return False
 
     async def deactivate_game(self, game: GameModel) -> None:
         """Деактивация игры."""
         game.is_active = False
         await self.app.store.game.save_game(game)
 
-    async def create_session(self, game_id: int) -> Session:
-        """Создание игровой сессии."""
-        game_session = await self.app.store.game.find_game_session(
-            game_id=game_id
-        )
-        number = game_session.number + 1 if game_session else 1
-        new_game_session = Session(number=number, game_id=game_id)
-        return await self.app.store.game.save_game_session(
-            game_session=new_game_session
-        )
-
-    async def create_session_stock(
-        self, session_id: int, stock_id: int
-    ) -> SessionStock:
-        """Создание записей сессия-акция-прайс."""
-        price = round(random.uniform(10, 50), 2)
-
-        return await self.app.store.game.save_session_stock(
-            session_stock=SessionStock(
-                session_id=session_id, stock_id=stock_id, price=price
-            )
+    async def create_session(
+        self, game_id: int
+    ) -> tuple[Session, dict[int, float]]:
+        """Создание игровой сессии вместе с ценами всех акций на раунд.
+        Возвращает сессию и цены по id акции.
+        """
+        prices = {
+            stock.id: round(random.uniform(10, 50), 2)
+            for stock in self.app.game.stocks.all()
+        }
+        game_session = await self.app.store.game.create_session(
+            game_id=game_id, prices=prices
         )
+        return game_session, prices
 
-    async def get_str_stocks_price(
-        self, chat_id: str, session_id: int | None = None
-    ) -> str | None:
+    def get_str_stocks_price(self, prices: Mapping[int, float]) -> str:
         """Формирование строки с наименованием акций и прайсом."""
-        session_stocks = await self.get_session_stock(chat_id, session_id)
-        if session_stocks is None:
-            return None
         str_stocks_price = ""
-        for session_stock in session_stocks:
-            title = session_stock.stock.title
-            price = session_stock.price
-            str_stocks_price += f"{title}: {price}\n"
+        for stock_id, price in prices.items():
+            stock = self.app.game.stocks.by_id(stock_id)
+            if stock is not None:
+                str_stocks_price += f"{stock.title}: {price}\n"
         return str_stocks_price
 
     async def get_str_user_stock_quantity(
@@ -199,25 +219,6 @@ class GameService:
             str_stock_quantity += f"{title}: {quantity}шт.\n"
         return str_stock_quantity
 
-    async def get_session_stock(
-        self, chat_id: str, session_id: int | None = None
-    ) -> list[SessionStock] | None:
-        """Получение списка записей сессия-акция-прайс."""
-        if session_id is None:
-            game = await self.app.store.game.find_active_game(chat_id=chat_id)
-            if game is None:
-                return None
-            game_session = await self.app.store.game.find_game_session(
-                game_id=game.id
-            )
-            if game_session is None:
-                return None
-            session_id = game_session.id
-
-        return await self.app.store.game.find_session_stocks_by_session_id(
-            session_id=session_id
-        )
-
     @staticmethod
     def get_user_name(username: str, first_name: str) -> str:
         """Получение имени игрока."""
@@ -231,6 +232,16 @@ class GameService:
         )
         return user_telegram_id in players_telegram_ids
 
+    @staticmethod
+    def find_participant(
+        user_telegram_id: int, game: GameModel
+    ) -> GameUser | None:
+        """Участник игры по telegram_id пользователя."""
+        for game_user in game.users:
+            if game_user.user.telegram_id == user_telegram_id:
+                return game_user
+        return None
+
     @staticmethod
     def is_integer(answer: str) -> bool:
         """Проверяет, является ли ответ числом."""
@@ -247,37 +258,3 @@ class GameService:
         if match:
             return match.group(1)
         return None
-
-    async def get_price(self, stock_id: int, game_id: int) -> float:
-        """Получение текущей стоимости акции."""
-        session = await self.app.store.game.find_game_session(game_id=game_id)
-        session_stock = await self.app.store.game.find_session_stock(
-            session_id=session.id, stock_id=stock_id
-        )
-        return session_stock.price
-
-    @staticmethod
-    def decrease_cash_balance(
-        price: float, cash_balance: float, quantity: int
-    ) -> float | None:
-        """Уменьшение денежного баланса игрока."""
-        result = round(cash_balance - quantity * price, 2)
-        return result if result >= 0 else None
-
-    @staticmethod
-    def increase_cash_balance(
-        price: float, cash_balance: float, quantity: int
-    ) -> float | None:
-        """Увеличение денежного баланса игрока."""
-        return round(cash_balance + quantity * price, 2)
-
-    async def create_user_stock(
-        self, user_id: int, game_id: int, stock_id: int, total_quantity: int
-    ) -> None:
-        user_stock = UserStock(
-            user_id=user_id,
-            game_id=game_id,
-            stock_id=stock_id,
-            total_quantity=total_quantity,
-        )
-        await self.app.store.game.save_user_stock(user_stock=user_stock)
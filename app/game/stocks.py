@@ -0,0 +1,62 @@
+from collections.abc import Mapping
+from logging import getLogger
+from types import MappingProxyType
+from typing import TYPE_CHECKING
+
+from app.game.models import Stock
+from app.store.database.listener import ChangeListener
+
+if TYPE_CHECKING:
+    from app.web.app import Application
+
+__all__ = ("STOCK_CHANNEL", "StockCatalog")
+
+# Канал уведомлений триггера на таблице stock.
+STOCK_CHANNEL = "stock_changed"
+
+
+class StockCatalog:
+    """Список акций в памяти процесса с индексами по id и названию.
+
+    Загружается при запуске и перечитывается после изменения таблицы
+    stock (уведомление триггера или запись через админку). Каждая
+    загрузка увеличивает `version`, по ней сбрасываются зависящие от
+    списка акций кэши, например клавиатура раунда.
+    """
+
+    def __init__(self, app: "Application"):
+        self.app = app
+        self.logger = getLogger("StockCatalog")
+        self.version = 0
+        self._stocks: tuple[Stock, ...] = ()
+        self._by_id: Mapping[int, Stock] = MappingProxyType({})
+        self._by_title: Mapping[str, Stock] = MappingProxyType({})
+        self._listener = ChangeListener(app, STOCK_CHANNEL, self.load)
+
+    def all(self) -> tuple[Stock, ...]:
+        return self._stocks
+
+    def by_id(self, stock_id: int) -> Stock | None:
+        return self._by_id.get(stock_id)
+
+    def by_title(self, title: str) -> Stock | None:
+        return self._by_title.get(title)
+
+    async def load(self) -> None:
+        """Перечитывание акций из базы."""
+        stocks = tuple(await self.app.store.game.get_stocks())
+        self._stocks = stocks
+        self._by_id = MappingProxyType({stock.id: stock for stock in stocks})
+        self._by_title = MappingProxyType(
+            {stock.title: stock for stock in stocks}
+        )
+        self.version += 1
+        self.logger.info("%d stocks loaded", len(stocks))
+
+    async def connect(self, app: "Application") -> None:
+        # Подписка раньше загрузки: изменение между ними не потеряется.
+        await self._listener.start()
+        await self.load()
+
+    async def disconnect(self, app: "Application") -> None:
+        await self._listener.stop()
@@ -1,40 +1,183 @@
-from aiohttp_apispec import docs, querystring_schema, response_schema
+import asyncio
+from contextlib import aclosing
 
-from app.game.models import Exchange
-from app.game.schemas import ExchangeListSchema, ExchangeSchema, UserIdSchema
+from aiohttp import hdrs
+from aiohttp.web import StreamResponse
+from aiohttp.web_exceptions import HTTPConflict, HTTPNotFound
+from aiohttp_apispec import (
+    docs,
+    querystring_schema,
+    request_schema,
+    response_schema,
+)
+
+from app.game.export import ExportEncoder
+from app.game.models import Exchange, Stock
+from app.game.schemas import (
+    ExchangeExportQuerySchema,
+    ExchangeListQuerySchema,
+    ExchangeListSchema,
+    ExchangeSchema,
+    StockListSchema,
+    StockSchema,
+    StockUpdateSchema,
+    encode_exchange_cursor,
+)
 from app.web.app import View
 from app.web.mixins import AuthRequiredMixin
+from app.web.serialization import compile_dumper
 from app.web.utils import json_response
 
-__all__ = ("ExchangeListView",)
+__all__ = (
+    "ExchangeExportView",
+    "ExchangeListView",
+    "StockAddView",
+    "StockListView",
+    "StockUpdateView",
+)
+
+dump_stock = compile_dumper(StockSchema)
+dump_exchange = compile_dumper(ExchangeSchema, mapping=True)
 
 
 class ExchangeListView(AuthRequiredMixin, View):
     @docs(
         tags=["exchange"],
         summary="Get exchange logs",
-        description="Get exchange logs from database",
+        description=(
+            "Get exchange logs page by page, newest first. "
+            "Pass next_cursor of the response as cursor for the next page."
+        ),
     )
-    @querystring_schema(UserIdSchema)
+    @querystring_schema(ExchangeListQuerySchema)
     @response_schema(ExchangeListSchema, 200)
     async def get(self):
-        user_id = self.get_user_id_from_query()
-        exchanges = await self.get_exchanges_by_user_id(user_id)
-        raw_exchanges = [
-            ExchangeSchema().dump(exchange) for exchange in exchanges
-        ]
-        return json_response(data={"exchanges": raw_exchanges})
-
-    async def get_exchanges_by_user_id(
-        self, user_id: int | None
-    ) -> list[Exchange]:
-        if user_id is None:
-            return await self.store.game.get_exchanges()
-        return await self.store.game.find_exchanges(user_id=user_id)
-
-    def get_user_id_from_query(self) -> int | None:
-        user_id = self.request.query.get("user_id")
+        query = dict(self.querystring)
+        config = self.request.app.config.game
+        limit = min(
+            query.pop("limit", config.exchange_page_size),
+            config.exchange_page_size_max,
+        )
+        # Лишняя строка показывает, что есть следующая страница.
+        rows = await self.store.game.get_exchange_page(
+            limit=limit + 1, after=query.pop("cursor", None), **query
+        )
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_exchange_cursor(
+                (rows[-1]["execution_time"], rows[-1]["id"])
+            )
+        return json_response(
+            data={
+                "exchanges": [dump_exchange(row) for row in rows],
+                "next_cursor": next_cursor,
+            }
+        )
+
+
+class ExchangeExportView(AuthRequiredMixin, View):
+    @docs(
+        tags=["exchange"],
+        summary="Export exchange logs",
+        description=(
+            "Stream all exchange logs ordered by id as NDJSON or CSV, "
+            "optionally gzip-compressed"
+        ),
+    )
+    @querystring_schema(ExchangeExportQuerySchema)
+    async def get(self):
+        encoder = ExportEncoder(
+            columns=Exchange.__table__.columns.keys(),
+            export_format=self.querystring["format"],
+            compress=self.querystring["gzip"],
+        )
+        response = StreamResponse(
+            headers={
+                hdrs.CONTENT_TYPE: encoder.content_type,
+                hdrs.CONTENT_DISPOSITION: (
+                    f'attachment; filename="{encoder.filename}"'
+                ),
+            }
+        )
+        response.enable_chunked_encoding()
+        await response.prepare(self.request)
+        batches = self.store.game.stream_exchanges(
+            batch_size=self.request.app.config.game.exchange_export_batch
+        )
         try:
-            return int(user_id)
-        except (ValueError, TypeError):
-            return None
+            await response.write(encoder.header())
+            # aclosing закрывает курсор и сразу, если клиент отключился.
+            async with aclosing(batches):
+                async for rows in batches:
+                    # Кодирование и сжатие пачки в потоке не задерживают
+                    # обработку других запросов и обновлений бота.
+                    chunk = await asyncio.to_thread(encoder.encode, rows)
+                    await response.write(chunk)
+            await response.write(encoder.finish())
+        except ConnectionError:
+            # Клиент отключился, дописывать некому.
+            return response
+        except Exception:
+            # Заголовки уже отправлены, и ответ об ошибке клиент
+            # не получит. Соединение обрывается без завершающего
+            # чанка, чтобы обрезанная выгрузка не сошла за полную.
+            self.request.app.logger.exception("exchange export failed")
+            self.request.transport.close()
+            return response
+        await response.write_eof()
+        return response
+
+
+class StockListView(AuthRequiredMixin, View):
+    @docs(
+        tags=["stock"],
+        summary="Get stocks",
+        description="Get stocks from the in-memory catalog",
+    )
+    @response_schema(StockListSchema, 200)
+    async def get(self):
+        stocks = self.request.app.game.stocks.all()
+        return json_response(
+            data={"stocks": [dump_stock(stock) for stock in stocks]}
+        )
+
+
+class StockAddView(AuthRequiredMixin, View):
+    @docs(
+        tags=["stock"],
+        summary="Add stock",
+        description="Add stock and reload the stock catalog",
+    )
+    @request_schema(StockSchema)
+    @response_schema(StockSchema, 200)
+    async def post(self):
+        title = self.data["title"]
+        catalog = self.request.app.game.stocks
+        if catalog.by_title(title) is not None:
+            raise HTTPConflict(reason="stock with this title already exists")
+        stock = await self.store.game.save_stock(Stock(title=title))
+        await catalog.load()
+        return json_response(data=dump_stock(stock))
+
+
+class StockUpdateView(AuthRequiredMixin, View):
+    @docs(
+        tags=["stock"],
+        summary="Rename stock",
+        description="Rename stock and reload the stock catalog",
+    )
+    @request_schema(StockUpdateSchema)
+    @response_schema(StockSchema, 200)
+    async def post(self):
+        catalog = self.request.app.game.stocks
+        existing = catalog.by_title(self.data["title"])
+        if existing is not None and existing.id != self.data["id"]:
+            raise HTTPConflict(reason="stock with this title already exists")
+        stock = await self.store.game.update_stock(
+            stock_id=self.data["id"], title=self.data["title"]
+        )
+        if stock is None:
+            raise HTTPNotFound(reason="stock not found")
+        await catalog.load()
+        return json_response(data=dump_stock(stock))
@@ -11,6 +11,7 @@ if TYPE_CHECKING:
 class Store:
     def __init__(self, app: "Application"):
         from app.store.admin.accessor import AdminAccessor
+        from app.store.bot.accessor import BotAccessor
         from app.store.game.accessor import GameAccessor
         from app.store.user.accessor import UserAccessor
 
@@ -18,10 +19,13 @@ class Store:
         self.admins = AdminAccessor(app)
         self.user = UserAccessor(app)
         self.game = GameAccessor(app)
+        self.bot = BotAccessor(app)
 
 
 def setup_store(app: "Application"):
     app.database = Database(app)
-    app.on_startup.append(app.database.connect)
+    # Бот подключается раньше хранилища, но при запуске
+    # читает из базы сохраненную границу обновлений.
+    app.on_startup.insert(0, app.database.connect)
     app.on_cleanup.append(app.database.disconnect)
     app.store = Store(app)
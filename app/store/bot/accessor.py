@@ -0,0 +1,334 @@
+from collections.abc import Callable
+from datetime import timedelta
+
+from sqlalchemy import delete, func, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.base.base_accessor import BaseAccessor
+from app.telegram_bot.models import (
+    BotInstance,
+    ChatOwner,
+    InboxUpdate,
+    PendingUpdate,
+    ProcessedUpdate,
+    UpdateCheckpoint,
+)
+
+__all__ = ("INBOX_CHANNEL", "BotAccessor")
+
+INBOX_CHANNEL = "bot_inbox"
+
+NOTIFY = text("SELECT pg_notify(:channel, :instance_id)")
+
+
+class BotAccessor(BaseAccessor):
+    async def get_checkpoint(self, bot_id: str) -> UpdateCheckpoint | None:
+        async with AsyncSession(self.app.database.engine) as session:
+            checkpoint = await session.execute(
+                select(UpdateCheckpoint).filter(
+                    UpdateCheckpoint.bot_id == bot_id
+                )
+            )
+            return checkpoint.scalar_one_or_none()
+
+    async def save_checkpoint(
+        self,
+        bot_id: str,
+        update_id: int,
+        processed_ids: list[int],
+        drop_processed: bool = True,
+    ) -> None:
+        """Сохранение границы вместе с удалением записей о принятых
+        обновлениях, которые она покрывает. С `drop_processed` удаляются
+        и отметки об обработке до границы: такие обновления больше
+        не доставляются обработчикам.
+        """
+        stmt = insert(UpdateCheckpoint).values(
+            bot_id=bot_id, update_id=update_id, processed_ids=processed_ids
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UpdateCheckpoint.bot_id],
+            set_={
+                "update_id": stmt.excluded.update_id,
+                "processed_ids": stmt.excluded.processed_ids,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+        async with AsyncSession(self.app.database.engine) as session:
+            await session.execute(stmt)
+            await session.execute(
+                delete(PendingUpdate).filter(
+                    PendingUpdate.bot_id == bot_id,
+                    (PendingUpdate.update_id <= update_id)
+                    | PendingUpdate.update_id.in_(processed_ids),
+                )
+            )
+            if drop_processed:
+                await session.execute(
+                    delete(ProcessedUpdate).filter(
+                        ProcessedUpdate.bot_id == bot_id,
+                        ProcessedUpdate.update_id <= update_id,
+                    )
+                )
+            await session.commit()
+
+    async def mark_processed(self, bot_id: str, update_id: int) -> bool:
+        """Отметка обновления в текущей единице работы. Возвращает
+        False, если отметка уже зафиксирована, то есть обновление
+        обработано раньше.
+        """
+        async with self.app.database.session_scope() as session:
+            marked = await session.execute(
+                insert(ProcessedUpdate)
+                .values(bot_id=bot_id, update_id=update_id)
+                .on_conflict_do_nothing()
+                .returning(ProcessedUpdate.update_id)
+            )
+            return marked.scalar_one_or_none() is not None
+
+    async def get_pending_updates(self, bot_id: str) -> list[bytes]:
+        async with AsyncSession(self.app.database.engine) as session:
+            pending = await session.execute(
+                select(PendingUpdate.payload)
+                .filter(PendingUpdate.bot_id == bot_id)
+                .order_by(PendingUpdate.update_id)
+            )
+            return list(pending.scalars())
+
+    async def save_pending_updates(
+        self, bot_id: str, updates: list[tuple[int, bytes]]
+    ) -> None:
+        """Запись пачки принятых обновлений (id, данные)."""
+        async with AsyncSession(self.app.database.engine) as session:
+            await session.execute(
+                insert(PendingUpdate)
+                .values(
+                    [
+                        {
+                            "bot_id": bot_id,
+                            "update_id": update_id,
+                            "payload": payload,
+                        }
+                        for update_id, payload in updates
+                    ]
+                )
+                .on_conflict_do_nothing()
+            )
+            await session.commit()
+
+    async def heartbeat(self, instance_id: str) -> None:
+        stmt = insert(BotInstance).values(instance_id=instance_id)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[BotInstance.instance_id],
+            set_={"heartbeat_at": func.now()},
+        )
+        async with AsyncSession(self.app.database.engine) as session:
+            await session.execute(stmt)
+            await session.commit()
+
+    async def get_alive_instances(self, ttl: float) -> list[str]:
+        async with AsyncSession(self.app.database.engine) as session:
+            instances = await session.execute(
+                select(BotInstance.instance_id)
+                .filter(
+                    BotInstance.heartbeat_at
+                    >= func.now() - timedelta(seconds=ttl)
+                )
+                .order_by(BotInstance.instance_id)
+            )
+            return list(instances.scalars())
+
+    async def remove_instance(self, instance_id: str) -> None:
+        """Удаление экземпляра из списка живых. Невыполненные
+        обновления экземпляра снова становятся доступны, лидер
+        передаст их чаты другим экземплярам.
+        """
+        async with AsyncSession(self.app.database.engine) as session:
+            await session.execute(
+                delete(BotInstance).filter(
+                    BotInstance.instance_id == instance_id
+                )
+            )
+            await session.execute(
+                update(InboxUpdate)
+                .filter(InboxUpdate.instance_id == instance_id)
+                .values(claimed_at=None)
+            )
+            await session.commit()
+
+    async def release_claims(self, instance_id: str) -> None:
+        async with AsyncSession(self.app.database.engine) as session:
+            await session.execute(
+                update(InboxUpdate)
+                .filter(InboxUpdate.instance_id == instance_id)
+                .values(claimed_at=None)
+            )
+            await session.commit()
+
+    async def save_inbox(
+        self,
+        updates: list[tuple[int, str | None, bytes]],
+        instance_id: str,
+        choose_owner: Callable[[str], str],
+    ) -> int:
+        """Запись пачки обновлений (id, чат, данные) во входящие.
+
+        Новому чату назначается владелец `choose_owner(chat_id)`,
+        дальше все обновления чата получает он. Обновления без чата
+        достаются `instance_id`. Владельцы получают уведомление
+        в той же транзакции. Возвращает число новых записей.
+        """
+        chat_ids = {chat_id for _, chat_id, _ in updates if chat_id}
+        async with AsyncSession(self.app.database.engine) as session:
+            if chat_ids:
+                await session.execute(
+                    insert(ChatOwner)
+                    .values(
+                        [
+                            {
+                                "chat_id": chat_id,
+                                "instance_id": choose_owner(chat_id),
+                            }
+                            for chat_id in sorted(chat_ids)
+                        ]
+                    )
+                    .on_conflict_do_nothing(index_elements=[ChatOwner.chat_id])
+                )
+                owners = dict(
+                    (
+                        await session.execute(
+                            select(
+                                ChatOwner.chat_id, ChatOwner.instance_id
+                            ).filter(ChatOwner.chat_id.in_(chat_ids))
+                        )
+                    ).all()
+                )
+            else:
+                owners = {}
+            rows = [
+                {
+                    "update_id": update_id,
+                    "chat_id": chat_id,
+                    "instance_id": owners.get(chat_id, instance_id),
+                    "payload": payload,
+                }
+                for update_id, chat_id, payload in updates
+            ]
+            inserted = await session.execute(
+                insert(InboxUpdate)
+                .values(rows)
+                .on_conflict_do_nothing(index_elements=[InboxUpdate.update_id])
+                .returning(InboxUpdate.instance_id)
+            )
+            recipients = list(inserted.scalars())
+            for recipient in sorted(set(recipients)):
+                await session.execute(
+                    NOTIFY,
+                    {"channel": INBOX_CHANNEL, "instance_id": recipient},
+                )
+            await session.commit()
+            return len(recipients)
+
+    async def claim_inbox(self, instance_id: str, limit: int) -> list[bytes]:
+        """Захват до `limit` невыполненных обновлений экземпляра,
+        возвращает их данные в порядке id. Захваченные строки
+        пропускаются параллельными запросами (SKIP LOCKED).
+        """
+        available = (
+            select(InboxUpdate.update_id)
+            .filter(
+                InboxUpdate.instance_id == instance_id,
+                InboxUpdate.claimed_at.is_(None),
+            )
+            .order_by(InboxUpdate.update_id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        async with AsyncSession(self.app.database.engine) as session:
+            claimed = await session.execute(
+                update(InboxUpdate)
+                .filter(InboxUpdate.update_id.in_(available))
+                .values(claimed_at=func.now())
+                .returning(InboxUpdate.update_id, InboxUpdate.payload)
+            )
+            rows = sorted(claimed.all())
+            await session.commit()
+            return [payload for _, payload in rows]
+
+    async def delete_inbox(self, bot_id: str, update_ids: list[int]) -> None:
+        """Удаление обработанных обновлений из входящих вместе
+        с отметками об обработке: больше их никто не захватит.
+        """
+        async with AsyncSession(self.app.database.engine) as session:
+            await session.execute(
+                delete(InboxUpdate).filter(
+                    InboxUpdate.update_id.in_(update_ids)
+                )
+            )
+            await session.execute(
+                delete(ProcessedUpdate).filter(
+                    ProcessedUpdate.bot_id == bot_id,
+                    ProcessedUpdate.update_id.in_(update_ids),
+                )
+            )
+            await session.commit()
+
+    async def reassign_orphans(
+        self, leader_id: str, ttl: float, choose_owner: Callable[[str], str]
+    ) -> int:
+        """Передача чатов выбывших экземпляров живым.
+
+        Экземпляры без сигнала дольше `ttl` секунд удаляются. Каждый
+        чат без живого владельца получает нового `choose_owner(chat_id)`
+        вместе с невыполненными обновлениями, в том числе захваченными
+        выбывшим экземпляром. Обновления без чата переходят лидеру.
+        Возвращает число переданных чатов.
+        """
+        async with AsyncSession(self.app.database.engine) as session:
+            await session.execute(
+                delete(BotInstance).filter(
+                    BotInstance.heartbeat_at
+                    < func.now() - timedelta(seconds=ttl)
+                )
+            )
+            alive = select(BotInstance.instance_id)
+            orphans = await session.execute(
+                select(ChatOwner.chat_id).filter(
+                    ChatOwner.instance_id.not_in(alive)
+                )
+            )
+            chat_ids = list(orphans.scalars())
+            if chat_ids:
+                await session.execute(
+                    update(ChatOwner),
+                    [
+                        {
+                            "chat_id": chat_id,
+                            "instance_id": choose_owner(chat_id),
+                        }
+                        for chat_id in chat_ids
+                    ],
+                )
+            orphaned = InboxUpdate.instance_id.not_in(alive)
+            moved = await session.execute(
+                update(InboxUpdate)
+                .filter(orphaned, InboxUpdate.chat_id == ChatOwner.chat_id)
+                .values(instance_id=ChatOwner.instance_id, claimed_at=None)
+                .returning(InboxUpdate.instance_id)
+            )
+            recipients = set(moved.scalars())
+            moved = await session.execute(
+                update(InboxUpdate)
+                .filter(orphaned, InboxUpdate.chat_id.is_(None))
+                .values(instance_id=leader_id, claimed_at=None)
+                .returning(InboxUpdate.instance_id)
+            )
+            recipients.update(moved.scalars())
+            for recipient in sorted(recipients):
+                await session.execute(
+                    NOTIFY,
+                    {"channel": INBOX_CHANNEL, "instance_id": recipient},
+                )
+            await session.commit()
+            return len(chat_ids)
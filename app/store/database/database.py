@@ -1,21 +1,63 @@
+import time
+from asyncio import gather
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from contextvars import Context, ContextVar, copy_context
 from typing import TYPE_CHECKING, Any
+from uuid import uuid4
 
 from sqlalchemy import URL
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import (
+    AsyncConnection,
     AsyncEngine,
     AsyncSession,
     async_sessionmaker,
     create_async_engine,
 )
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from app.store.database.sqlalchemy_base import BaseModel
+from app.web.metrics import Counter, Summary
 
 if TYPE_CHECKING:
     from app.web.app import Application
 
 __all__ = ("Database",)
 
+# Сессия единицы работы, открытой в текущей задаче.
+_current_session: ContextVar[AsyncSession | None] = ContextVar(
+    "current_session", default=None
+)
+# Ключ session.info со списком вызовов после фиксации.
+AFTER_COMMIT = "after_commit"
+
+
+def _statement_name() -> str:
+    return f"__asyncpg_{uuid4()}__"
+
+
+class MeteredPool(AsyncAdaptedQueuePool):
+    """Пул соединений, замеряющий ожидание свободного соединения
+    (вместе с открытием нового) и отказы по pool_timeout.
+    """
+
+    wait_time: Summary | None = None
+    timeouts: Counter | None = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            if self.timeouts is not None:
+                self.timeouts.inc()
+            raise
+        finally:
+            if self.wait_time is not None:
+                self.wait_time.observe(time.perf_counter() - started)
+
 
 class Database:
     def __init__(self, app: "Application") -> None:
@@ -24,23 +66,130 @@ class Database:
         self.engine: AsyncEngine | None = None
         self._db: type[DeclarativeBase] = BaseModel
         self.session: async_sessionmaker[AsyncSession] | None = None
+        # Вызываются по порядку сразу после подключения и перед
+        # отключением, например загрузка каталогов из базы.
+        self.on_connect: list[Callable[["Application"], Awaitable[None]]] = []
+        self.on_disconnect: list[
+            Callable[["Application"], Awaitable[None]]
+        ] = []
 
     async def connect(self, *args: Any, **kwargs: Any) -> None:
+        config = self.app.config.database
         self.engine = create_async_engine(
             URL.create(
                 drivername="postgresql+asyncpg",
-                username=self.app.config.database.user,
-                password=self.app.config.database.password,
-                host=self.app.config.database.host,
-                database=self.app.config.database.database,
+                username=config.user,
+                password=config.password,
+                host=config.host,
+                port=config.port,
+                database=config.database,
             ),
-            echo=True,
+            echo=config.echo,
+            poolclass=MeteredPool,
+            pool_size=config.pool_size,
+            max_overflow=config.max_overflow,
+            pool_timeout=config.pool_timeout,
+            pool_recycle=config.pool_recycle,
+            pool_pre_ping=config.pool_pre_ping,
+            connect_args=self._connect_args(),
         )
         self.session = async_sessionmaker(
             self.engine, class_=AsyncSession, expire_on_commit=False
         )
+        self._setup_metrics()
+        await self._prewarm(min(config.pool_prewarm, config.pool_size))
+        for callback in self.on_connect:
+            await callback(self.app)
+
+    def _connect_args(self) -> dict[str, Any]:
+        config = self.app.config.database
+        if not config.pgbouncer:
+            return {
+                "prepared_statement_cache_size": config.statement_cache_size,
+            }
+        # pgbouncer в режиме транзакций отдает соседние транзакции разным
+        # соединениям сервера. Подготовленный запрос из кэша может не
+        # найтись на другом соединении, а имя по порядковому номеру уже
+        # быть занято там запросом другого клиента. Поэтому оба кэша
+        # (SQLAlchemy и asyncpg) выключены, а имена запросов уникальны.
+        return {
+            "prepared_statement_cache_size": 0,
+            "statement_cache_size": 0,
+            "prepared_statement_name_func": _statement_name,
+        }
+
+    def _setup_metrics(self) -> None:
+        metrics = self.app.metrics
+        pool = self.engine.sync_engine.pool
+        pool.wait_time = metrics.summary("db.pool.checkout_wait")
+        pool.timeouts = metrics.counter("db.pool.timeouts")
+        capacity = pool.size() + self.app.config.database.max_overflow
+        metrics.gauge("db.pool.size", pool.size)
+        metrics.gauge("db.pool.checked_out", pool.checkedout)
+        metrics.gauge(
+            "db.pool.utilisation",
+            lambda: round(pool.checkedout() / max(capacity, 1), 3),
+        )
+
+    async def _prewarm(self, count: int) -> None:
+        """Открытие соединений заранее, чтобы первые обновления после
+        запуска не ждали подключения к базе.
+        """
+
+        async def open_connection() -> AsyncConnection:
+            return await self.engine.connect()
+
+        connections = await gather(*(open_connection() for _ in range(count)))
+        for connection in connections:
+            await connection.close()
+
+    @asynccontextmanager
+    async def session_scope(self) -> AsyncIterator[AsyncSession]:
+        """Единица работы: одно соединение и одна транзакция.
+
+        Вложенные вызовы в той же задаче получают уже открытую сессию,
+        фиксирует изменения только внешний вызов при выходе без ошибки.
+        Поэтому внутри блока изменения нужно сбрасывать в базу через
+        flush, а не commit.
+        """
+        session = _current_session.get()
+        if session is not None:
+            yield session
+            return
+        async with self.session() as session:
+            token = _current_session.set(session)
+            try:
+                yield session
+                await session.commit()
+            finally:
+                _current_session.reset(token)
+            for callback in session.info.pop(AFTER_COMMIT, ()):
+                callback()
+
+    def after_commit(self, callback: Callable[[], None]) -> None:
+        """Вызов после фиксации открытой в задаче единицы работы.
+        При откате вызов отбрасывается, вне единицы работы выполняется
+        сразу.
+        """
+        session = _current_session.get()
+        if session is None:
+            callback()
+        else:
+            session.info.setdefault(AFTER_COMMIT, []).append(callback)
+
+    @staticmethod
+    def detached_context() -> Context:
+        """Копия контекста текущей задачи без открытой единицы работы,
+        для задач, которые переживут ее.
+        """
+        context = copy_context()
+        context.run(_current_session.set, None)
+        return context
 
     async def disconnect(self, *args: Any, **kwargs: Any) -> None:
+        if self.engine:
+            for callback in self.on_disconnect:
+                await callback(self.app)
         if self.session:
             async with self.session() as session:
                 await session.close()
@@ -0,0 +1,104 @@
+from asyncio import Event, Task, create_task, gather, sleep
+from collections.abc import Awaitable, Callable
+from logging import getLogger
+from typing import TYPE_CHECKING
+
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+if TYPE_CHECKING:
+    from app.web.app import Application
+
+__all__ = ("ChangeListener",)
+
+RECONNECT_DELAY = 1
+
+
+class ChangeListener:
+    """Подписка на канал Postgres (LISTEN) на отдельном соединении.
+
+    `on_change` вызывается на каждое уведомление, а также после
+    каждого переподключения: уведомления, пришедшие без подписки,
+    потеряны. Оборванное соединение восстанавливается. Первую загрузку
+    владелец выполняет сам после `start`, когда подписка уже есть.
+    """
+
+    def __init__(
+        self,
+        app: "Application",
+        channel: str,
+        on_change: Callable[[], Awaitable[None]],
+    ) -> None:
+        self.app = app
+        self.logger = getLogger(f"listener {channel}")
+        self.channel = channel
+        self.on_change = on_change
+        self._connection: AsyncConnection | None = None
+        self._task: Task | None = None
+        self._changes: set[Task] = set()
+
+    def _notify(self, connection, pid, channel, payload) -> None:
+        task = create_task(self._handle_change())
+        self._changes.add(task)
+        task.add_done_callback(self._changes.discard)
+
+    async def _handle_change(self) -> None:
+        try:
+            await self.on_change()
+        except Exception:
+            self.logger.exception("change handling failed")
+
+    async def _subscribe(self) -> Event:
+        """Подключение и подписка, возвращает событие обрыва соединения."""
+        closed = Event()
+        self._connection = await self.app.database.engine.connect()
+        raw = await self._connection.get_raw_connection()
+        connection = raw.driver_connection
+        connection.add_termination_listener(
+            lambda _, closed=closed: closed.set()
+        )
+        await connection.add_listener(self.channel, self._notify)
+        return closed
+
+    async def _listen(self, closed: Event | None) -> None:
+        while True:
+            if closed is not None:
+                await closed.wait()
+                self.logger.warning("listener disconnected")
+                await self._close()
+            await sleep(RECONNECT_DELAY)
+            try:
+                closed = await self._subscribe()
+                await self.on_change()
+            except Exception:
+                self.logger.exception("listener failed")
+                await self._close()
+                closed = None
+
+    async def _close(self) -> None:
+        if self._connection is None:
+            return
+        connection, self._connection = self._connection, None
+        try:
+            await connection.invalidate()
+            await connection.close()
+        except Exception:
+            self.logger.exception("listener close failed")
+
+    async def start(self) -> None:
+        closed = None
+        try:
+            closed = await self._subscribe()
+        except Exception:
+            # Подписка повторится в фоне, с перезагрузкой после нее.
+            self.logger.exception("listener failed")
+            await self._close()
+        self._task = create_task(self._listen(closed))
+
+    async def stop(self) -> None:
+        tasks = [*self._changes]
+        if self._task:
+            tasks.append(self._task)
+        for task in tasks:
+            task.cancel()
+        await gather(*tasks, return_exceptions=True)
+        await self._close()
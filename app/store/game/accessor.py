@@ -1,6 +1,20 @@
-import sqlalchemy
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+from collections.abc import AsyncIterator, Sequence
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import (
+    Numeric,
+    and_,
+    cast,
+    func,
+    literal,
+    select,
+    true,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Row, RowMapping
 from sqlalchemy.orm import selectinload
 
 from app.base.base_accessor import BaseAccessor
@@ -14,20 +28,49 @@ from app.game.models import (
     Stock,
     UserStock,
 )
+from app.telegram_bot import Bot
+from app.user.models import UserModel
+
+__all__ = ("GameAccessor", "Standing", "Trade")
+
+
+@dataclass(slots=True)
+class Standing:
+    """Положение игрока после раунда."""
+
+    user_id: int
+    username: str | None
+    first_name: str | None
+    cash_balance: float
+    holdings_value: float
+    net_worth: float
+    rank: int
+
+
+@dataclass(slots=True)
+class Trade:
+    """Итог сделки. Если сделка отклонена (не хватило денег или
+    акций), `cash_balance` и `total_quantity` равны None.
+    """
 
-__all__ = ("GameAccessor",)
+    price: float
+    cash_balance: float | None
+    total_quantity: int | None
+
+    @property
+    def executed(self) -> bool:
+        return self.cash_balance is not None
 
 
 class GameAccessor(BaseAccessor):
     async def save_game(self, game: GameModel) -> GameModel:
-        async with AsyncSession(self.app.database.engine) as session:
+        async with self.app.database.session_scope() as session:
             session.add(game)
-            await session.commit()
-            await session.refresh(game)
+            await session.flush()
             return game
 
     async def find_active_game(self, chat_id: str) -> GameModel | None:
-        async with AsyncSession(self.app.database.engine) as session:
+        async with self.app.database.session_scope() as session:
             game = await session.execute(
                 select(GameModel)
                 .filter(
@@ -42,16 +85,15 @@ class GameAccessor(BaseAccessor):
             return game.scalar_one_or_none()
 
     async def save_game_user(self, game_user: GameUser) -> GameUser:
-        async with AsyncSession(self.app.database.engine) as session:
+        async with self.app.database.session_scope() as session:
             session.add(game_user)
-            await session.commit()
-            await session.refresh(game_user)
+            await session.flush()
             return game_user
 
     async def find_game_user(
         self, game_id: int, user_id: int
     ) -> GameUser | None:
-        async with AsyncSession(self.app.database.engine) as session:
+        async with self.app.database.session_scope() as session:
             game_user = await session.execute(
                 select(GameUser).filter(
                     GameUser.game_id == game_id, GameUser.user_id == user_id
@@ -60,7 +102,7 @@ class GameAccessor(BaseAccessor):
             return game_user.scalar_one_or_none()
 
     async def find_game_session(self, game_id: int) -> Session | None:
-        async with AsyncSession(self.app.database.engine) as session:
+        async with self.app.database.session_scope() as session:
             result = await session.execute(
                 select(Session)
                 .filter(Session.game_id == game_id)
@@ -70,70 +112,47 @@ class GameAccessor(BaseAccessor):
             return result.scalar_one_or_none()
 
     async def save_game_session(self, game_session: Session) -> Session:
-        async with AsyncSession(self.app.database.engine) as session:
+        async with self.app.database.session_scope() as session:
             session.add(game_session)
-            await session.commit()
-            await session.refresh(game_session)
+            await session.flush()
             return game_session
 
-    async def save_session_stock(
-        self, session_stock: SessionStock
-    ) -> SessionStock:
-        async with AsyncSession(self.app.database.engine) as session:
-            session.add(session_stock)
-            await session.commit()
-            await session.refresh(session_stock)
-            return session_stock
-
-    async def find_session_stocks_by_session_id(
-        self, session_id: int
-    ) -> list[SessionStock]:
-        async with AsyncSession(self.app.database.engine) as session:
-            result = await session.execute(
-                select(SessionStock).filter(
-                    SessionStock.session_id == session_id
-                ),
-            )
-            return result.scalars().all()
-
-    async def find_stock_prices(self, session_id: int) -> {}:
-        async with AsyncSession(self.app.database.engine) as session:
-            query = sqlalchemy.text(
-                "SELECT stock_id, price FROM session_stock "
-                "WHERE session_id = :session_id"
-            )
-            result_set = await session.execute(
-                query, {"session_id": session_id}
+    async def create_session(
+        self, game_id: int, prices: dict[int, float]
+    ) -> Session:
+        """Создание следующей по номеру сессии игры и цен акций на нее
+        (id акции -> цена) двумя запросами в одной транзакции.
+        """
+        number = (
+            select(func.coalesce(func.max(Session.number), 0) + 1)
+            .filter(Session.game_id == game_id)
+            .scalar_subquery()
+        )
+        async with self.app.database.session_scope() as session:
+            game_session = await session.scalar(
+                insert(Session)
+                .values(game_id=game_id, number=number)
+                .returning(Session)
             )
-
-            return {
-                _item.stock_id: _item.price
-                for _item in result_set.mappings().all()
-            }
-
-    async def find_session_stock(
-        self, session_id: int, stock_id: int
-    ) -> SessionStock | None:
-        async with AsyncSession(self.app.database.engine) as session:
-            session_stock = await session.execute(
-                select(SessionStock).filter(
-                    SessionStock.session_id == session_id,
-                    SessionStock.stock_id == stock_id,
+            if prices:
+                await session.execute(
+                    insert(SessionStock).values(
+                        [
+                            {
+                                "session_id": game_session.id,
+                                "stock_id": stock_id,
+                                "price": price,
+                            }
+                            for stock_id, price in prices.items()
+                        ]
+                    )
                 )
-            )
-            return session_stock.scalar_one_or_none()
-
-    async def save_user_stock(self, user_stock: UserStock) -> UserStock:
-        async with AsyncSession(self.app.database.engine) as session:
-            session.add(user_stock)
-            await session.commit()
-            await session.refresh(user_stock)
-            return user_stock
+            return game_session
 
     async def find_user_stock(
         self, game_id: int, user_id: int, stock_id: int
     ) -> UserStock | None:
-        async with AsyncSession(self.app.database.engine) as session:
+        async with self.app.database.session_scope() as session:
             user_stock = await session.execute(
                 select(UserStock).filter(
                     UserStock.user_id == user_id,
@@ -143,17 +162,55 @@ class GameAccessor(BaseAccessor):
             )
             return user_stock.scalar_one_or_none()
 
-    async def get_users_stocks(self, game_id: int) -> list[UserStock]:
-        async with AsyncSession(self.app.database.engine) as session:
-            users_stocks = await session.execute(
-                select(UserStock).filter(UserStock.game_id == game_id)
+    async def get_standings(
+        self, game_id: int, session_id: int
+    ) -> list[Standing]:
+        """Деньги, стоимость акций по ценам сессии, общий капитал и место
+        каждого игрока активной игры одним агрегирующим запросом,
+        по убыванию капитала. Для завершенной игры список пуст.
+        """
+        holdings_value = func.coalesce(
+            func.sum(UserStock.total_quantity * SessionStock.price), 0.0
+        )
+        net_worth = GameUser.cash_balance + holdings_value
+        stmt = (
+            select(
+                GameUser.user_id,
+                UserModel.username,
+                UserModel.first_name,
+                GameUser.cash_balance,
+                holdings_value.label("holdings_value"),
+                net_worth.label("net_worth"),
+                func.rank().over(order_by=net_worth.desc()).label("rank"),
             )
-            return users_stocks.scalars().all()
+            .join(GameModel, GameModel.id == GameUser.game_id)
+            .join(UserModel, UserModel.id == GameUser.user_id)
+            .outerjoin(
+                UserStock,
+                and_(
+                    UserStock.game_id == GameUser.game_id,
+                    UserStock.user_id == GameUser.user_id,
+                ),
+            )
+            .outerjoin(
+                SessionStock,
+                and_(
+                    SessionStock.session_id == session_id,
+                    SessionStock.stock_id == UserStock.stock_id,
+                ),
+            )
+            .filter(GameUser.game_id == game_id, GameModel.is_active.is_(True))
+            .group_by(GameUser.id, UserModel.id)
+            .order_by("rank", GameUser.user_id)
+        )
+        async with self.app.database.session_scope() as session:
+            result = await session.execute(stmt)
+            return [Standing(*row) for row in result]
 
     async def find_user_stock_by_user_id(
         self, game_id: int, user_id: int
     ) -> list[UserStock]:
-        async with AsyncSession(self.app.database.engine) as session:
+        async with self.app.database.session_scope() as session:
             users_stocks = await session.execute(
                 select(UserStock).filter(
                     UserStock.game_id == game_id, UserStock.user_id == user_id
@@ -161,38 +218,262 @@ class GameAccessor(BaseAccessor):
             )
             return users_stocks.scalars().all()
 
-    async def get_phrase(self, key: str) -> str | None:
-        async with AsyncSession(self.app.database.engine) as session:
-            phrase = await session.execute(
-                select(Phrase.phrase).filter(Phrase.key == key)
-            )
-            return phrase.scalar_one_or_none()
-
-    async def get_stock_by_title(self, stock_title: str) -> Stock | None:
-        async with AsyncSession(self.app.database.engine) as session:
-            stock = await session.execute(
-                select(Stock).filter(Stock.title == stock_title)
-            )
-            return stock.scalar_one_or_none()
+    async def get_phrases(self) -> dict[str, str]:
+        async with self.app.database.session_scope() as session:
+            phrases = await session.execute(select(Phrase.key, Phrase.phrase))
+            return dict(phrases.all())
 
     async def get_stocks(self) -> list[Stock]:
-        async with AsyncSession(self.app.database.engine) as session:
-            stocks = await session.execute(select(Stock))
+        async with self.app.database.session_scope() as session:
+            stocks = await session.execute(select(Stock).order_by(Stock.id))
             return stocks.scalars().all()
 
-    async def save_exchange(self, exchange: Exchange) -> None:
-        async with AsyncSession(self.app.database.engine) as session:
-            session.add(exchange)
-            await session.commit()
+    async def save_stock(self, stock: Stock) -> Stock:
+        async with self.app.database.session_scope() as session:
+            session.add(stock)
+            await session.flush()
+            return stock
 
-    async def get_exchanges(self) -> list[Exchange] | None:
-        async with AsyncSession(self.app.database.engine) as session:
-            result = await session.execute(select(Exchange))
-            return result.scalars().all()
+    async def update_stock(self, stock_id: int, title: str) -> Stock | None:
+        async with self.app.database.session_scope() as session:
+            stock = await session.get(Stock, stock_id)
+            if stock is None:
+                return None
+            stock.title = title
+            await session.flush()
+            return stock
+
+    async def stream_exchanges(
+        self, batch_size: int
+    ) -> AsyncIterator[Sequence[Row]]:
+        """Все сделки по возрастанию id пачками по `batch_size` строк
+        из курсора на стороне сервера, колонки таблицы exchange.
+
+        Курсор держит свое соединение и транзакцию все время выгрузки,
+        поэтому не входит в единицу работы запроса.
+        """
+        stmt = (
+            select(*Exchange.__table__.columns)
+            .order_by(Exchange.id)
+            .execution_options(yield_per=batch_size)
+        )
+        async with self.app.database.engine.connect() as connection:
+            result = await connection.stream(stmt)
+            async for rows in result.partitions():
+                yield rows
+
+    async def get_exchange_page(
+        self,
+        limit: int,
+        after: tuple[datetime, int] | None = None,
+        chat_id: str | None = None,
+        game_id: int | None = None,
+        session_id: int | None = None,
+        user_id: int | None = None,
+        stock_id: int | None = None,
+        action: str | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> list[RowMapping]:
+        """Страница журнала сделок от новых к старым.
+
+        Порядок по (execution_time, id), `after` - ключ последней сделки
+        предыдущей страницы. Выбираются только выводимые в журнал
+        колонки сделки, игрока (с префиксом user_) и акции (stock_title).
+        """
+        stmt = (
+            select(
+                Exchange.id,
+                Exchange.session_id,
+                Exchange.chat_id,
+                Exchange.action,
+                Exchange.stock_id,
+                Exchange.quantity,
+                Exchange.execution_time,
+                Exchange.user_id,
+                UserModel.telegram_id.label("user_telegram_id"),
+                UserModel.first_name.label("user_first_name"),
+                UserModel.last_name.label("user_last_name"),
+                UserModel.username.label("user_username"),
+                Stock.title.label("stock_title"),
+            )
+            .join(UserModel, UserModel.id == Exchange.user_id)
+            .join(Stock, Stock.id == Exchange.stock_id)
+            .order_by(Exchange.execution_time.desc(), Exchange.id.desc())
+            .limit(limit)
+        )
+        if after is not None:
+            stmt = stmt.filter(
+                tuple_(Exchange.execution_time, Exchange.id) < tuple_(*after)
+            )
+        if game_id is not None:
+            stmt = stmt.join(Session, Session.id == Exchange.session_id).filter(
+                Session.game_id == game_id
+            )
+        for column, value in (
+            (Exchange.chat_id, chat_id),
+            (Exchange.session_id, session_id),
+            (Exchange.user_id, user_id),
+            (Exchange.stock_id, stock_id),
+            (Exchange.action, action),
+        ):
+            if value is not None:
+                stmt = stmt.filter(column == value)
+        if since is not None:
+            stmt = stmt.filter(Exchange.execution_time >= since)
+        if until is not None:
+            stmt = stmt.filter(Exchange.execution_time < until)
+        async with self.app.database.session_scope() as session:
+            result = await session.execute(stmt)
+            return result.mappings().all()
 
     async def find_exchanges(self, user_id: int) -> list[Exchange] | None:
-        async with AsyncSession(self.app.database.engine) as session:
+        async with self.app.database.session_scope() as session:
             result = await session.execute(
                 select(Exchange).filter(Exchange.user_id == user_id)
             )
             return result.scalars().all()
+
+    async def execute_trade(
+        self,
+        game_id: int,
+        user_id: int,
+        stock_id: int,
+        chat_id: str,
+        action: str,
+        quantity: int,
+    ) -> Trade | None:
+        """Покупка или продажа акций по цене последней сессии игры
+        одним запросом: списание или зачисление денег, изменение
+        количества акций и запись в exchange.
+
+        Покупка проходит только при достаточном балансе, продажа - при
+        достаточном количестве акций. Строка игрока блокируется первой
+        в обоих случаях, поэтому параллельные сделки игрока выполняются
+        по очереди и не теряют изменений. Возвращает None, если у игры
+        нет сессии с ценой акции.
+        """
+        if action not in (Bot.BUY, Bot.SELL):
+            raise ValueError(f"unknown trade action {action!r}")
+        price = (
+            select(Session.game_id, SessionStock.session_id, SessionStock.price)
+            .join(Session, SessionStock.session_id == Session.id)
+            .filter(
+                Session.game_id == game_id, SessionStock.stock_id == stock_id
+            )
+            .order_by(Session.id.desc())
+            .limit(1)
+            .cte("price")
+        )
+        player = (
+            GameUser.game_id == price.c.game_id,
+            GameUser.user_id == user_id,
+        )
+        amount = quantity * price.c.price
+        if action == Bot.BUY:
+            balance = func.round(
+                cast(GameUser.cash_balance - amount, Numeric), 2
+            )
+            account = (
+                update(GameUser)
+                .filter(*player, balance >= 0)
+                .values(cash_balance=balance)
+                .returning(GameUser.cash_balance)
+                .cte("account")
+            )
+            holding = insert(UserStock).from_select(
+                ["user_id", "game_id", "stock_id", "total_quantity"],
+                select(
+                    literal(user_id),
+                    literal(game_id),
+                    literal(stock_id),
+                    literal(quantity),
+                ).select_from(account),
+            )
+            holding = (
+                holding.on_conflict_do_update(
+                    constraint="user_game_stock_unique_constraint",
+                    set_={
+                        "total_quantity": UserStock.total_quantity
+                        + holding.excluded.total_quantity
+                    },
+                )
+                .returning(UserStock.total_quantity)
+                .cte("holding")
+            )
+        else:
+            balance = func.round(
+                cast(GameUser.cash_balance + amount, Numeric), 2
+            )
+            locked = (
+                select(GameUser.user_id)
+                .filter(*player)
+                .with_for_update(of=GameUser)
+                .cte("locked")
+            )
+            holding = (
+                update(UserStock)
+                .filter(
+                    UserStock.user_id == locked.c.user_id,
+                    UserStock.game_id == price.c.game_id,
+                    UserStock.stock_id == stock_id,
+                    UserStock.total_quantity >= quantity,
+                )
+                .values(total_quantity=UserStock.total_quantity - quantity)
+                .returning(UserStock.total_quantity)
+                .cte("holding")
+            )
+            account = (
+                update(GameUser)
+                .filter(*player, select(holding).exists())
+                .values(cash_balance=balance)
+                .returning(GameUser.cash_balance)
+                .cte("account")
+            )
+        exchange = (
+            insert(Exchange)
+            .from_select(
+                [
+                    "session_id",
+                    "user_id",
+                    "chat_id",
+                    "action",
+                    "stock_id",
+                    "quantity",
+                    "execution_time",
+                ],
+                select(
+                    price.c.session_id,
+                    literal(user_id),
+                    literal(chat_id),
+                    literal(action),
+                    literal(stock_id),
+                    literal(quantity),
+                    func.localtimestamp(),
+                ).select_from(
+                    price.join(account, true()).join(holding, true())
+                ),
+            )
+            .cte("exchange")
+        )
+        stmt = (
+            select(
+                price.c.price,
+                account.c.cash_balance,
+                holding.c.total_quantity,
+            )
+            .select_from(
+                price.outerjoin(account, true()).outerjoin(holding, true())
+            )
+            .add_cte(exchange)
+        )
+        async with self.app.database.session_scope() as session:
+            result = await session.execute(stmt)
+            row = result.one_or_none()
+            if row is None:
+                return None
+            return Trade(
+                price=row.price,
+                cash_balance=row.cash_balance,
+                total_quantity=row.total_quantity,
+            )
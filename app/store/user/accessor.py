@@ -1,5 +1,4 @@
 from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.base.base_accessor import BaseAccessor
 
@@ -12,29 +11,27 @@ class UserAccessor(BaseAccessor):
     async def get_user_by_telegram_id(
         self, telegram_id: int
     ) -> UserModel | None:
-        async with AsyncSession(self.app.database.engine) as session:
+        async with self.app.database.session_scope() as session:
             user = await session.execute(
                 select(UserModel).filter(UserModel.telegram_id == telegram_id)
             )
             return user.scalar_one_or_none()
 
     async def save_user(self, user: UserModel) -> UserModel:
-        async with AsyncSession(self.app.database.engine) as session:
+        async with self.app.database.session_scope() as session:
             session.add(user)
-            await session.commit()
-            await session.refresh(user)
-
+            await session.flush()
             return user
 
     async def get_user_by_id(self, user_id: int) -> UserModel | None:
-        async with AsyncSession(self.app.database.engine) as session:
+        async with self.app.database.session_scope() as session:
             user = await session.execute(
                 select(UserModel).filter(UserModel.id == user_id)
             )
             return user.scalar_one_or_none()
 
     async def get_users(self) -> list[UserModel] | None:
-        async with AsyncSession(self.app.database.engine) as session:
+        async with self.app.database.session_scope() as session:
             result = await session.execute(select(UserModel))
             users = result.scalars().all()
             return users if users else None
@@ -1,131 +1,351 @@
-import json
-from asyncio import Queue
-from typing import TYPE_CHECKING
-from urllib.parse import urlencode, urljoin
+import random
+import time
+from asyncio import Task, create_task, sleep
+from collections.abc import Callable
+from functools import partial
+from typing import TYPE_CHECKING, Any
 
-from aiohttp import TCPConnector
+import msgspec
+from aiohttp import ClientConnectionError, ClientTimeout, TCPConnector
 from aiohttp.client import ClientSession
 
 from app.base.base_accessor import BaseAccessor
+from app.telegram_bot.cluster import IngestLink, PartitionedDispatcher
+from app.telegram_bot.coordination import (
+    InboxReader,
+    InboxWriter,
+    LeaderElection,
+)
 from app.telegram_bot.dataclasses import CallbackQuery, From, Message
+from app.telegram_bot.decoder import RawUpdate, decode_updates_response
 from app.telegram_bot.poller import Poller
+from app.telegram_bot.scheduler import OutboundRequest, OutboundScheduler
+from app.telegram_bot.tracker import UpdateTracker
+from app.telegram_bot.update_queue import UpdateQueue
 from app.telegram_bot.worker import Worker
+from app.web.config import BotConfig
 
 if TYPE_CHECKING:
     from app.web.app import Application
 
 __all_ = ("TelegramApiAccessor",)
 
+JSON_HEADERS = {"Content-Type": "application/json"}
+
 
 class TelegramApiAccessor(BaseAccessor):
+    ALLOWED_UPDATES = ("message", "callback_query")
+    ME_TTL = 3600
+    MAX_ATTEMPTS = 3
+    BACKOFF_BASE = 0.5
+    DEFAULT_TIMEOUT = ClientTimeout(total=10, sock_connect=5)
+    # Повтор после таймаута безопасен только там,
+    # где повторный вызов не отправит дубликат сообщения.
+    IDEMPOTENT_METHODS = frozenset(
+        ("getUpdates", "getMe", "setWebhook", "answerCallbackQuery")
+    )
+
     def __init__(self, app: "Application", *args, **kwargs):
         super().__init__(app, *args, **kwargs)
 
         self.session: ClientSession | None = None
+        self.poll_session: ClientSession | None = None
         self.host: str | None = self.app.config.bot.get_token_path()
-        self.queue = Queue()
+        self.queue = UpdateQueue(maxsize=self.app.config.bot.queue_size)
         self.poller: Poller | None = None
         self.offset: int | None = None
-        self.worker: Worker | None = None
+        self.worker: Worker | PartitionedDispatcher | None = None
+        self.link: IngestLink | None = None
+        self.inbox: InboxReader | None = None
+        self.writer: InboxWriter | None = None
+        self.election: LeaderElection | None = None
+        self.scheduler: OutboundScheduler | None = None
+        self.tracker = UpdateTracker(app)
+        self.me: From | None = None
+
+        self._me_updated_at: float = 0.0
+        self._me_refresh: Task | None = None
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder()
+        self._timeouts = {
+            "getUpdates": ClientTimeout(
+                total=self.app.config.bot.poll_timeout + 10, sock_connect=5
+            ),
+            "sendMessage": ClientTimeout(total=10, sock_connect=5),
+            "answerCallbackQuery": ClientTimeout(total=5, sock_connect=2),
+        }
 
     async def connect(self, app: "Application") -> None:
+        # Long polling держит соединение до poll_timeout секунд,
+        # поэтому у него отдельный пул и он не занимает слоты отправки.
+        self.poll_session = ClientSession(
+            connector=TCPConnector(
+                ssl=False,
+                limit=2,
+                keepalive_timeout=self.app.config.bot.poll_timeout + 30,
+                ttl_dns_cache=300,
+            )
+        )
         self.session = ClientSession(
             connector=TCPConnector(
-                verify_ssl=False,
+                ssl=False,
+                limit=OutboundScheduler.MAX_IN_FLIGHT,
+                keepalive_timeout=60,
+                ttl_dns_cache=300,
             )
         )
-        self.poller = Poller(app, self.queue)
-        self.worker = Worker(app, self.queue, 20)
-        await self.poller.start()
-        self.logger.info("start polling")
+        self.scheduler = OutboundScheduler(app, self._request)
+        await self.scheduler.start()
+        await self.refresh_me()
+        config = self.app.config.bot
+        if config.worker_index is not None:
+            # Процесс-обработчик получает обновления от процесса приема.
+            self.link = IngestLink(app, self.queue, config.worker_index)
+            self.worker = Worker(app, self.queue, 20, on_done=self.link.ack)
+            await self.worker.start()
+            await self.link.start()
+            self.logger.info("worker %d linked", config.worker_index)
+            return
+
+        if config.leader_election:
+            # Лидер пишет принятые обновления во входящие, каждый
+            # экземпляр обрабатывает обновления своих чатов.
+            inbox_queue = UpdateQueue(maxsize=config.queue_size)
+            self.inbox = InboxReader(app, inbox_queue)
+            self.worker = Worker(app, inbox_queue, 20, on_done=self.inbox.done)
+            self.writer = InboxWriter(
+                app, self.queue, on_done=self.tracker.done
+            )
+            self.election = LeaderElection(
+                app, on_elected=self._start_ingest, on_lost=self._step_down
+            )
+            await self.worker.start()
+            await self.inbox.start()
+            await self.writer.start()
+            await self.election.start()
+            self.logger.info("instance %s started", config.instance_id)
+            return
 
+        await self._start_ingest()
+        if config.processes > 1:
+            self.worker = PartitionedDispatcher(
+                app, self.queue, on_done=self.tracker.done
+            )
+        else:
+            self.worker = Worker(app, self.queue, 20, on_done=self.tracker.done)
         await self.worker.start()
         self.logger.info("start worker")
 
-    async def disconnect(self, app: "Application") -> None:
-        if self.session:
-            await self.session.close()
+    async def _start_ingest(self) -> None:
+        recovered = await self.tracker.load()
+        if self.tracker.watermark is not None:
+            self.offset = self.tracker.watermark + 1
+        await self.tracker.start()
+        if self.app.config.bot.mode == BotConfig.WEBHOOK:
+            await self.set_webhook()
+            self.logger.info("webhook set")
+        else:
+            self.poller = Poller(self.app, self.queue, recovered)
+            await self.poller.start()
+            self.logger.info("start polling")
 
+    async def _step_down(self) -> None:
         if self.poller:
             await self.poller.stop()
+            self.poller = None
+        await self.tracker.stop()
 
-        if self.worker:
-            await self.worker.stop()
+    async def disconnect(self, app: "Application") -> None:
+        # Сначала прекращается прием обновлений, затем обработка.
+        for component in (
+            self.election,
+            self.writer,
+            self.poller,
+            self.worker,
+            self.link,
+            self.inbox,
+        ):
+            if component:
+                await component.stop()
 
-    @staticmethod
-    def _build_query(host: str, method: str, params: dict) -> str:
-        host = f"{host}/method"
-        return f"{urljoin(host, method)}?{urlencode(params)}"
-
-    async def poll(self) -> list | None:
-        async with self.session.get(
-            self._build_query(
-                host=self.host,
-                method="getUpdates",
-                params={
-                    "offset": self.offset,
-                    "timeout": 30,
-                    "allowed_updates": ["message", "callback_query"],
-                },
+        await self.tracker.stop()
+
+        if self.scheduler:
+            await self.scheduler.stop()
+
+        if self._me_refresh:
+            self._me_refresh.cancel()
+
+        for session in (self.poll_session, self.session):
+            if session:
+                await session.close()
+
+    async def _request(
+        self,
+        method: str,
+        params: dict,
+        session: ClientSession | None = None,
+        decode: Callable[[bytes], Any] | None = None,
+    ) -> Any:
+        """Вызов метода Bot API с JSON-телом запроса.
+        Сетевые ошибки и ответы 5xx повторяются с экспоненциальной
+        задержкой и случайным разбросом.
+        """
+        session = session or self.session
+        decode = decode or self._decoder.decode
+        body = self._encoder.encode(params)
+        timeout = self._timeouts.get(method, self.DEFAULT_TIMEOUT)
+        retry_errors = (
+            (ClientConnectionError, TimeoutError)
+            if method in self.IDEMPOTENT_METHODS
+            else ClientConnectionError
+        )
+        attempt = 1
+        while True:
+            try:
+                async with session.post(
+                    f"{self.host}/{method}",
+                    data=body,
+                    headers=JSON_HEADERS,
+                    timeout=timeout,
+                ) as response:
+                    raw = await response.read()
+                    if response.status < 500:
+                        return decode(raw)
+                    if attempt == self.MAX_ATTEMPTS:
+                        response.raise_for_status()
+            except retry_errors:
+                if attempt == self.MAX_ATTEMPTS:
+                    raise
+            delay = random.uniform(0, self.BACKOFF_BASE * 2**attempt)
+            self.logger.warning(
+                "%s attempt %d failed, retry in %.2fs", method, attempt, delay
             )
-        ) as response:
-            data = await response.json()
-            self.logger.info(data)
-            results = data.get("result", [])
-            if results:
-                result = results[-1]
-                self.offset = result.get("update_id") + 1
-                return result
-            return None
+            await sleep(delay)
+            attempt += 1
+
+    async def poll(self, limit: int | None = None) -> list[RawUpdate]:
+        params = {
+            "limit": limit or self.app.config.bot.poll_limit,
+            "timeout": self.app.config.bot.poll_timeout,
+            "allowed_updates": self.ALLOWED_UPDATES,
+        }
+        if self.offset is not None:
+            params["offset"] = self.offset
+        data = await self._request(
+            method="getUpdates",
+            params=params,
+            session=self.poll_session,
+            decode=decode_updates_response,
+        )
+        if not data.ok:
+            self.logger.warning(
+                "getUpdates failed: %s %s", data.error_code, data.description
+            )
+            await sleep(1)
+            return []
+        results = data.result
+        if results:
+            self.offset = results[-1].update_id + 1
+            self.logger.info(
+                "getUpdates: %d updates, next offset %d",
+                len(results),
+                self.offset,
+            )
+        return results
+
+    async def set_webhook(self) -> None:
+        data = await self._request(
+            method="setWebhook",
+            params={
+                "url": self.app.config.bot.webhook_url,
+                "secret_token": self.app.config.bot.secret_token,
+                "allowed_updates": self.ALLOWED_UPDATES,
+            },
+        )
+        self.logger.info(data)
 
     async def send_message(self, message: Message) -> None:
+        """Постановка сообщения в очередь отправки после фиксации
+        текущей единицы работы: при откате сообщение не отправляется.
+        """
         params = {
             "chat_id": message.chat_id,
             "text": message.text,
             "parse_mode": "html",
         }
         if message.reply_markup:
-            params["reply_markup"] = json.dumps(message.reply_markup)
+            params["reply_markup"] = message.reply_markup
         if message.reply_to_message_id:
             params["reply_to_message_id"] = message.reply_to_message_id
-        async with self.session.get(
-            self._build_query(
-                host=self.host,
-                method="sendMessage",
-                params=params,
-            )
-        ) as response:
-            data = await response.json()
-            self.logger.info(data)
+        request = OutboundRequest(
+            method="sendMessage", params=params, chat_id=message.chat_id
+        )
+        self.app.database.after_commit(partial(self.scheduler.submit, request))
 
     async def answer_callback_query(
-        self, callback_query: CallbackQuery, player_name: str, text: str
+        self, callback_query: CallbackQuery, text: str | None = None
     ) -> None:
-        async with self.session.get(
-            self._build_query(
-                host=self.host,
-                method="answerCallbackQuery",
-                params={
-                    "callback_query_id": callback_query.callback_id,
-                    "text": f"{player_name} {text}",
-                    "cache_time": 60,
-                },
-            )
-        ) as response:
-            data = await response.json()
-            self.logger.info(data)
+        """Постановка ответа на callback-запрос в начало очереди отправки.
+        Время от начала обработки обновления до ответа попадает
+        в метрику bot.callback.ack_latency.
+        """
+        self.scheduler.submit(self._callback_answer(callback_query, text))
+
+    async def confirm_callback_query(
+        self, callback_query: CallbackQuery, text: str | None = None
+    ) -> None:
+        """Ответ на callback-запрос с результатом действия. Как и
+        сообщение, уходит после фиксации текущей единицы работы,
+        но вне очереди чата.
+        """
+        request = self._callback_answer(callback_query, text)
+        self.app.database.after_commit(partial(self.scheduler.submit, request))
+
+    @staticmethod
+    def _callback_answer(
+        callback_query: CallbackQuery, text: str | None
+    ) -> OutboundRequest:
+        params = {"callback_query_id": callback_query.callback_id}
+        if text:
+            params["text"] = text
+        return OutboundRequest(
+            method="answerCallbackQuery",
+            params=params,
+            urgent=True,
+            latency_metric="bot.callback.ack_latency",
+            latency_from=callback_query.dequeued_at,
+        )
 
     async def get_me(self) -> From | None:
-        async with self.session.get(
-            self._build_query(host=self.host, method="getme", params={})
-        ) as response:
-            data = await response.json()
-            self.logger.info(data)
-            result = data.get("result", [])
-            if result:
-                return From(
-                    telegram_id=result["id"],
-                    first_name=result["first_name"],
-                    username=result["username"],
-                )
-            return None
+        data = await self._request(method="getMe", params={})
+        self.logger.info(data)
+        result = data.get("result", [])
+        if result:
+            return From(
+                telegram_id=result["id"],
+                first_name=result["first_name"],
+                username=result["username"],
+            )
+        return None
+
+    async def refresh_me(self) -> None:
+        try:
+            me = await self.get_me()
+        except Exception:
+            self.logger.exception("getMe failed")
+            return
+        if me:
+            self.me = me
+            self._me_updated_at = time.monotonic()
+
+    def get_cached_me(self) -> From | None:
+        """Данные бота без запроса к Bot API.
+        Устаревшие данные обновляются в фоне.
+        """
+        if (
+            time.monotonic() - self._me_updated_at > self.ME_TTL
+            or self.me is None
+        ) and (self._me_refresh is None or self._me_refresh.done()):
+            self._me_refresh = create_task(self.refresh_me())
+        return self.me
@@ -1,9 +1,10 @@
 from asyncio import sleep
 from collections import defaultdict
+from functools import partial
 from logging import getLogger
 from typing import TYPE_CHECKING
 
-from app.game.models import GameModel
+from app.game.models import GameModel, Session
 from app.telegram_bot.dataclasses import (
     CallbackQuery,
     Message,
@@ -24,33 +25,31 @@ class CallbackManager:
         self.app = app
         self.logger = getLogger("Callback_query handler")
         self.skip: dict[int, set[int]] = defaultdict(set)
-        self.skip_all: bool = False
+        # Сессии, в которых все игроки пропустили ход.
+        self.skipped_sessions: set[int] = set()
 
     async def handle_update_callback(self, update: Update) -> None:
         """Обработка обновлений типа 'callback_query'."""
         obj_callback = update.object.callback_query
-        game = await self.app.store.game.find_active_game(
-            chat_id=obj_callback.chat_id
-        )
-        if game is None:
-            return
         player_name = self.app.game.service.get_user_name(
             username=obj_callback.from_.username,
             first_name=obj_callback.from_.first_name,
         )
         if obj_callback.data == "Join_the_game":
-            await self.app.game.service.join_user_to_game(
-                game=game, data=obj_callback.from_
-            )
-            await self.app.bot.api.answer_callback_query(
-                callback_query=CallbackQuery(
-                    callback_id=obj_callback.callback_id,
-                    from_=obj_callback.from_,
-                ),
-                player_name=player_name,
-                text=await self.app.store.game.get_phrase("joined_the_game"),
+            await self.handle_callback_join(
+                obj_callback=obj_callback, player_name=player_name
             )
             return
+        # Кнопка показывает индикатор загрузки до ответа, поэтому ответ
+        # уходит до запросов к базе, а результат - отдельным сообщением.
+        await self.app.bot.api.answer_callback_query(
+            callback_query=obj_callback
+        )
+        game = await self.app.store.game.find_active_game(
+            chat_id=obj_callback.chat_id
+        )
+        if game is None:
+            return
         user_telegram_id = obj_callback.from_.telegram_id
         if not self.app.game.service.is_participant(
             user_telegram_id=user_telegram_id, game=game
@@ -70,6 +69,27 @@ class CallbackManager:
                 obj_callback=obj_callback, player_name=player_name, game=game
             )
 
+    async def handle_callback_join(
+        self, obj_callback: CallbackQuery, player_name: str
+    ) -> None:
+        """Обработка нажатия кнопки 'Присоединиться'.
+        Результат приходит игроку в ответе на callback-запрос: он идет
+        вне лимита сообщений чата, который в разгар набора игроков
+        задержал бы подтверждение на секунды.
+        """
+        text = None
+        game = await self.app.store.game.find_active_game(
+            chat_id=obj_callback.chat_id
+        )
+        if game is not None and await self.app.game.service.join_user_to_game(
+            game=game, data=obj_callback.from_
+        ):
+            phrase = self.app.game.phrases.get("joined_the_game")
+            text = f"{player_name} {phrase}"
+        await self.app.bot.api.confirm_callback_query(
+            callback_query=obj_callback, text=text
+        )
+
     async def handle_callback_exchange(
         self, obj_callback: CallbackQuery, player_name: str
     ) -> None:
@@ -98,7 +118,7 @@ class CallbackManager:
         )
         session = await self.app.store.game.find_game_session(game_id=game.id)
         if user.id not in self.skip.get(session.id, []):
-            text = await self.app.store.game.get_phrase("skip_action")
+            text = self.app.game.phrases.get("skip_action")
             await self.app.bot.api.send_message(
                 message=Message(
                     text=f"{player_name} {text}",
@@ -108,36 +128,79 @@ class CallbackManager:
             self.skip[session.id].add(user.id)
             count_of_players = len(game.users)
             if len(self.skip.get(session.id, [])) == count_of_players:
-                self.skip_all = True
+                self.skipped_sessions.add(session.id)
 
     async def handle_callback_continue(
         self, obj_callback: CallbackQuery
     ) -> None:
-        """Обработка нажатия действия 'Продолжить'."""
-        for _ in range(6):
-            self.skip_all = False
-            game_session = await self.app.bot.msg_manager.start_session(
-                obj_callback=obj_callback
+        """Обработка нажатия действия 'Продолжить'.
+        Первый раунд запускается сразу, остальная игра идет в фоне.
+        """
+        game_session = await self.app.bot.msg_manager.start_session(
+            obj_callback=obj_callback
+        )
+        if game_session is None:
+            return
+        self.app.bot.api.worker.run_in_background(
+            self.play_rounds(
+                obj_callback=obj_callback, game_session=game_session
+            )
+        )
+
+    async def play_rounds(
+        self, obj_callback: CallbackQuery, game_session: Session
+    ) -> None:
+        """Проведение раундов игры `game_session.game_id`.
+        Переходы между раундами выполняются в очереди чата, поэтому
+        не пересекаются с /stop и сделками. Сценарий завершается,
+        как только эта игра перестает быть активной.
+        """
+        worker = self.app.bot.api.worker
+        while game_session is not None:
+            await self.wait_round_end(game_session.id)
+            game_session = await worker.run_in_lane(
+                obj_callback.chat_id,
+                partial(self.finish_round, obj_callback, game_session),
             )
-            for _ in range(60):
-                if self.skip_all:
-                    break
-                await sleep(1)
+
+    async def wait_round_end(self, session_id: int) -> None:
+        """Ожидание конца раунда или пропуска хода всеми игроками."""
+        for _ in range(self.app.config.game.round_duration):
+            if session_id in self.skipped_sessions:
+                return
+            await sleep(1)
+
+    async def finish_round(
+        self, obj_callback: CallbackQuery, game_session: Session
+    ) -> Session | None:
+        """Итоги раунда и старт следующего либо завершение игры.
+        Возвращает новую сессию или None, если игра окончена.
+        """
+        self.skip.pop(game_session.id, None)
+        self.skipped_sessions.discard(game_session.id)
+        async with self.app.database.session_scope():
+            game = await self.app.store.game.find_active_game(
+                chat_id=obj_callback.chat_id
+            )
+            if game is None or game.id != game_session.game_id:
+                # Игру остановили или в чате уже идет другая.
+                return None
             game_session.is_finished = True
             await self.app.store.game.save_game_session(
                 game_session=game_session
             )
             await self.app.bot.msg_manager.get_game_result(
-                chat_id=obj_callback.chat_id
+                chat_id=obj_callback.chat_id, game_session=game_session
             )
-        game = await self.app.store.game.find_active_game(
-            chat_id=obj_callback.chat_id
-        )
-        game.is_active = False
-        await self.app.store.game.save_game(game)
-        await self.app.bot.api.send_message(
-            message=Message(
-                text="Игра окончена. 🤑",
-                chat_id=obj_callback.chat_id,
+            if game_session.number < self.app.config.game.rounds:
+                return await self.app.bot.msg_manager.start_session(
+                    obj_callback=obj_callback
+                )
+            await self.app.game.service.deactivate_game(game)
+            await self.app.bot.api.send_message(
+                message=Message(
+                    text="Игра окончена. 🤑",
+                    chat_id=obj_callback.chat_id,
+                )
             )
-        )
+            return None
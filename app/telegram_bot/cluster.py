@@ -0,0 +1,242 @@
+"""Обмен обновлениями между процессом приема и процессами-обработчиками.
+
+Процесс приема (веб-приложение с long polling или вебхуком) раскладывает
+обновления по K процессам-обработчикам через unix-сокет. Чат всегда
+попадает в один и тот же процесс (crc32 от chat_id), поэтому порядок
+обновлений внутри чата сохраняется. У каждого обработчика свой пул
+соединений с базой и свой клиент Bot API. Обработчик подтверждает каждое
+обновление, после чего процесс приема учитывает его в границе
+обработанных обновлений.
+"""
+
+import asyncio
+import os
+import zlib
+from collections.abc import Callable
+from logging import getLogger
+from typing import TYPE_CHECKING
+
+import msgspec
+
+from app.telegram_bot.decoder import RawUpdate
+from app.telegram_bot.update_queue import UpdateQueue
+
+if TYPE_CHECKING:
+    from app.web.app import Application
+
+__all__ = (
+    "STOP_TIMEOUT",
+    "IngestLink",
+    "PartitionedDispatcher",
+    "partition",
+)
+
+HEADER_SIZE = 4
+CONNECT_ATTEMPTS = 50
+CONNECT_DELAY = 0.2
+STOP_TIMEOUT = 30
+
+
+class Envelope(msgspec.Struct, array_like=True, gc=False):
+    received_at: float
+    update: RawUpdate
+
+
+class Hello(msgspec.Struct, tag=True, array_like=True, gc=False):
+    index: int
+
+
+class Ack(msgspec.Struct, tag=True, array_like=True, gc=False):
+    update_id: int
+
+
+_encoder = msgspec.msgpack.Encoder()
+_envelope_decoder = msgspec.msgpack.Decoder(Envelope)
+_worker_message_decoder = msgspec.msgpack.Decoder(Hello | Ack)
+
+
+def partition(chat_id: str | None, processes: int) -> int:
+    # hash() строк различается между процессами, crc32 - нет.
+    return zlib.crc32((chat_id or "").encode()) % processes
+
+
+def frame(message: msgspec.Struct) -> bytes:
+    payload = _encoder.encode(message)
+    return len(payload).to_bytes(HEADER_SIZE, "big") + payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> bytes:
+    size = int.from_bytes(await reader.readexactly(HEADER_SIZE), "big")
+    return await reader.readexactly(size)
+
+
+class PartitionedDispatcher:
+    """Раздача обновлений процессам-обработчикам.
+
+    Неподтвержденные обновления хранятся до подтверждения и отправляются
+    повторно, когда обработчик (или перезапущенный вместо него процесс)
+    подключится снова. Одновременно у подключенных обработчиков не
+    больше `queue.maxsize` обновлений: обновления отключенного
+    обработчика лимит не занимают, иначе его падение остановило бы прием
+    для всех чатов. Повторно отправленные после переподключения
+    обновления идут сверх лимита. Обновление, зафиксированное
+    обработчиком до падения, но не подтвержденное, обработчик узнает
+    по отметке в базе и пропускает.
+    """
+
+    def __init__(
+        self,
+        app: "Application",
+        queue: UpdateQueue,
+        on_done: Callable[[int], None],
+    ) -> None:
+        self.app = app
+        self.logger = getLogger("dispatcher")
+        self.queue = queue
+        self.on_done = on_done
+        self.processes = app.config.bot.processes
+        self.path = app.config.bot.ipc_path
+        self._capacity = queue.capacity()
+        self._links: dict[int, asyncio.StreamWriter] = {}
+        self._unacked: list[dict[int, bytes]] = [
+            {} for _ in range(self.processes)
+        ]
+        # Обновления, занимающие место в лимите `_capacity`.
+        self._held: set[int] = set()
+        self._server: asyncio.Server | None = None
+        self._dispatcher: asyncio.Task | None = None
+
+        self.app.metrics.gauge("bot.cluster.unacked", self.unacked)
+        self.app.metrics.gauge("bot.cluster.links", lambda: len(self._links))
+        self.app.metrics.gauge(
+            "bot.updates.queue_depth",
+            lambda: self.queue.qsize() + self.unacked(),
+        )
+
+    def unacked(self) -> int:
+        return sum(len(unacked) for unacked in self._unacked)
+
+    async def _dispatch(self) -> None:
+        while True:
+            await self._capacity.acquire()
+            received_at, upd = await self.queue.get()
+            index = partition(upd.chat_id, self.processes)
+            data = frame(Envelope(received_at=received_at, update=upd))
+            self._unacked[index][upd.update_id] = data
+            link = self._links.get(index)
+            if link is not None:
+                link.write(data)
+                self._held.add(upd.update_id)
+            else:
+                # Ждет подключения обработчика вне лимита.
+                self._capacity.release()
+
+    async def _handle_link(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        index = None
+        try:
+            hello = _worker_message_decoder.decode(await read_frame(reader))
+            index = hello.index
+            unacked = self._unacked[index]
+            for data in unacked.values():
+                writer.write(data)
+            self._links[index] = writer
+            self.logger.info("worker %d connected", index)
+            while True:
+                ack = _worker_message_decoder.decode(await read_frame(reader))
+                if unacked.pop(ack.update_id, None) is None:
+                    continue
+                self._release(ack.update_id)
+                self.queue.task_done()
+                self.on_done(ack.update_id)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            if self._server.is_serving():
+                self.logger.warning("worker %s disconnected", index)
+        finally:
+            if index is not None and self._links.get(index) is writer:
+                del self._links[index]
+                # Неподтвержденные обновления дождутся переподключения,
+                # не занимая лимит.
+                for update_id in self._unacked[index]:
+                    self._release(update_id)
+            writer.close()
+
+    def _release(self, update_id: int) -> None:
+        if update_id in self._held:
+            self._held.discard(update_id)
+            self._capacity.release()
+
+    async def start(self) -> None:
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(
+            self._handle_link, path=self.path
+        )
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def stop(self) -> None:
+        try:
+            await asyncio.wait_for(self.queue.join(), STOP_TIMEOUT)
+        except TimeoutError:
+            self.logger.warning(
+                "%d updates left unacknowledged", self.unacked()
+            )
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+        if self._server:
+            self._server.close()
+        for writer in list(self._links.values()):
+            writer.close()
+        if self._server:
+            await self._server.wait_closed()
+
+
+class IngestLink:
+    """Связь процесса-обработчика с процессом приема обновлений."""
+
+    def __init__(
+        self, app: "Application", queue: UpdateQueue, index: int
+    ) -> None:
+        self.app = app
+        self.logger = getLogger("ingest link")
+        self.queue = queue
+        self.index = index
+        self.closed = asyncio.Event()
+        self._writer: asyncio.StreamWriter | None = None
+        self._reader_task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        path = self.app.config.bot.ipc_path
+        for attempt in range(CONNECT_ATTEMPTS):
+            try:
+                reader, self._writer = await asyncio.open_unix_connection(path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if attempt == CONNECT_ATTEMPTS - 1:
+                    raise
+                await asyncio.sleep(CONNECT_DELAY)
+        self._writer.write(frame(Hello(index=self.index)))
+        self._reader_task = asyncio.create_task(self._read(reader))
+
+    async def _read(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while True:
+                envelope = _envelope_decoder.decode(await read_frame(reader))
+                await self.queue.put((envelope.received_at, envelope.update))
+        except asyncio.IncompleteReadError:
+            self.logger.info("ingest process closed the link")
+        finally:
+            self.closed.set()
+
+    def ack(self, update_id: int) -> None:
+        if self._writer is not None and not self._writer.is_closing():
+            self._writer.write(frame(Ack(update_id=update_id)))
+
+    async def stop(self) -> None:
+        if self._reader_task:
+            self._reader_task.cancel()
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+        if self._writer:
+            self._writer.close()
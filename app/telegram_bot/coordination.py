@@ -0,0 +1,340 @@
+"""Работа нескольких экземпляров бота с общей базой.
+
+Экземпляр, захвативший advisory lock в Postgres, становится лидером:
+он опрашивает Telegram (или устанавливает вебхук) и записывает
+обновления в таблицу входящих. У каждого чата есть постоянный
+владелец - живой экземпляр, выбранный при первом обновлении чата.
+Владелец узнает о новых обновлениях через LISTEN/NOTIFY, захватывает
+их (SELECT ... FOR UPDATE SKIP LOCKED) и удаляет после обработки.
+
+Каждый экземпляр периодически отмечается в таблице экземпляров.
+Лидер передает чаты экземпляров, не отмечавшихся дольше
+`instance_ttl`, живым экземплярам. Если лидер упал, Postgres снимает
+блокировку вместе с его соединением, и лидером становится следующий
+экземпляр. Доставка при смене владельца - "хотя бы один раз".
+"""
+
+import zlib
+from asyncio import Event, Task, create_task, gather, sleep, timeout
+from collections.abc import Awaitable, Callable
+from logging import getLogger
+from typing import TYPE_CHECKING
+
+import msgspec
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.store.bot.accessor import INBOX_CHANNEL
+from app.telegram_bot.cluster import partition
+from app.telegram_bot.decoder import RawUpdate
+from app.telegram_bot.update_queue import UpdateQueue
+
+if TYPE_CHECKING:
+    from app.web.app import Application
+
+__all__ = ("InboxReader", "InboxWriter", "LeaderElection")
+
+WRITE_BATCH = 100
+DELETE_INTERVAL = 0.2
+
+_encoder = msgspec.msgpack.Encoder()
+_decoder = msgspec.msgpack.Decoder(RawUpdate)
+
+
+class LeaderElection:
+    """Выбор лидера через pg_try_advisory_lock.
+
+    Блокировка держится на отдельном соединении. Лидер проверяет его
+    каждые `heartbeat_interval` секунд и, потеряв соединение,
+    перестает быть лидером до следующего захвата блокировки.
+    """
+
+    def __init__(
+        self,
+        app: "Application",
+        on_elected: Callable[[], Awaitable[None]],
+        on_lost: Callable[[], Awaitable[None]],
+    ) -> None:
+        self.app = app
+        self.logger = getLogger("election")
+        self.on_elected = on_elected
+        self.on_lost = on_lost
+        self.is_leader = False
+        self.key = zlib.crc32(
+            f"stock_exchange_bot:{app.config.bot.bot_id}".encode()
+        )
+        self._connection: AsyncConnection | None = None
+        self._task: Task | None = None
+
+        self.app.metrics.gauge(
+            "bot.cluster.leader", lambda: int(self.is_leader)
+        )
+
+    async def _try_lock(self) -> bool:
+        if self._connection is None:
+            connection = await self.app.database.engine.connect()
+            self._connection = await connection.execution_options(
+                isolation_level="AUTOCOMMIT"
+            )
+        result = await self._connection.execute(
+            text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key}
+        )
+        return result.scalar_one()
+
+    async def _check_lock(self) -> None:
+        await self._connection.execute(text("SELECT 1"))
+
+    async def _drop_connection(self) -> None:
+        if self._connection is None:
+            return
+        connection, self._connection = self._connection, None
+        try:
+            await connection.invalidate()
+            await connection.close()
+        except Exception:
+            self.logger.exception("lock connection close failed")
+
+    async def _elect(self) -> None:
+        self.is_leader = True
+        self.logger.info(
+            "instance %s is the leader", self.app.config.bot.instance_id
+        )
+        await self.on_elected()
+
+    async def _resign(self) -> None:
+        self.is_leader = False
+        try:
+            await self.on_lost()
+        except Exception:
+            self.logger.exception("stepping down failed")
+
+    async def _reassign_orphans(self) -> None:
+        config = self.app.config.bot
+        alive = await self.app.store.bot.get_alive_instances(
+            config.instance_ttl
+        )
+        if config.instance_id not in alive:
+            alive.append(config.instance_id)
+            alive.sort()
+        reassigned = await self.app.store.bot.reassign_orphans(
+            leader_id=config.instance_id,
+            ttl=config.instance_ttl,
+            choose_owner=lambda chat_id: alive[partition(chat_id, len(alive))],
+        )
+        if reassigned:
+            self.app.metrics.counter("bot.cluster.reassigned").inc(reassigned)
+            self.logger.warning("%d chats reassigned", reassigned)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if self.is_leader:
+                    await self._check_lock()
+                elif await self._try_lock():
+                    await self._elect()
+            except Exception:
+                # Вместе с соединением Postgres снимает и блокировку.
+                self.logger.exception("advisory lock connection failed")
+                if self.is_leader:
+                    await self._resign()
+                await self._drop_connection()
+            if self.is_leader:
+                try:
+                    await self._reassign_orphans()
+                except Exception:
+                    self.logger.exception("chat reassignment failed")
+            await sleep(self.app.config.bot.heartbeat_interval)
+
+    async def start(self) -> None:
+        self._task = create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await gather(self._task, return_exceptions=True)
+        if self.is_leader:
+            await self._resign()
+            try:
+                await self._connection.execute(
+                    text("SELECT pg_advisory_unlock(:key)"), {"key": self.key}
+                )
+            except Exception:
+                self.logger.exception("advisory unlock failed")
+        await self._drop_connection()
+
+
+class InboxWriter:
+    """Запись принятых лидером обновлений во входящие владельцев чатов."""
+
+    def __init__(
+        self,
+        app: "Application",
+        queue: UpdateQueue,
+        on_done: Callable[[int], None],
+    ) -> None:
+        self.app = app
+        self.logger = getLogger("inbox writer")
+        self.queue = queue
+        self.on_done = on_done
+        self._alive: list[str] = []
+        self._alive_task: Task | None = None
+        self._task: Task | None = None
+
+    async def _refresh_alive(self) -> None:
+        config = self.app.config.bot
+        while True:
+            try:
+                self._alive = await self.app.store.bot.get_alive_instances(
+                    config.instance_ttl
+                )
+            except Exception:
+                self.logger.exception("alive instances refresh failed")
+            await sleep(config.heartbeat_interval)
+
+    def choose_owner(self, chat_id: str) -> str:
+        alive = self._alive or [self.app.config.bot.instance_id]
+        return alive[partition(chat_id, len(alive))]
+
+    async def _write(self) -> None:
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < WRITE_BATCH and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            rows = [
+                (upd.update_id, upd.chat_id, _encoder.encode(upd))
+                for _, upd in batch
+            ]
+            while True:
+                try:
+                    written = await self.app.store.bot.save_inbox(
+                        rows,
+                        instance_id=self.app.config.bot.instance_id,
+                        choose_owner=self.choose_owner,
+                    )
+                    break
+                except Exception:
+                    self.logger.exception("inbox write failed, retrying")
+                    await sleep(1)
+            self.app.metrics.counter("bot.inbox.written").inc(written)
+            for _, upd in batch:
+                self.on_done(upd.update_id)
+                self.queue.task_done()
+
+    async def start(self) -> None:
+        self._alive_task = create_task(self._refresh_alive())
+        self._task = create_task(self._write())
+
+    async def stop(self) -> None:
+        if self._task:
+            await self.queue.join()
+        for task in (self._task, self._alive_task):
+            if task:
+                task.cancel()
+        await gather(
+            *(t for t in (self._task, self._alive_task) if t),
+            return_exceptions=True,
+        )
+
+
+class InboxReader:
+    """Получение обновлений своих чатов из входящих.
+
+    Отмечает экземпляр как живой, ждет уведомления о новых
+    обновлениях (на случай пропущенного уведомления входящие
+    проверяются и раз в `heartbeat_interval`) и захватывает их
+    в локальную очередь обработчика. Обработанные обновления
+    удаляются пачками.
+    """
+
+    def __init__(self, app: "Application", queue: UpdateQueue) -> None:
+        self.app = app
+        self.logger = getLogger("inbox reader")
+        self.queue = queue
+        self.instance_id = app.config.bot.instance_id
+        self._wakeup = Event()
+        self._done: list[int] = []
+        self._listener: AsyncConnection | None = None
+        self._tasks: list[Task] = []
+
+    def _notify(self, connection, pid, channel, payload: str) -> None:
+        if payload == self.instance_id:
+            self._wakeup.set()
+
+    async def _listen(self) -> None:
+        self._listener = await self.app.database.engine.connect()
+        raw = await self._listener.get_raw_connection()
+        await raw.driver_connection.add_listener(INBOX_CHANNEL, self._notify)
+
+    async def _heartbeat(self) -> None:
+        while True:
+            try:
+                await self.app.store.bot.heartbeat(self.instance_id)
+            except Exception:
+                self.logger.exception("heartbeat failed")
+            self._wakeup.set()
+            await sleep(self.app.config.bot.heartbeat_interval)
+
+    async def _claim(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                await self._claim_available()
+            except Exception:
+                self.logger.exception("inbox claim failed")
+
+    async def _claim_available(self) -> None:
+        while True:
+            limit = max(min(WRITE_BATCH, self.queue.free_slots()), 1)
+            claimed = await self.app.store.bot.claim_inbox(
+                self.instance_id, limit
+            )
+            self.app.metrics.counter("bot.inbox.claimed").inc(len(claimed))
+            for payload in claimed:
+                await self.queue.put(_decoder.decode(payload))
+            if len(claimed) < limit:
+                return
+
+    async def _delete_done(self) -> None:
+        while True:
+            await sleep(DELETE_INTERVAL)
+            await self._flush_done()
+
+    async def _flush_done(self) -> None:
+        if not self._done:
+            return
+        done, self._done = self._done, []
+        try:
+            await self.app.store.bot.delete_inbox(
+                self.app.config.bot.bot_id, done
+            )
+        except Exception:
+            self.logger.exception("inbox cleanup failed")
+            self._done.extend(done)
+
+    def done(self, update_id: int) -> None:
+        self._done.append(update_id)
+
+    async def start(self) -> None:
+        # Строки, захваченные прошлым запуском с тем же instance_id,
+        # больше никто не обработает.
+        await self.app.store.bot.release_claims(self.instance_id)
+        await self._listen()
+        self._tasks = [
+            create_task(self._heartbeat()),
+            create_task(self._claim()),
+            create_task(self._delete_done()),
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await gather(*self._tasks, return_exceptions=True)
+        await self._flush_done()
+        try:
+            async with timeout(5):
+                await self.app.store.bot.remove_instance(self.instance_id)
+        except Exception:
+            self.logger.exception("instance deregistration failed")
+        if self._listener:
+            await self._listener.close()
@@ -1,6 +1,9 @@
-from dataclasses import asdict, dataclass, field
+from dataclasses import asdict, dataclass
+
+import msgspec
 
 __all__ = (
+    "BotCommand",
     "CallbackQuery",
     "ForceReply",
     "From",
@@ -15,7 +18,7 @@ __all__ = (
 )
 
 
-@dataclass
+@dataclass(slots=True)
 class ForceReply:
     force_reply: bool
     input_field_placeholder: str
@@ -25,7 +28,7 @@ class ForceReply:
         return asdict(self)
 
 
-@dataclass
+@dataclass(slots=True)
 class InlineKeyboardButton:
     text: str
     url: str = ""
@@ -35,21 +38,22 @@ class InlineKeyboardButton:
         return asdict(self)
 
 
-@dataclass
+@dataclass(slots=True)
 class InlineKeyboardMarkup:
     inline_keyboard: list[list[InlineKeyboardButton]]
 
 
-@dataclass
+@dataclass(slots=True)
 class Message:
     chat_id: str
     text: str = ""
-    reply_markup: dict[str, InlineKeyboardMarkup] = field(default_factory=dict)
+    # Готовый JSON клавиатуры из ReplyMarkupService.
+    reply_markup: msgspec.Raw | None = None
     reply_to_message_id: int | None = None
     parse_mode: str | None = None
 
 
-@dataclass
+@dataclass(slots=True)
 class From:
     telegram_id: int
     first_name: str
@@ -57,12 +61,19 @@ class From:
     username: str | None = None
 
 
-@dataclass
+@dataclass(slots=True)
+class BotCommand:
+    name: str
+    bot_username: str | None = None
+    args: str = ""
+
+
+@dataclass(slots=True)
 class MessageEntity:
     type: str | None = None
 
 
-@dataclass
+@dataclass(slots=True)
 class ReplyMessage:
     message_id: int
     from_: From
@@ -70,7 +81,7 @@ class ReplyMessage:
     text: str
 
 
-@dataclass
+@dataclass(slots=True)
 class UpdateMessage:
     message_id: int
     from_: From
@@ -81,22 +92,24 @@ class UpdateMessage:
     reply_to_message: ReplyMessage | None = None
 
 
-@dataclass
+@dataclass(slots=True)
 class CallbackQuery:
     callback_id: str
     from_: From
     chat_id: str | None = None
     data: str | None = None
     date: int | None = None
+    # Когда обработчик взял обновление (time.monotonic()).
+    dequeued_at: float | None = None
 
 
-@dataclass
+@dataclass(slots=True)
 class UpdateObject:
     message: UpdateMessage | None = None
     callback_query: CallbackQuery | None = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Update:
     update_id: int
     object: UpdateObject
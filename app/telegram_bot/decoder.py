@@ -0,0 +1,98 @@
+"""Декодирование ответов Bot API напрямую из байтов.
+
+Структуры описывают только поля, которые читает бот: остальные поля
+обновлений пропускаются парсером без создания объектов.
+"""
+
+import msgspec
+
+__all__ = (
+    "RawCallbackMessage",
+    "RawCallbackQuery",
+    "RawChat",
+    "RawEntity",
+    "RawMessage",
+    "RawReplyMessage",
+    "RawUpdate",
+    "RawUser",
+    "UpdatesResponse",
+    "decode_update",
+    "decode_updates_response",
+)
+
+
+class RawUser(msgspec.Struct, kw_only=True, gc=False):
+    id: int
+    first_name: str
+    last_name: str | None = None
+    username: str | None = None
+
+
+class RawChat(msgspec.Struct, kw_only=True, gc=False):
+    id: int
+
+
+class RawEntity(msgspec.Struct, kw_only=True, gc=False):
+    type: str
+
+
+class RawReplyMessage(msgspec.Struct, kw_only=True, gc=False):
+    message_id: int
+    from_: RawUser | None = msgspec.field(default=None, name="from")
+    chat: RawChat
+    text: str | None = None
+
+
+class RawMessage(msgspec.Struct, kw_only=True, gc=False):
+    message_id: int
+    from_: RawUser | None = msgspec.field(default=None, name="from")
+    chat: RawChat
+    date: int
+    text: str | None = None
+    entities: list[RawEntity] | None = None
+    reply_to_message: RawReplyMessage | None = None
+
+
+class RawCallbackMessage(msgspec.Struct, kw_only=True, gc=False):
+    chat: RawChat
+    date: int
+
+
+class RawCallbackQuery(msgspec.Struct, kw_only=True, gc=False):
+    id: str
+    from_: RawUser = msgspec.field(name="from")
+    message: RawCallbackMessage | None = None
+    data: str | None = None
+
+
+class RawUpdate(msgspec.Struct, kw_only=True, gc=False):
+    update_id: int
+    message: RawMessage | None = None
+    callback_query: RawCallbackQuery | None = None
+
+    @property
+    def chat_id(self) -> str | None:
+        if self.message is not None:
+            return str(self.message.chat.id)
+        if self.callback_query and self.callback_query.message:
+            return str(self.callback_query.message.chat.id)
+        return None
+
+
+class UpdatesResponse(msgspec.Struct, kw_only=True, gc=False):
+    ok: bool
+    result: list[RawUpdate] = []
+    error_code: int | None = None
+    description: str | None = None
+
+
+_update_decoder = msgspec.json.Decoder(RawUpdate)
+_updates_response_decoder = msgspec.json.Decoder(UpdatesResponse)
+
+
+def decode_update(raw: bytes) -> RawUpdate:
+    return _update_decoder.decode(raw)
+
+
+def decode_updates_response(raw: bytes) -> UpdatesResponse:
+    return _updates_response_decoder.decode(raw)
@@ -1,14 +1,17 @@
 from asyncio import sleep
+from collections.abc import Mapping
+from functools import partial
 from logging import getLogger
 from typing import TYPE_CHECKING
 
-from app.game.models import Exchange, GameUser, Session, Stock
+from app.game.models import GameModel, GameUser, Session, Stock
 from app.telegram_bot.dataclasses import (
     CallbackQuery,
     Message,
     Update,
     UpdateMessage,
 )
+from app.telegram_bot.utils import parse_command
 
 if TYPE_CHECKING:
     from app.web.app import Application
@@ -23,6 +26,11 @@ class MessageManager:
     def __init__(self, app: "Application"):
         self.app = app
         self.logger = getLogger("Message handler")
+        self.commands = {
+            "start": self.start,
+            "stop": self.stop,
+            "info": self.info,
+        }
 
     async def handle_update_message(self, update: Update):
         """Обработка обновлений типа 'message'."""
@@ -31,17 +39,26 @@ class MessageManager:
             obj_message.entities
             and obj_message.entities[0].type == "bot_command"
         ):
-            bot = await self.app.bot.api.get_me()
-            bot_username = bot.username if bot else ""
-            if obj_message.text in ("/start", f"/start@{bot_username}"):
-                await self.start(obj_message=obj_message)
-            elif obj_message.text in ("/stop", f"/stop@{bot_username}"):
-                await self.stop(obj_message=obj_message)
-            elif obj_message.text in ("/info", f"/info@{bot_username}"):
-                await self.info(obj_message=obj_message)
+            await self.handle_command(obj_message=obj_message)
         elif obj_message.reply_to_message:
             await self.start_exchange(obj_message=obj_message)
 
+    async def handle_command(self, obj_message: UpdateMessage) -> None:
+        """Вызов обработчика команды бота."""
+        command = parse_command(obj_message.text)
+        if command is None:
+            return
+        if command.bot_username:
+            bot = self.app.bot.api.get_cached_me()
+            if (
+                bot is None
+                or command.bot_username.lower() != bot.username.lower()
+            ):
+                return
+        handler = self.commands.get(command.name)
+        if handler:
+            await handler(obj_message=obj_message)
+
     async def info(self, obj_message: UpdateMessage) -> None:
         """Выдача информации об акциях игрока."""
         user_telegram_id = obj_message.from_.telegram_id
@@ -50,7 +67,7 @@ class MessageManager:
         )
         game = await self.app.store.game.find_active_game(obj_message.chat_id)
         if not user or not game:
-            text = await self.app.store.game.get_phrase("no_data_available")
+            text = self.app.game.phrases.get("no_data_available")
         else:
             user_name = self.app.game.service.get_user_name(
                 username=user.username, first_name=user.first_name
@@ -80,12 +97,10 @@ class MessageManager:
         )
 
     async def get_quotes(
-        self, chat_id: str, session_id: int | None = None
+        self, chat_id: str, prices: Mapping[int, float]
     ) -> None:
         """Выдача информации по текущим котировкам."""
-        str_stocks_price = await self.app.game.service.get_str_stocks_price(
-            chat_id=chat_id, session_id=session_id
-        )
+        str_stocks_price = self.app.game.service.get_str_stocks_price(prices)
         text = "🎲 Котировки (цена в у.е.):\n" + str_stocks_price
         await self.app.bot.api.send_message(
             message=Message(
@@ -105,9 +120,7 @@ class MessageManager:
             await self.app.bot.api.send_message(
                 message=Message(
                     chat_id=chat_id,
-                    text=await self.app.store.game.get_phrase(
-                        "game_is_already_running"
-                    ),
+                    text=self.app.game.phrases.get("game_is_already_running"),
                 )
             )
             return
@@ -120,26 +133,47 @@ class MessageManager:
         await self.app.bot.api.send_message(
             message=Message(
                 chat_id=chat_id,
-                text=await self.app.store.game.get_phrase("start_message"),
+                text=self.app.game.phrases.get("start_message"),
                 reply_markup=self.app.game.reply_markup.create_start(),
             )
         )
-        await sleep(30)
-        await self.check_count_players(obj_message=obj_message)
+        self.app.bot.api.worker.run_in_background(
+            self.wait_for_players(obj_message=obj_message, game_id=game.id)
+        )
 
-    async def check_count_players(self, obj_message: UpdateMessage) -> None:
+    async def wait_for_players(
+        self, obj_message: UpdateMessage, game_id: int
+    ) -> None:
+        """Ожидание присоединения участников к игре. Проверка идет
+        в очереди чата, после уже полученных нажатий и команд.
+        """
+        await sleep(self.app.config.game.join_timeout)
+        await self.app.bot.api.worker.run_in_lane(
+            obj_message.chat_id,
+            partial(self.check_count_players, obj_message, game_id),
+        )
+
+    async def check_count_players(
+        self, obj_message: UpdateMessage, game_id: int
+    ) -> None:
         """Проверка количества участников игры.
         Уведомление об остановке или старте игры.
         """
         chat_id = obj_message.chat_id
-        game = await self.app.store.game.find_active_game(chat_id)
+        async with self.app.database.session_scope():
+            game = await self.app.store.game.find_active_game(chat_id)
+            if game is None or game.id != game_id:
+                # Игру остановили или в чате уже идет другая.
+                return
+            await self.announce_players(chat_id, game)
+
+    async def announce_players(self, chat_id: str, game: GameModel) -> None:
+        """Остановка игры без участников или объявление ее старта."""
         if len(game.users) < 2:
             await self.app.game.service.deactivate_game(game)
             await self.app.bot.api.send_message(
                 message=Message(
-                    text=await self.app.store.game.get_phrase(
-                        "absence_of_participants"
-                    ),
+                    text=self.app.game.phrases.get("absence_of_participants"),
                     chat_id=chat_id,
                 )
             )
@@ -158,20 +192,20 @@ class MessageManager:
 
         await self.app.bot.api.send_message(
             message=Message(
-                text=await self.app.store.game.get_phrase("game_started")
+                text=self.app.game.phrases.get("game_started")
                 + f"\nИгроки: \n{players_name}",
                 chat_id=chat_id,
             )
         )
         await self.app.bot.api.send_message(
             message=Message(
-                text=await self.app.store.game.get_phrase("session_info"),
+                text=self.app.game.phrases.get("session_info"),
                 chat_id=chat_id,
             )
         )
         await self.app.bot.api.send_message(
             message=Message(
-                text=await self.app.store.game.get_phrase("reply_awaited"),
+                text=self.app.game.phrases.get("reply_awaited"),
                 chat_id=chat_id,
                 reply_markup=self.app.game.reply_markup.continue_further(),
             )
@@ -186,21 +220,16 @@ class MessageManager:
         if game is None:
             self.logger.info("No active game found.")
             return None
-        game_session = await self.app.game.service.create_session(
+        game_session, prices = await self.app.game.service.create_session(
             game_id=game.id
         )
-        stocks = await self.app.store.game.get_stocks()
-        for stock in stocks:
-            await self.app.game.service.create_session_stock(
-                session_id=game_session.id, stock_id=stock.id
-            )
-        await self.get_quotes(chat_id=chat_id, session_id=game_session.id)
+        await self.get_quotes(chat_id=chat_id, prices=prices)
         session_number = game_session.number
         await self.app.bot.api.send_message(
             message=Message(
                 text=f"🎯 Раунд {session_number}. Выберите 👇",
                 chat_id=chat_id,
-                reply_markup=await self.app.game.reply_markup.create_session(),
+                reply_markup=self.app.game.reply_markup.create_session(),
             )
         )
 
@@ -213,9 +242,7 @@ class MessageManager:
         if game is None:
             await self.app.bot.api.send_message(
                 message=Message(
-                    text=await self.app.store.game.get_phrase(
-                        "game_is_already_stopped"
-                    ),
+                    text=self.app.game.phrases.get("game_is_already_stopped"),
                     chat_id=chat_id,
                 )
             )
@@ -233,11 +260,17 @@ class MessageManager:
                 )
             )
             return
-        await self.get_game_result(chat_id=chat_id)
+        game_session = await self.app.store.game.find_game_session(
+            game_id=game.id
+        )
+        if game_session is not None:
+            await self.get_game_result(
+                chat_id=chat_id, game_session=game_session
+            )
         await self.app.game.service.deactivate_game(game=game)
         await self.app.bot.api.send_message(
             message=Message(
-                text=await self.app.store.game.get_phrase("game_stopped"),
+                text=self.app.game.phrases.get("game_stopped"),
                 chat_id=chat_id,
             )
         )
@@ -263,10 +296,10 @@ class MessageManager:
         if game is None:
             self.logger.info("No active game found.")
             return
-        user_telegram_id = obj_message.from_.telegram_id
-        if not self.app.game.service.is_participant(
-            user_telegram_id=user_telegram_id, game=game
-        ):
+        game_user = self.app.game.service.find_participant(
+            user_telegram_id=obj_message.from_.telegram_id, game=game
+        )
+        if game_user is None:
             self.logger.info("User is not a participant in the game.")
             return
         if obj_message.reply_to_message.text:
@@ -280,25 +313,16 @@ class MessageManager:
             if not quantity:
                 self.logger.info("Couldn't parse quantity")
                 return
-            user = await self.app.store.user.get_user_by_telegram_id(
-                telegram_id=user_telegram_id
-            )
-            game_user = await self.app.store.game.find_game_user(
-                user_id=user.id, game_id=game.id
-            )
-            stock = await self.app.store.game.get_stock_by_title(
-                stock_title=stock_title
-            )
-            price = await self.app.game.service.get_price(
-                stock_id=stock.id, game_id=game.id
-            )
+            stock = self.app.game.stocks.by_title(stock_title)
+            if stock is None:
+                self.logger.info("Unknown stock %s", stock_title)
+                return
             if act == self.app.bot.get_description(self.app.bot.BUY):
                 await self.buy_stock(
                     obj_message=obj_message,
                     game_user=game_user,
                     quantity=quantity,
                     stock=stock,
-                    price=price,
                 )
             elif act == self.app.bot.get_description(self.app.bot.SELL):
                 await self.sell_stock(
@@ -306,7 +330,6 @@ class MessageManager:
                     game_user=game_user,
                     quantity=quantity,
                     stock=stock,
-                    price=price,
                 )
 
     async def buy_stock(
@@ -315,42 +338,34 @@ class MessageManager:
         game_user: GameUser,
         quantity: int,
         stock: Stock,
-        price: float,
     ) -> None:
         """Покупка акций."""
         reply_to_message_id = obj_message.message_id
-        cash_balance = game_user.cash_balance
-        new_cash_balance = self.app.game.service.decrease_cash_balance(
-            quantity=quantity, cash_balance=cash_balance, price=price
+        trade = await self.app.store.game.execute_trade(
+            game_id=game_user.game_id,
+            user_id=game_user.user_id,
+            stock_id=stock.id,
+            chat_id=obj_message.chat_id,
+            action=self.app.bot.BUY,
+            quantity=quantity,
         )
-        if not new_cash_balance:
+        if trade is None:
+            self.logger.info("No price for stock %s", stock.title)
+            return
+        if not trade.executed:
             await self.app.bot.api.send_message(
                 message=Message(
-                    text=f"💶 Ваш баланс: {cash_balance}у.е. "
+                    text=f"💶 Ваш баланс: {game_user.cash_balance}у.е. "
                     f"Недостаточно средств для покупки {quantity} "
-                    f"акций {stock.title} 📃 по цене {price}у.е.",
+                    f"акций {stock.title} 📃 по цене {trade.price}у.е.",
                     chat_id=obj_message.chat_id,
                     reply_to_message_id=reply_to_message_id,
                 )
             )
             return
-        game_user.cash_balance = new_cash_balance
-        game_user = await self.app.store.game.save_game_user(
-            game_user=game_user
-        )
-        await self.update_user_stock(
-            game_user=game_user, stock=stock, quantity=quantity
-        )
-        await self.create_exchange(
-            obj_message=obj_message,
-            game_user=game_user,
-            stock=stock,
-            quantity=quantity,
-            action=self.app.bot.BUY,
-        )
         await self.app.bot.api.send_message(
             message=Message(
-                text=f"Ваш баланс: {new_cash_balance}у.е. "
+                text=f"Ваш баланс: {trade.cash_balance}у.е. "
                 f"Вы приобрели акции {stock.title} 📃 "
                 f"в количестве: {quantity}шт.",
                 chat_id=obj_message.chat_id,
@@ -364,55 +379,47 @@ class MessageManager:
         game_user: GameUser,
         quantity: int,
         stock: Stock,
-        price: float,
     ) -> None:
         """Продажа акций."""
         reply_to_message_id = obj_message.message_id
-        user_stock = await self.app.store.game.find_user_stock(
-            user_id=game_user.user_id,
+        trade = await self.app.store.game.execute_trade(
             game_id=game_user.game_id,
+            user_id=game_user.user_id,
             stock_id=stock.id,
+            chat_id=obj_message.chat_id,
+            action=self.app.bot.SELL,
+            quantity=quantity,
         )
-        if not user_stock:
-            await self.app.bot.api.send_message(
-                message=Message(
-                    text="Операция не выполнена. "
-                    f"Акции {stock.title} отсутствуют.",
-                    chat_id=obj_message.chat_id,
-                    reply_to_message_id=reply_to_message_id,
-                )
-            )
+        if trade is None:
+            self.logger.info("No price for stock %s", stock.title)
             return
-        if user_stock.total_quantity < quantity:
+        if not trade.executed:
+            user_stock = await self.app.store.game.find_user_stock(
+                user_id=game_user.user_id,
+                game_id=game_user.game_id,
+                stock_id=stock.id,
+            )
+            if not user_stock:
+                text = (
+                    f"Операция не выполнена. Акции {stock.title} отсутствуют."
+                )
+            else:
+                text = (
+                    "Недостаточно акций 📃 для выполнения этой сделки."
+                    f"Акции {stock.title} доступны в количестве: "
+                    f"{user_stock.total_quantity}шт."
+                )
             await self.app.bot.api.send_message(
                 message=Message(
-                    text=f"Недостаточно акций 📃 для выполнения этой сделки."
-                    f"Акции {stock.title} доступны в количестве: "
-                    f"{user_stock.total_quantity}шт.",
+                    text=text,
                     chat_id=obj_message.chat_id,
                     reply_to_message_id=reply_to_message_id,
                 )
             )
             return
-        user_stock.total_quantity -= quantity
-        await self.app.store.game.save_user_stock(user_stock=user_stock)
-        new_cash_balance = self.app.game.service.increase_cash_balance(
-            quantity=quantity, cash_balance=game_user.cash_balance, price=price
-        )
-        game_user.cash_balance = new_cash_balance
-        game_user = await self.app.store.game.save_game_user(
-            game_user=game_user
-        )
-        await self.create_exchange(
-            obj_message=obj_message,
-            game_user=game_user,
-            stock=stock,
-            quantity=quantity,
-            action=self.app.bot.SELL,
-        )
         await self.app.bot.api.send_message(
             message=Message(
-                text=f"Ваш баланс: {new_cash_balance}у.е. "
+                text=f"Ваш баланс: {trade.cash_balance}у.е. "
                 f"Вы продали акции {stock.title} 📃 "
                 f"в количестве: {quantity}шт.",
                 chat_id=obj_message.chat_id,
@@ -420,80 +427,26 @@ class MessageManager:
             )
         )
 
-    async def update_user_stock(
-        self, game_user: GameUser, stock: Stock, quantity: int
-    ) -> None:
-        user_stock = await self.app.store.game.find_user_stock(
-            user_id=game_user.user_id,
-            game_id=game_user.game_id,
-            stock_id=stock.id,
-        )
-        if not user_stock:
-            await self.app.game.service.create_user_stock(
-                user_id=game_user.user_id,
-                game_id=game_user.game_id,
-                stock_id=stock.id,
-                total_quantity=quantity,
-            )
-        else:
-            user_stock.total_quantity += quantity
-            await self.app.store.game.save_user_stock(user_stock=user_stock)
-
-    async def create_exchange(
-        self,
-        obj_message: UpdateMessage,
-        game_user: GameUser,
-        stock: Stock,
-        quantity: int,
-        action: str,
+    async def get_game_result(
+        self, chat_id: str, game_session: Session
     ) -> None:
-        session = await self.app.store.game.find_game_session(game_user.game_id)
-        exchange = Exchange(
-            user_id=game_user.user_id,
-            session_id=session.id,
-            chat_id=obj_message.chat_id,
-            action=action,
-            stock_id=stock.id,
-            quantity=quantity,
+        """Итоги раунда: капитал игроков по ценам сессии."""
+        standings = await self.app.store.game.get_standings(
+            game_id=game_session.game_id, session_id=game_session.id
         )
-        await self.app.store.game.save_exchange(exchange)
-
-    async def get_game_result(self, chat_id: str) -> None:
-        game = await self.app.store.game.find_active_game(chat_id=chat_id)
-        if not game:
-            self.logger = getLogger("Active game not found")
+        if not standings:
+            self.logger.info("Active game not found")
             return
-        users = {
-            game_user.user_id: f"{self.app.game.service.get_user_name(
-                game_user.user.username, game_user.user.first_name
-            )
-            }"
-            for game_user in game.users
-        }
-        session = await self.app.store.game.find_game_session(game_id=game.id)
-        stock_price = await self.app.store.game.find_stock_prices(
-            session_id=session.id
-        )
-        user_balance = {
-            game_user.user_id: game_user.cash_balance
-            for game_user in game.users
-        }
-        users_stocks = await self.app.store.game.get_users_stocks(
-            game_id=game.id
+        get_user_name = self.app.game.service.get_user_name
+        lines = "\n".join(
+            f"{standing.rank}. "
+            f"{get_user_name(standing.username, standing.first_name)}: "
+            f"{round(standing.net_worth, 2)}"
+            for standing in standings
         )
-        for user_stock in users_stocks:
-            user_balance[user_stock.user_id] += (
-                stock_price[user_stock.stock_id] * user_stock.total_quantity
-            )
-        session_number = session.number
         text = (
             "🎰 Суммарный денежный баланс игрока (в у.е.) после раунда "
-            f"{session_number}:\n{
-                '\n'.join(
-                    [f"{users[key]}: {round(value, 2)}"
-                     for key, value in user_balance.items()]
-                )
-                }"
+            f"{game_session.number}:\n{lines}"
         )
         await self.app.bot.api.send_message(
             message=Message(
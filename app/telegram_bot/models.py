@@ -0,0 +1,81 @@
+from datetime import datetime
+
+from sqlalchemy import ARRAY, BigInteger, Index, LargeBinary, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.store.database.sqlalchemy_base import BaseModel
+
+__all__ = (
+    "BotInstance",
+    "ChatOwner",
+    "InboxUpdate",
+    "PendingUpdate",
+    "ProcessedUpdate",
+    "UpdateCheckpoint",
+)
+
+
+class UpdateCheckpoint(BaseModel):
+    __tablename__ = "update_checkpoint"
+
+    bot_id: Mapped[str] = mapped_column(primary_key=True)
+    update_id: Mapped[int] = mapped_column(BigInteger)
+    processed_ids: Mapped[list[int]] = mapped_column(
+        ARRAY(BigInteger), default=list
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        default=func.now(), onupdate=func.now()
+    )
+
+
+class PendingUpdate(BaseModel):
+    """Принятое, но еще не обработанное обновление. Записывается до
+    того, как следующий getUpdates подтвердит его Telegram.
+    """
+
+    __tablename__ = "pending_update"
+
+    bot_id: Mapped[str] = mapped_column(primary_key=True)
+    update_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    payload: Mapped[bytes] = mapped_column(LargeBinary)
+
+
+class ProcessedUpdate(BaseModel):
+    """Отметка об обработке обновления. Фиксируется в одной транзакции
+    с изменениями обработчика, поэтому повторно доставленное обновление
+    не выполняется второй раз.
+    """
+
+    __tablename__ = "processed_update"
+
+    bot_id: Mapped[str] = mapped_column(primary_key=True)
+    update_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+
+
+class BotInstance(BaseModel):
+    __tablename__ = "bot_instance"
+
+    instance_id: Mapped[str] = mapped_column(primary_key=True)
+    heartbeat_at: Mapped[datetime] = mapped_column(default=func.now())
+
+
+class ChatOwner(BaseModel):
+    __tablename__ = "chat_owner"
+
+    chat_id: Mapped[str] = mapped_column(primary_key=True)
+    instance_id: Mapped[str]
+
+
+class InboxUpdate(BaseModel):
+    __tablename__ = "inbox_update"
+
+    update_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    chat_id: Mapped[str | None]
+    instance_id: Mapped[str]
+    payload: Mapped[bytes] = mapped_column(LargeBinary)
+    created_at: Mapped[datetime] = mapped_column(default=func.now())
+    claimed_at: Mapped[datetime | None]
+
+    __table_args__ = (
+        Index("ix_inbox_update_instance", "instance_id", "claimed_at"),
+    )
@@ -1,29 +1,68 @@
-from asyncio import Queue, Task, create_task
+from asyncio import Task, create_task, gather, sleep
 from logging import getLogger
 from typing import TYPE_CHECKING
 
+from app.telegram_bot.decoder import RawUpdate
+from app.telegram_bot.update_queue import UpdateQueue
+
 if TYPE_CHECKING:
     from app.web.app import Application
 
 
 class Poller:
-    def __init__(self, app: "Application", queue: Queue) -> None:
+    def __init__(
+        self,
+        app: "Application",
+        queue: UpdateQueue,
+        recovered: list[RawUpdate] | None = None,
+    ) -> None:
         self.app = app
         self.logger = getLogger("poller")
         self.is_running = False
         self._poll_task: Task | None = None
         self.queue = queue
+        # Обновления, принятые до перезапуска и не обработанные.
+        self.recovered = recovered or []
 
     async def start(self) -> None:
         self.is_running = True
         self._poll_task = create_task(self.poll())
 
     async def stop(self) -> None:
+        # Незавершенный getUpdates можно прервать: offset еще не сдвинут,
+        # и Telegram отдаст эти обновления повторно.
         self.is_running = False
-        await self._poll_task
+        self._poll_task.cancel()
+        await gather(self._poll_task, return_exceptions=True)
 
     async def poll(self) -> None:
-        while True:
-            result = await self.app.bot.api.poll()
-            if result:
-                self.queue.put_nowait(result)
+        recovered, self.recovered = self.recovered, []
+        for update in recovered:
+            await self.queue.put(update)
+        tracker = self.app.bot.api.tracker
+        while self.is_running:
+            if self.app.config.bot.leader_election:
+                # Следующий getUpdates подтверждает полученные обновления,
+                # к этому моменту они должны быть записаны во входящие.
+                await self.queue.join()
+            # Запрашиваем не больше обновлений, чем помещается в очередь:
+            # пока она заполнена, put ниже ждет и новый getUpdates не уходит.
+            limit = min(self.app.config.bot.poll_limit, self.queue.free_slots())
+            try:
+                updates = await self.app.bot.api.poll(limit=max(limit, 1))
+            except Exception:
+                self.logger.exception("getUpdates failed")
+                await sleep(1)
+                continue
+            accepted = [u for u in updates if tracker.accept(u.update_id)]
+            self.app.metrics.summary("bot.poll.batch_size").observe(
+                len(accepted)
+            )
+            if not accepted:
+                continue
+            self.app.metrics.counter("bot.updates.received").inc(len(accepted))
+            # Следующий getUpdates подтвердит эти обновления Telegram,
+            # до него они должны быть в базе.
+            await tracker.save_pending(accepted)
+            for update in accepted:
+                await self.queue.put(update)
@@ -0,0 +1,12 @@
+from typing import TYPE_CHECKING
+
+from app.telegram_bot.views import WebhookView
+from app.web.config import BotConfig
+
+if TYPE_CHECKING:
+    from app.web.app import Application
+
+
+def setup_routes(app: "Application"):
+    if app.config.bot.mode == BotConfig.WEBHOOK:
+        app.router.add_view(app.config.bot.webhook_path, WebhookView)
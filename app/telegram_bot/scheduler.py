@@ -0,0 +1,252 @@
+import time
+from asyncio import (
+    Event,
+    Semaphore,
+    Task,
+    create_task,
+    gather,
+    sleep,
+    wait_for,
+)
+from collections import deque
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from heapq import heappop, heappush
+from itertools import count
+from logging import getLogger
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from app.web.app import Application
+
+__all__ = ("OutboundRequest", "OutboundScheduler", "TokenBucket")
+
+
+class TokenBucket:
+    __slots__ = ("capacity", "rate", "tokens", "updated_at")
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    def delay(self, now: float) -> float:
+        """Сколько секунд ждать до появления свободного токена."""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+@dataclass(slots=True)
+class OutboundRequest:
+    method: str
+    params: dict
+    chat_id: str | None = None
+    urgent: bool = False
+    # Summary, куда попадает время от постановки (или от latency_from)
+    # до успешной отправки.
+    latency_metric: str | None = None
+    latency_from: float | None = None
+    attempts: int = 0
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class OutboundScheduler:
+    """Планировщик исходящих запросов к Bot API.
+
+    Ограничивает частоту отправки глобально и для каждого чата
+    (token bucket), сохраняет порядок сообщений внутри чата,
+    отправляет ответы на callback-запросы вне очереди и повторяет
+    запрос после `retry_after` при ответе 429.
+    """
+
+    MAX_IN_FLIGHT = 30
+    MAX_ATTEMPTS = 5
+    CLEANUP_INTERVAL = 60
+
+    def __init__(
+        self,
+        app: "Application",
+        send: Callable[[str, dict], Awaitable[dict]],
+    ) -> None:
+        self.app = app
+        self.logger = getLogger("scheduler")
+        self._send = send
+        config = app.config.bot
+        self._global = TokenBucket(config.send_rate, config.send_rate)
+        self._chat_rate = config.chat_send_rate
+        self._chat_burst = config.chat_send_burst
+
+        self._urgent: deque[OutboundRequest] = deque()
+        self._chats: dict[str, deque[OutboundRequest]] = {}
+        self._buckets: dict[str, TokenBucket] = {}
+        self._ready: list[tuple[float, int, str]] = []
+        self._seq = count()
+        self._paused_until: float = 0.0
+        self._cleanup_at: float = 0.0
+        self._pending: int = 0
+
+        self._wakeup = Event()
+        self._slots = Semaphore(self.MAX_IN_FLIGHT)
+        self._task: Task | None = None
+        self._in_flight: set[Task] = set()
+
+        self._wait_time = app.metrics.summary("bot.outbound.wait_time")
+        self._rate_limited = app.metrics.counter("bot.outbound.rate_limited")
+        app.metrics.gauge("bot.outbound.queue_depth", lambda: self._pending)
+
+    def submit(self, request: OutboundRequest) -> None:
+        self._pending += 1
+        if request.urgent or request.chat_id is None:
+            self._urgent.append(request)
+        else:
+            chat_queue = self._chats.get(request.chat_id)
+            if chat_queue is None:
+                self._chats[request.chat_id] = deque((request,))
+                self._schedule_chat(request.chat_id, time.monotonic())
+            else:
+                chat_queue.append(request)
+        self._wakeup.set()
+
+    def _schedule_chat(self, chat_id: str, ready_at: float) -> None:
+        heappush(self._ready, (ready_at, next(self._seq), chat_id))
+
+    def _bucket(self, chat_id: str) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._buckets[chat_id] = TokenBucket(
+                self._chat_rate, self._chat_burst
+            )
+        return bucket
+
+    def _next_request(self, now: float) -> OutboundRequest | None:
+        if self._urgent:
+            return self._urgent.popleft()
+        while self._ready and self._ready[0][0] <= now:
+            _, _, chat_id = heappop(self._ready)
+            bucket = self._bucket(chat_id)
+            delay = bucket.delay(now)
+            if delay:
+                self._schedule_chat(chat_id, now + delay)
+                continue
+            bucket.consume(now)
+            return self._chats[chat_id].popleft()
+        return None
+
+    def _release_chat(self, chat_id: str, ready_at: float) -> None:
+        """Следующее сообщение чата отправляется только после
+        завершения предыдущего, чтобы не нарушать порядок.
+        """
+        if self._chats[chat_id]:
+            self._schedule_chat(chat_id, ready_at)
+        else:
+            del self._chats[chat_id]
+        self._wakeup.set()
+
+    def _cleanup_buckets(self, now: float) -> None:
+        self._cleanup_at = now + self.CLEANUP_INTERVAL
+        for chat_id in [
+            chat_id
+            for chat_id, bucket in self._buckets.items()
+            if chat_id not in self._chats and bucket.is_full(now)
+        ]:
+            del self._buckets[chat_id]
+
+    async def _run(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now >= self._cleanup_at:
+                self._cleanup_buckets(now)
+            delay = max(self._global.delay(now), self._paused_until - now)
+            if delay > 0:
+                await sleep(delay)
+                continue
+            request = self._next_request(now)
+            if request is None:
+                self._wakeup.clear()
+                timeout = self._ready[0][0] - now if self._ready else None
+                try:
+                    await wait_for(self._wakeup.wait(), timeout)
+                except TimeoutError:
+                    pass
+                continue
+            self._global.consume(now)
+            self._pending -= 1
+            await self._slots.acquire()
+            task = create_task(self._execute(request))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _execute(self, request: OutboundRequest) -> None:
+        ready_at = 0.0
+        try:
+            self._wait_time.observe(time.monotonic() - request.created_at)
+            request.attempts += 1
+            data = await self._send(request.method, request.params)
+            if data.get("error_code") == 429:
+                ready_at = self._retry_later(request, data)
+            elif not data.get("ok"):
+                self.logger.warning("%s failed: %s", request.method, data)
+            elif request.latency_metric:
+                started_at = request.latency_from
+                if started_at is None:
+                    started_at = request.created_at
+                self.app.metrics.summary(request.latency_metric).observe(
+                    time.monotonic() - started_at
+                )
+        except Exception:
+            self.logger.exception("%s failed", request.method)
+        finally:
+            self._slots.release()
+            if not request.urgent and request.chat_id is not None:
+                self._release_chat(request.chat_id, ready_at)
+
+    def _retry_later(self, request: OutboundRequest, data: dict) -> float:
+        self._rate_limited.inc()
+        retry_after = data.get("parameters", {}).get("retry_after", 1)
+        self.logger.warning(
+            "%s rate limited, retry after %ss", request.method, retry_after
+        )
+        if request.attempts >= self.MAX_ATTEMPTS:
+            return 0.0
+        ready_at = time.monotonic() + retry_after
+        self._pending += 1
+        if request.urgent or request.chat_id is None:
+            self._paused_until = ready_at
+            self._urgent.appendleft(request)
+        else:
+            self._chats[request.chat_id].appendleft(request)
+        return ready_at
+
+    async def start(self) -> None:
+        self._task = create_task(self._run())
+
+    async def stop(self, timeout: float = 10) -> None:
+        """Отправка оставшихся запросов (не дольше `timeout` секунд)."""
+        deadline = time.monotonic() + timeout
+        while (self._pending or self._in_flight) and (
+            time.monotonic() < deadline
+        ):
+            await sleep(0.05)
+        tasks = [*self._in_flight]
+        if self._task:
+            tasks.append(self._task)
+        for task in tasks:
+            task.cancel()
+        await gather(*tasks, return_exceptions=True)
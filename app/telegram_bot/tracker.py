@@ -0,0 +1,172 @@
+from asyncio import Task, create_task, gather, sleep
+from collections import OrderedDict
+from heapq import heappop, heappush
+from logging import getLogger
+from typing import TYPE_CHECKING
+
+import msgspec
+
+from app.telegram_bot.decoder import RawUpdate
+from app.web.config import BotConfig
+
+if TYPE_CHECKING:
+    from app.web.app import Application
+
+__all__ = ("UpdateTracker",)
+
+_encoder = msgspec.msgpack.Encoder()
+_decoder = msgspec.msgpack.Decoder(RawUpdate)
+
+
+class UpdateTracker:
+    """Учет обработанных обновлений.
+
+    Хранит границу: все принятые обновления с id не больше нее уже
+    обработаны. Граница и обработанные обновления выше нее пачками
+    сохраняются в базу, после перезапуска long polling продолжает
+    с границы, а повторно доставленные обновления отбрасываются.
+
+    В режиме long polling принятые обновления записываются в базу
+    до следующего getUpdates, который подтвердит их Telegram. После
+    перезапуска необработанные обновления берутся оттуда.
+    """
+
+    def __init__(self, app: "Application") -> None:
+        self.app = app
+        self.logger = getLogger("tracker")
+        self.bot_id = app.config.bot.bot_id
+        self.watermark: int | None = None
+        self._restored: int | None = None
+        self._pending: set[int] = set()
+        self._pending_heap: list[int] = []
+        self._processed: OrderedDict[int, None] = OrderedDict()
+        self._max_accepted: int | None = None
+        self._saved: tuple[int | None, int] = (None, 0)
+        self._changes = 0
+        self._flush_task: Task | None = None
+
+        self.app.metrics.gauge(
+            "bot.updates.pending", lambda: len(self._pending)
+        )
+
+    async def load(self) -> list[RawUpdate]:
+        """Загрузка границы. Возвращает принятые до перезапуска,
+        но не обработанные обновления, они уже учтены как принятые.
+        """
+        checkpoint = await self.app.store.bot.get_checkpoint(self.bot_id)
+        if checkpoint is not None:
+            self.watermark = checkpoint.update_id
+            self._max_accepted = checkpoint.update_id
+            self._saved = (self.watermark, self._changes)
+            for update_id in checkpoint.processed_ids:
+                self._remember(update_id)
+            self.logger.info("resume from update %s", self.watermark)
+        # После рестарта в webhook-режиме Telegram может прислать
+        # отложенное обновление ниже границы, поэтому отсечение
+        # по границе и записанные обновления только для long polling.
+        if self.app.config.bot.mode != BotConfig.POLLING:
+            return []
+        self._restored = self.watermark
+        pending = await self.app.store.bot.get_pending_updates(self.bot_id)
+        recovered = [
+            update
+            for update in map(_decoder.decode, pending)
+            if self.accept(update.update_id)
+        ]
+        if recovered:
+            self.logger.info("%d pending updates recovered", len(recovered))
+        return recovered
+
+    def accept(self, update_id: int) -> bool:
+        """Регистрация входящего обновления.
+        Возвращает False для уже обработанного или принятого обновления.
+        """
+        if (
+            (self._restored is not None and update_id <= self._restored)
+            or update_id in self._processed
+            or update_id in self._pending
+        ):
+            self.app.metrics.counter("bot.updates.duplicate").inc()
+            return False
+        self._pending.add(update_id)
+        heappush(self._pending_heap, update_id)
+        if self._max_accepted is None or update_id > self._max_accepted:
+            self._max_accepted = update_id
+        return True
+
+    def forget(self, update_id: int) -> None:
+        """Отмена регистрации обновления, которое не попало в очередь."""
+        self._pending.discard(update_id)
+
+    @property
+    def lowest_pending(self) -> int | None:
+        """Самое раннее принятое, но еще не обработанное обновление."""
+        heap = self._pending_heap
+        while heap and heap[0] not in self._pending:
+            heappop(heap)
+        return heap[0] if heap else None
+
+    def done(self, update_id: int) -> None:
+        self._pending.discard(update_id)
+        self._remember(update_id)
+        self._changes += 1
+        lowest = self.lowest_pending
+        watermark = self._max_accepted if lowest is None else lowest - 1
+        if self.watermark is None or watermark > self.watermark:
+            self.watermark = watermark
+
+    async def save_pending(self, updates: list[RawUpdate]) -> None:
+        """Запись принятых обновлений, пока Telegram их не забыл.
+        Ошибка записи повторяется: без нее getUpdates вызывать нельзя.
+        """
+        rows = [
+            (update.update_id, _encoder.encode(update)) for update in updates
+        ]
+        while True:
+            try:
+                await self.app.store.bot.save_pending_updates(self.bot_id, rows)
+            except Exception:
+                self.logger.exception("pending updates write failed")
+                await sleep(1)
+            else:
+                return
+
+    def _remember(self, update_id: int) -> None:
+        self._processed[update_id] = None
+        if len(self._processed) > self.app.config.bot.dedup_size:
+            self._processed.popitem(last=False)
+
+    async def flush(self) -> None:
+        state = (self.watermark, self._changes)
+        if self.watermark is None or state == self._saved:
+            return
+        processed_ids = [i for i in self._processed if i > self.watermark]
+        await self.app.store.bot.save_checkpoint(
+            bot_id=self.bot_id,
+            update_id=self.watermark,
+            processed_ids=processed_ids,
+            # Граница лидера означает запись во входящие, а не обработку:
+            # отметки удаляются вместе со строками входящих.
+            drop_processed=not self.app.config.bot.leader_election,
+        )
+        self._saved = state
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await sleep(self.app.config.bot.checkpoint_interval)
+            try:
+                await self.flush()
+            except Exception:
+                self.logger.exception("checkpoint flush failed")
+
+    async def start(self) -> None:
+        self._flush_task = create_task(self._flush_periodically())
+
+    async def stop(self) -> None:
+        # Экземпляр, не ставший лидером, границу не ведет.
+        if self._flush_task is None:
+            return
+        self._flush_task.cancel()
+        await gather(self._flush_task, return_exceptions=True)
+        self._flush_task = None
+        await self.flush()
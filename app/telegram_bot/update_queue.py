@@ -0,0 +1,56 @@
+import sys
+import time
+from asyncio import Queue, Semaphore
+from collections import deque
+
+from app.telegram_bot.decoder import RawUpdate
+
+__all__ = ("Unbounded", "UpdateQueue")
+
+
+class Unbounded:
+    """Замена семафора для очереди без ограничения размера."""
+
+    async def acquire(self) -> bool:
+        return True
+
+    def release(self) -> None:
+        return
+
+
+class UpdateQueue(Queue):
+    """Ограниченная очередь входящих обновлений.
+
+    При добавлении обновление получает время поступления,
+    `get` возвращает пару (время поступления, обновление). Обновление,
+    принятое другим процессом, добавляется такой же парой.
+    """
+
+    def _init(self, maxsize: int) -> None:
+        self._queue: deque[tuple[float, RawUpdate]] = deque()
+
+    def _put(self, item: RawUpdate | tuple[float, RawUpdate]) -> None:
+        if isinstance(item, tuple):
+            self._queue.append(item)
+        else:
+            self._queue.append((time.monotonic(), item))
+
+    def _get(self) -> tuple[float, RawUpdate]:
+        return self._queue.popleft()
+
+    def capacity(self) -> Semaphore | Unbounded:
+        """Счетчик обновлений, взятых из очереди и еще не обработанных:
+        не больше `maxsize`, а при `maxsize <= 0` без ограничения, как
+        и сама очередь.
+        """
+        if self.maxsize <= 0:
+            return Unbounded()
+        return Semaphore(self.maxsize)
+
+    def free_slots(self) -> int:
+        if self.maxsize <= 0:
+            return sys.maxsize
+        return self.maxsize - self.qsize()
+
+    def oldest_received_at(self) -> float | None:
+        return self._queue[0][0] if self._queue else None
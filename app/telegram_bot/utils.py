@@ -1,4 +1,7 @@
+import re
+
 from app.telegram_bot.dataclasses import (
+    BotCommand,
     CallbackQuery,
     From,
     MessageEntity,
@@ -7,69 +10,89 @@ from app.telegram_bot.dataclasses import (
     UpdateMessage,
     UpdateObject,
 )
+from app.telegram_bot.decoder import RawUpdate, RawUser
+
+COMMAND_PATTERN = re.compile(
+    r"^/(?P<name>\w+)(?:@(?P<bot_username>\w+))?(?:\s+(?P<args>.*))?$",
+    re.DOTALL,
+)
+
+
+def parse_command(text: str | None) -> BotCommand | None:
+    """Разбор команды вида '/cmd', '/cmd@botname' или '/cmd аргументы'."""
+    match = COMMAND_PATTERN.match(text or "")
+    if match is None:
+        return None
+    return BotCommand(
+        name=match["name"].lower(),
+        bot_username=match["bot_username"],
+        args=(match["args"] or "").strip(),
+    )
+
 
+def parse_user(user: RawUser) -> From:
+    return From(
+        telegram_id=user.id,
+        first_name=user.first_name,
+        last_name=user.last_name,
+        username=user.username,
+    )
 
-def parse_message(result: dict) -> Update:
-    msg = result["message"]
-    msg_from = msg["from"]
-    entities = msg.get("entities")
+
+def parse_message(result: RawUpdate) -> Update | None:
+    """Разбор сообщения. Возвращает None для обновлений без сообщения
+    или без отправителя (например, сообщения от имени канала).
+    """
+    msg = result.message
+    if msg is None or msg.from_ is None:
+        return None
+    entities = msg.entities
     update = Update(
-        update_id=result["update_id"],
+        update_id=result.update_id,
         object=UpdateObject(
             message=UpdateMessage(
-                message_id=msg["message_id"],
-                from_=From(
-                    telegram_id=msg_from["id"],
-                    first_name=msg_from["first_name"],
-                    last_name=msg_from.get("last_name"),
-                    username=msg_from.get("username"),
-                ),
-                chat_id=str(msg["chat"]["id"]),
-                text=msg.get("text"),
-                date=msg["date"],
+                message_id=msg.message_id,
+                from_=parse_user(msg.from_),
+                chat_id=str(msg.chat.id),
+                text=msg.text,
+                date=msg.date,
                 entities=[
                     MessageEntity(
-                        type=entities[-1]["type"] if entities else None,
+                        type=entities[-1].type if entities else None,
                     )
                 ],
                 reply_to_message=None,
             )
         ),
     )
-    reply_to_message = msg.get("reply_to_message")
-    if reply_to_message:
+    reply_to_message = msg.reply_to_message
+    if reply_to_message and reply_to_message.from_ is not None:
         update.object.message.reply_to_message = ReplyMessage(
-            message_id=reply_to_message["message_id"],
-            from_=From(
-                telegram_id=reply_to_message["from"]["id"],
-                first_name=reply_to_message["from"]["first_name"],
-                last_name=reply_to_message["from"].get("last_name"),
-                username=reply_to_message["from"].get("username"),
-            ),
-            chat_id=reply_to_message["chat"]["id"],
-            text=reply_to_message["text"],
+            message_id=reply_to_message.message_id,
+            from_=parse_user(reply_to_message.from_),
+            chat_id=str(reply_to_message.chat.id),
+            text=reply_to_message.text,
         )
     return update
 
 
-def parse_callback_query(result: dict) -> Update:
-    callback = result["callback_query"]
-    callback_from = callback["from"]
-    callback_msg = callback["message"]
+def parse_callback_query(result: RawUpdate) -> Update | None:
+    """Разбор callback-запроса. Возвращает None для обновлений без него
+    или без исходного сообщения (кнопки inline-режима), где нет чата.
+    """
+    callback = result.callback_query
+    if callback is None or callback.message is None:
+        return None
+    callback_msg = callback.message
     return Update(
-        update_id=result["update_id"],
+        update_id=result.update_id,
         object=UpdateObject(
             callback_query=CallbackQuery(
-                callback_id=callback["id"],
-                from_=From(
-                    telegram_id=callback_from["id"],
-                    first_name=callback_from["first_name"],
-                    last_name=callback_from.get("last_name"),
-                    username=callback_from.get("username"),
-                ),
-                chat_id=str(callback_msg["chat"]["id"]),
-                date=callback_msg["date"],
-                data=callback["data"],
+                callback_id=callback.id,
+                from_=parse_user(callback.from_),
+                chat_id=str(callback_msg.chat.id),
+                date=callback_msg.date,
+                data=callback.data,
             ),
         ),
     )
@@ -0,0 +1,50 @@
+from asyncio import QueueFull
+from hmac import compare_digest
+
+import msgspec
+from aiohttp.web_exceptions import (
+    HTTPBadRequest,
+    HTTPForbidden,
+    HTTPServiceUnavailable,
+)
+from aiohttp_apispec import docs, response_schema
+
+from app.telegram_bot.decoder import decode_update
+from app.web.app import View
+from app.web.schemes import OkResponseSchema
+from app.web.utils import json_response
+
+__all__ = ("WebhookView",)
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookView(View):
+    @docs(
+        tags=["bot"],
+        summary="Telegram webhook",
+        description="Receive updates pushed by Telegram Bot API",
+    )
+    @response_schema(OkResponseSchema, 200)
+    async def post(self):
+        secret_token = self.request.app.config.bot.secret_token
+        if not secret_token or not compare_digest(
+            self.request.headers.get(SECRET_TOKEN_HEADER, ""), secret_token
+        ):
+            raise HTTPForbidden(reason="invalid secret token")
+        try:
+            update = decode_update(await self.request.read())
+        except msgspec.MsgspecError as e:
+            raise HTTPBadRequest(reason="invalid update") from e
+        api = self.request.app.bot.api
+        if not api.tracker.accept(update.update_id):
+            return json_response()
+        try:
+            api.queue.put_nowait(update)
+        except QueueFull as e:
+            # Telegram повторит доставку позже.
+            api.tracker.forget(update.update_id)
+            self.request.app.metrics.counter("bot.updates.rejected").inc()
+            raise HTTPServiceUnavailable(reason="update queue is full") from e
+        self.request.app.metrics.counter("bot.updates.received").inc()
+        return json_response()
@@ -1,46 +1,231 @@
-from asyncio import Queue, Task, create_task
+import time
+from asyncio import (
+    Future,
+    Semaphore,
+    Task,
+    create_task,
+    gather,
+    get_running_loop,
+)
+from collections import deque
+from collections.abc import Awaitable, Callable, Coroutine
 from logging import getLogger
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
+from app.telegram_bot.decoder import RawUpdate
+from app.telegram_bot.update_queue import UpdateQueue
 from app.telegram_bot.utils import parse_callback_query, parse_message
 
 if TYPE_CHECKING:
     from app.web.app import Application
 
 
+class LaneJob:
+    """Шаг игрового сценария, выполняемый в очереди чата."""
+
+    __slots__ = ("future", "job")
+
+    def __init__(self, job: Callable[[], Awaitable[Any]]) -> None:
+        self.job = job
+        self.future: Future = get_running_loop().create_future()
+
+    async def run(self) -> None:
+        try:
+            result = await self.job()
+        except Exception as e:
+            if not self.future.cancelled():
+                self.future.set_exception(e)
+        else:
+            if not self.future.cancelled():
+                self.future.set_result(result)
+
+
 class Worker:
+    """Обработчик очереди обновлений.
+
+    Обновления раскладываются по очередям чатов: внутри чата они
+    обрабатываются строго по порядку, разные чаты обрабатываются
+    параллельно (не более `concurrent_workers` одновременно).
+    Очередь чата удаляется, как только в ней не остается обновлений.
+    В очередь чата можно поставить и шаг игрового сценария
+    (`run_in_lane`), чтобы он не пересекался с обновлениями чата.
+
+    В очередях чатов одновременно лежит не больше `queue.maxsize`
+    обновлений, поэтому при отставании обработчиков заполняется общая
+    очередь и прием новых обновлений приостанавливается. Устаревшие
+    обновления отбрасываются без обработки.
+    """
+
     def __init__(
-        self, app: "Application", queue: Queue, concurrent_workers: int
+        self,
+        app: "Application",
+        queue: UpdateQueue,
+        concurrent_workers: int,
+        on_done: Callable[[int], None],
     ):
         self.app = app
         self.logger = getLogger("worker")
         self.concurrent_workers = concurrent_workers
         self.queue = queue
-        self._tasks: list[Task] = []
+        self.on_done = on_done
+        self._semaphore = Semaphore(concurrent_workers)
+        self._dispatcher: Task | None = None
+        self._capacity = queue.capacity()
+        self._lanes: dict[
+            str | None, deque[tuple[float, RawUpdate | LaneJob]]
+        ] = {}
+        self._pending = 0
+        self._tasks: set[Task] = set()
+        self._background_tasks: set[Task] = set()
 
-    async def handle_update(self, upd):
-        if "message" in upd:
-            update = parse_message(upd)
-            await self.app.bot.msg_manager.handle_update_message(update)
-        if "callback_query" in upd:
-            update = parse_callback_query(upd)
-            await self.app.bot.clb_manager.handle_update_callback(update)
+        self.app.metrics.gauge(
+            "bot.worker.active_chats", lambda: len(self._lanes)
+        )
+        self.app.metrics.gauge(
+            "bot.updates.queue_depth",
+            lambda: self.queue.qsize() + self._pending,
+        )
+        self.app.metrics.gauge("bot.updates.oldest_age", self.oldest_age)
 
-    async def _worker(self):
+    def oldest_age(self) -> float:
+        """Сколько секунд ждет самое старое необработанное обновление."""
+        received = [lane[0][0] for lane in self._lanes.values() if lane]
+        queued_at = self.queue.oldest_received_at()
+        if queued_at is not None:
+            received.append(queued_at)
+        return time.monotonic() - min(received) if received else 0.0
+
+    def is_stale(self, received_at: float, upd: RawUpdate) -> bool:
+        config = self.app.config.bot
+        age = time.monotonic() - received_at
+        if config.max_update_age and age > config.max_update_age:
+            return True
+        # На callback-запрос старше нескольких секунд Telegram уже
+        # не примет ответ, а игрок успел нажать кнопку повторно.
+        return bool(
+            upd.callback_query is not None
+            and config.stale_callback_age
+            and age > config.stale_callback_age
+        )
+
+    async def handle_update(self, upd: RawUpdate):
+        """Обработка обновления в одной единице работы: все запросы
+        к базе идут через одно соединение и фиксируются одним commit.
+        """
+        dequeued_at = time.monotonic()
+        message = parse_message(upd)
+        callback = parse_callback_query(upd)
+        if message is None and callback is None:
+            # Без отправителя или чата обработчикам нечего делать.
+            self.app.metrics.counter("bot.updates.unsupported").inc()
+            self.logger.debug(
+                "Update %s is unsupported, skipped", upd.update_id
+            )
+            return
+        async with self.app.database.session_scope():
+            # Обновление, обработанное до падения процесса, может прийти
+            # повторно: из записанных принятых обновлений, после
+            # переподключения к процессу приема или из входящих.
+            if not await self.app.store.bot.mark_processed(
+                self.app.config.bot.bot_id, upd.update_id
+            ):
+                self.app.metrics.counter("bot.updates.replayed").inc()
+                self.logger.warning(
+                    "Update %s already processed, skipped", upd.update_id
+                )
+                return
+            if message is not None:
+                await self.app.bot.msg_manager.handle_update_message(message)
+            if callback is not None:
+                callback.object.callback_query.dequeued_at = dequeued_at
+                await self.app.bot.clb_manager.handle_update_callback(callback)
+
+    async def _dispatch(self):
         while True:
-            upd = await self.queue.get()
-            try:
-                self._handle_task = await create_task(self.handle_update(upd))
-                self._tasks.append(self._handle_task)
-            finally:
-                self.queue.task_done()
+            await self._capacity.acquire()
+            item = await self.queue.get()
+            self._pending += 1
+            self._enqueue(item[1].chat_id, item)
+
+    def _enqueue(
+        self, chat_id: str | None, item: tuple[float, RawUpdate | LaneJob]
+    ) -> None:
+        lane = self._lanes.get(chat_id)
+        if lane is not None:
+            lane.append(item)
+            return
+        self._lanes[chat_id] = deque((item,))
+        # Шаг сценария ставится из его задачи, очередь чата не должна
+        # унаследовать ее единицу работы.
+        task = create_task(
+            self._run_lane(chat_id),
+            context=self.app.database.detached_context(),
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def run_in_lane(
+        self, chat_id: str, job: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Выполнение шага сценария в очереди чата после обновлений чата,
+        уже взятых из общей очереди. Возвращает результат шага.
+        """
+        lane_job = LaneJob(job)
+        self._enqueue(chat_id, (time.monotonic(), lane_job))
+        return await lane_job.future
+
+    async def _run_lane(self, chat_id: str | None):
+        lane = self._lanes[chat_id]
+        try:
+            while lane:
+                received_at, upd = lane[0]
+                if isinstance(upd, LaneJob):
+                    try:
+                        async with self._semaphore:
+                            await upd.run()
+                    finally:
+                        lane.popleft()
+                    continue
+                try:
+                    async with self._semaphore:
+                        if self.is_stale(received_at, upd):
+                            self.app.metrics.counter("bot.updates.shed").inc()
+                            self.logger.warning(
+                                "Update %s is stale, skipped", upd.update_id
+                            )
+                        else:
+                            await self.handle_update(upd)
+                except Exception:
+                    self.logger.exception(
+                        "Update %s handling failed", upd.update_id
+                    )
+                finally:
+                    lane.popleft()
+                    self.on_done(upd.update_id)
+                    self._pending -= 1
+                    self._capacity.release()
+                    self.queue.task_done()
+        finally:
+            del self._lanes[chat_id]
+
+    def run_in_background(self, coro: Coroutine) -> Task:
+        """Запуск долгого игрового сценария (ожидание игроков, раунды)
+        вне очереди чата, чтобы он не задерживал обработку обновлений.
+        Сценарий не наследует единицу работы обновления, запустившего его.
+        """
+        task = create_task(coro, context=self.app.database.detached_context())
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
 
     async def start(self):
-        self._tasks = [
-            create_task(self._worker()) for _ in range(self.concurrent_workers)
-        ]
+        self._dispatcher = create_task(self._dispatch())
 
     async def stop(self):
         await self.queue.join()
-        for task in self._tasks:
-            await task
+        tasks = [*self._tasks, *self._background_tasks]
+        if self._dispatcher:
+            tasks.append(self._dispatcher)
+        for task in tasks:
+            task.cancel()
+        await gather(*tasks, return_exceptions=True)
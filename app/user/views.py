@@ -3,10 +3,13 @@ from aiohttp_apispec import docs, response_schema
 from app.user.schemas import UserListSchema, UserSchema
 from app.web.app import View
 from app.web.mixins import AuthRequiredMixin
+from app.web.serialization import compile_dumper
 from app.web.utils import json_response
 
 __all__ = ("UserListView",)
 
+dump_user = compile_dumper(UserSchema)
+
 
 class UserListView(AuthRequiredMixin, View):
     @docs(
@@ -16,6 +19,7 @@ class UserListView(AuthRequiredMixin, View):
     )
     @response_schema(UserListSchema, 200)
     async def get(self):
-        users = await self.store.user.get_users()
-        raw_users = [UserSchema().dump(user) for user in users]
-        return json_response(data={"users": raw_users})
+        users = await self.store.user.get_users() or []
+        return json_response(
+            data={"users": [dump_user(user) for user in users]}
+        )
@@ -15,6 +15,7 @@ from app.store.database.database import Database
 
 from .config import Config, setup_config
 from .logger import setup_logging
+from .metrics import Metrics, setup_metrics
 from .middlewares import setup_middlewares
 from .routes import setup_routes
 
@@ -32,6 +33,7 @@ class Application(AiohttpApplication):
     bot: Bot | None = None
     game: Game | None = None
     user: User | None = None
+    metrics: Metrics | None = None
 
 
 class Request(AiohttpRequest):
@@ -59,6 +61,10 @@ class View(AiohttpView):
     def data(self) -> dict:
         return self.request.get("data", {})
 
+    @property
+    def querystring(self) -> dict:
+        return self.request.get("querystring", {})
+
 
 app = Application()
 
@@ -66,6 +72,7 @@ app = Application()
 def setup_app(config_path: Path) -> Application:
     setup_logging(app)
     setup_config(app, config_path)
+    setup_metrics(app)
     session_setup(app, EncryptedCookieStorage(app.config.session.key))
     setup_routes(app)
     setup_aiohttp_apispec(
@@ -1,3 +1,5 @@
+import os
+import socket
 import typing
 from dataclasses import dataclass
 from pathlib import Path
@@ -21,12 +23,61 @@ class AdminConfig:
 
 @dataclass
 class BotConfig:
+    POLLING = "polling"
+    WEBHOOK = "webhook"
+
     path: str
     token: str
+    poll_limit: int = 100
+    poll_timeout: int = 30
+    mode: str = POLLING
+    webhook_url: str | None = None
+    webhook_path: str = "/bot.webhook"
+    secret_token: str | None = None
+    send_rate: float = 30.0
+    chat_send_rate: float = 0.33
+    chat_send_burst: int = 3
+    queue_size: int = 1000
+    stale_callback_age: float | None = 15.0
+    max_update_age: float | None = None
+    checkpoint_interval: float = 1.0
+    dedup_size: int = 10000
+    processes: int = 1
+    ipc_path: str = "/tmp/stock_exchange_bot.sock"
+    # Номер процесса-обработчика, задается при его запуске.
+    worker_index: int | None = None
+    leader_election: bool = False
+    instance_id: str | None = None
+    heartbeat_interval: float = 2.0
+    instance_ttl: float = 10.0
+
+    def __post_init__(self) -> None:
+        if self.leader_election and self.processes > 1:
+            raise ValueError(
+                "leader_election and processes > 1 are mutually exclusive"
+            )
+        if self.instance_id is None:
+            self.instance_id = f"{socket.gethostname()}-{os.getpid()}"
 
     def get_token_path(self) -> str:
         return self.path + self.token
 
+    @property
+    def bot_id(self) -> str:
+        return self.token.split(":", 1)[0]
+
+
+@dataclass
+class GameConfig:
+    join_timeout: int = 30
+    round_duration: int = 60
+    rounds: int = 6
+    exchange_page_size: int = 50
+    # больший limit в запросе журнала сделок урезается до этого
+    exchange_page_size_max: int = 500
+    # строк в пачке курсора выгрузки журнала сделок
+    exchange_export_batch: int = 10000
+
 
 @dataclass
 class DatabaseConfig:
@@ -35,6 +86,18 @@ class DatabaseConfig:
     user: str
     password: str
     database: str
+    echo: bool = False
+    pool_size: int = 10
+    max_overflow: int = 10
+    # секунды
+    pool_timeout: float = 10.0
+    pool_recycle: int = 1800
+    pool_pre_ping: bool = True
+    # подготовленных запросов в кэше соединения
+    statement_cache_size: int = 100
+    # подключение через pgbouncer в режиме pool_mode=transaction
+    pgbouncer: bool = False
+    pool_prewarm: int = 5
 
 
 @dataclass
@@ -43,6 +106,7 @@ class Config:
     session: SessionConfig | None = None
     bot: BotConfig | None = None
     database: DatabaseConfig | None = None
+    game: GameConfig | None = None
 
 
 def setup_config(app: "Application", config_path: Path):
@@ -57,9 +121,7 @@ def setup_config(app: "Application", config_path: Path):
             email=raw_config["admin"]["email"],
             password=raw_config["admin"]["password"],
         ),
-        bot=BotConfig(
-            path=raw_config["bot"]["path"],
-            token=raw_config["bot"]["token"],
-        ),
+        bot=BotConfig(**raw_config["bot"]),
         database=DatabaseConfig(**raw_config["database"]),
+        game=GameConfig(**raw_config.get("game", {})),
     )
@@ -0,0 +1,113 @@
+import typing
+from collections import deque
+from collections.abc import Callable
+
+if typing.TYPE_CHECKING:
+    from app.web.app import Application
+
+__all__ = ("Counter", "Gauge", "Metrics", "Summary", "setup_metrics")
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value: int = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+    def snapshot(self) -> int:
+        return self.value
+
+
+class Gauge:
+    __slots__ = ("func", "value")
+
+    def __init__(self, func: Callable[[], float] | None = None) -> None:
+        self.value: float = 0
+        self.func = func
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def snapshot(self) -> float:
+        return self.func() if self.func else self.value
+
+
+class Summary:
+    """Распределение значений: счетчики за все время
+    и перцентили по последним `window` наблюдениям.
+    """
+
+    __slots__ = ("count", "max", "samples", "total")
+
+    def __init__(self, window: int = 1024) -> None:
+        self.count: int = 0
+        self.total: float = 0.0
+        self.max: float = 0.0
+        self.samples: deque[float] = deque(maxlen=window)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.samples.append(value)
+
+    def percentile(self, q: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def snapshot(self) -> dict[str, float]:
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "avg": round(self.total / self.count, 6) if self.count else 0.0,
+            "max": round(self.max, 6),
+            "p50": round(self.percentile(0.5), 6),
+            "p95": round(self.percentile(0.95), 6),
+            "p99": round(self.percentile(0.99), 6),
+        }
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self._metrics: dict[str, Counter | Gauge | Summary] = {}
+
+    def _get(self, name: str, factory: type) -> typing.Any:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = factory()
+        return metric
+
+    def counter(self, name: str) -> Counter:
+        return self._get(name, Counter)
+
+    def gauge(
+        self, name: str, func: Callable[[], float] | None = None
+    ) -> Gauge:
+        gauge = self._get(name, Gauge)
+        if func is not None:
+            gauge.func = func
+        return gauge
+
+    def summary(self, name: str) -> Summary:
+        return self._get(name, Summary)
+
+    def snapshot(self) -> dict:
+        return {
+            name: metric.snapshot()
+            for name, metric in sorted(self._metrics.items())
+        }
+
+
+def setup_metrics(app: "Application") -> None:
+    app.metrics = Metrics()
@@ -0,0 +1,178 @@
+"""Запуск бота в одном или нескольких процессах.
+
+При bot.processes > 1 процесс приема (веб-приложение с long polling или
+вебхуком) раздает обновления процессам-обработчикам через unix-сокет,
+см. app.telegram_bot.cluster. Упавший процесс-обработчик запускается
+заново, неподтвержденные им обновления получает новый процесс.
+"""
+
+import asyncio
+import multiprocessing
+import signal
+import threading
+import time
+from logging import getLogger
+from multiprocessing.connection import wait
+from multiprocessing.process import BaseProcess
+from pathlib import Path
+
+from aiohttp.web import run_app
+
+from app.telegram_bot.cluster import STOP_TIMEOUT
+from app.web.app import Application, setup_app
+from app.web.metrics import Counter
+
+__all__ = ("WorkerSupervisor", "run_cluster", "run_worker_process")
+
+# секунды
+RESPAWN_DELAY = 1.0
+MAX_RESPAWN_DELAY = 30.0
+
+
+async def _serve_worker(config_path: Path, index: int) -> None:
+    app = setup_app(config_path)
+    config = app.config.bot
+    config.worker_index = index
+    # Общий лимит отправки делится между процессами,
+    # лимиты чатов остаются прежними: чат живет в одном процессе.
+    config.send_rate /= config.processes
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, stop.set)
+
+    await app.database.connect()
+    await app.game.phrases.connect(app)
+    await app.game.stocks.connect(app)
+    await app.bot.api.connect(app)
+    await asyncio.wait(
+        [
+            asyncio.create_task(stop.wait()),
+            asyncio.create_task(app.bot.api.link.closed.wait()),
+        ],
+        return_when=asyncio.FIRST_COMPLETED,
+    )
+    await app.bot.api.disconnect(app)
+    await app.game.phrases.disconnect(app)
+    await app.game.stocks.disconnect(app)
+    await app.database.disconnect()
+
+
+def run_worker_process(config_path: Path, index: int) -> None:
+    # Ctrl+C получает вся группа процессов, а обработчик завершается
+    # после процесса приема, когда тот закроет соединение.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_serve_worker(config_path, index))
+
+
+class WorkerSupervisor:
+    """Процессы-обработчики: запуск и перезапуск завершившихся.
+
+    Следит за процессами в отдельном потоке, пока процесс приема
+    работает в run_app. Процесс, завершившийся до остановки приема,
+    запускается заново с тем же номером. Если процесс с этим номером
+    падает сразу после запуска, задержка перед перезапуском удваивается
+    до MAX_RESPAWN_DELAY.
+    """
+
+    def __init__(
+        self, config_path: Path, processes: int, respawns: Counter
+    ) -> None:
+        self.config_path = config_path
+        self.logger = getLogger("supervisor")
+        self.respawns = respawns
+        self._context = multiprocessing.get_context("spawn")
+        self._workers: list[BaseProcess | None] = [None] * processes
+        self._started_at = [0.0] * processes
+        self._delays = [RESPAWN_DELAY] * processes
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(
+            target=self._supervise, name="bot-supervisor", daemon=True
+        )
+
+    def _spawn(self, index: int) -> None:
+        worker = self._context.Process(
+            target=run_worker_process,
+            args=(self.config_path, index),
+            name=f"bot-worker-{index}",
+        )
+        worker.start()
+        self._workers[index] = worker
+        self._started_at[index] = time.monotonic()
+
+    def start(self) -> None:
+        for index in range(len(self._workers)):
+            self._spawn(index)
+        self._thread.start()
+
+    def _supervise(self) -> None:
+        respawn_at: dict[int, float] = {}
+        while not self._stopping.is_set():
+            now = time.monotonic()
+            for index, at in list(respawn_at.items()):
+                if at <= now:
+                    del respawn_at[index]
+                    self._spawn(index)
+                    self.respawns.inc()
+            sentinels = {
+                worker.sentinel: index
+                for index, worker in enumerate(self._workers)
+                if index not in respawn_at
+            }
+            timeout = min([*respawn_at.values(), now + 1.0]) - now
+            for sentinel in wait(list(sentinels), timeout=max(timeout, 0)):
+                if self._stopping.is_set():
+                    return
+                index = sentinels[sentinel]
+                respawn_at[index] = time.monotonic() + self._delay(index)
+                self.logger.warning(
+                    "worker %d exited with code %s, respawn in %.0fs",
+                    index,
+                    self._workers[index].exitcode,
+                    respawn_at[index] - time.monotonic(),
+                )
+
+    def _delay(self, index: int) -> float:
+        """Задержка перезапуска: растет, пока процесс падает быстрее,
+        чем за MAX_RESPAWN_DELAY после запуска.
+        """
+        if time.monotonic() - self._started_at[index] > MAX_RESPAWN_DELAY:
+            self._delays[index] = RESPAWN_DELAY
+        else:
+            self._delays[index] = min(
+                self._delays[index] * 2, MAX_RESPAWN_DELAY
+            )
+        return self._delays[index]
+
+    async def on_shutdown(self, app: Application) -> None:
+        # Процессы завершатся, когда прием закроет соединения с ними,
+        # перезапускать их уже не нужно.
+        self._stopping.set()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        for worker in self._workers:
+            if worker is None:
+                continue
+            worker.join(STOP_TIMEOUT)
+            if worker.is_alive():
+                worker.terminate()
+
+
+def run_cluster(config_path: Path) -> None:
+    app = setup_app(config_path)
+    processes = app.config.bot.processes
+    if processes <= 1:
+        run_app(app)
+        return
+    supervisor = WorkerSupervisor(
+        config_path, processes, app.metrics.counter("bot.cluster.respawns")
+    )
+    app.on_shutdown.append(supervisor.on_shutdown)
+    supervisor.start()
+    try:
+        run_app(app)
+    finally:
+        supervisor.stop()
@@ -0,0 +1,83 @@
+from collections.abc import Callable
+from operator import attrgetter, itemgetter
+from typing import Any
+
+from marshmallow import Schema, fields
+
+__all__ = ("Dumper", "compile_dumper")
+
+Dumper = Callable[[Any], dict]
+
+# Значения этих полей из базы уже годятся для JSON и выводятся как есть.
+_PLAIN_FIELDS = (fields.Int, fields.Str, fields.Bool, fields.Float, fields.Raw)
+
+
+def compile_dumper(
+    schema: Schema | type[Schema], mapping: bool = False
+) -> Dumper:
+    """Функция перевода объекта в словарь по полям схемы marshmallow,
+    собранная один раз.
+
+    Результат совпадает с `schema.dump` для значений тех типов, что
+    отдает база, но без обхода полей схемы и ее хуков на каждой строке:
+    простые поля копируются, вложенные схемы собираются так же, прочие
+    поля сериализуются самим полем.
+
+    При `mapping` объект - плоская строка результата запроса (словарь
+    или RowMapping). Поля вложенной схемы читаются из ключей с именем
+    поля в качестве префикса: `user_id`, `user_telegram_id` для поля
+    `user`, как в строках GameAccessor.get_exchange_page.
+    """
+    return _compile(schema, "" if mapping else None)
+
+
+def _compile(schema: Schema | type[Schema], prefix: str | None) -> Dumper:
+    if isinstance(schema, type):
+        schema = schema()
+    converters = [
+        (field.data_key or name, *_converter(name, field, prefix))
+        for name, field in schema.dump_fields.items()
+    ]
+
+    def dump(obj: Any) -> dict:
+        result = {}
+        for key, getter, convert in converters:
+            value = getter(obj)
+            if value is not None and convert is not None:
+                value = convert(value, obj)
+            result[key] = value
+        return result
+
+    return dump
+
+
+def _converter(
+    name: str, field: fields.Field, prefix: str | None
+) -> tuple[Callable[[Any], Any], Callable[[Any, Any], Any] | None]:
+    attribute = field.attribute or name
+    if prefix is None:
+        getter = attrgetter(attribute)
+    elif isinstance(field, fields.Nested):
+        if field.many:
+            raise ValueError(
+                f"nested list {name!r} can't be read from a flat row"
+            )
+        # Вложенный объект собирается из той же строки.
+        return _compile(field.schema, f"{prefix}{attribute}_"), None
+    else:
+        getter = itemgetter(prefix + attribute)
+    if isinstance(field, _PLAIN_FIELDS):
+        return getter, None
+    if isinstance(field, fields.Nested):
+        return getter, _nested(_compile(field.schema, None), field.many)
+    return getter, _field(field, name)
+
+
+def _nested(dump: Dumper, many: bool) -> Callable[[Any, Any], Any]:
+    if many:
+        return lambda value, obj: [dump(item) for item in value]
+    return lambda value, obj: dump(value)
+
+
+def _field(field: fields.Field, name: str) -> Callable[[Any, Any], Any]:
+    return lambda value, obj: field._serialize(value, name, obj)
@@ -1,9 +1,22 @@
-from aiohttp.web import json_response as aiohttp_json_response
+import msgspec
 from aiohttp.web_response import Response
 
+# msgspec кодирует быстрее json из стандартной библиотеки и сам выводит
+# datetime в ISO 8601.
+_encoder = msgspec.json.Encoder()
+
+
+def _response(data: dict, http_status: int = 200) -> Response:
+    return Response(
+        body=_encoder.encode(data),
+        status=http_status,
+        content_type="application/json",
+        charset="utf-8",
+    )
+
 
 def json_response(data: dict | None = None, status: str = "ok") -> Response:
-    return aiohttp_json_response(
+    return _response(
         data={
             "status": status,
             "data": data or {},
@@ -17,8 +30,8 @@ def error_json_response(
     message: str | None = None,
     data: dict | None = None,
 ):
-    return aiohttp_json_response(
-        status=http_status,
+    return _response(
+        http_status=http_status,
         data={
             "status": status,
             "message": str(message),
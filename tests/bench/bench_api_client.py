@@ -0,0 +1,132 @@
+"""Сравнение клиента Bot API: GET с query string против POST с JSON.
+
+Измеряет стоимость кодирования sendMessage с игровой клавиатурой
+и задержку запросов к локальному FakeBotApi.
+
+Запуск: python -m tests.bench.bench_api_client
+"""
+
+import asyncio
+import json
+import time
+import timeit
+from types import SimpleNamespace
+from urllib.parse import urlencode, urljoin
+
+from aiohttp import ClientSession, TCPConnector
+
+from app.telegram_bot.accessor import TelegramApiAccessor
+from app.web.config import BotConfig
+from app.web.metrics import Metrics, Summary
+from tests.fake_bot_api import FakeBotApi
+
+ENCODE_ROUNDS = 20_000
+REQUESTS = 2_000
+CONCURRENCY = 20
+STOCKS = ("AAPL", "AMZN", "GOOG", "MSFT", "NVDA", "TSLA")
+
+
+def make_params() -> dict:
+    buttons = [
+        {"text": f"{title} {act}", "url": "", "callback_data": f"{act}_{title}"}
+        for title in STOCKS
+        for act in ("buy", "sell")
+    ]
+    buttons.append(
+        {"text": "Пропустить ход", "url": "", "callback_data": "skip"}
+    )
+    return {
+        "chat_id": "-1001234567890",
+        "text": "🎯 Раунд 1. Выберите 👇",
+        "parse_mode": "html",
+        "reply_markup": {
+            "inline_keyboard": [
+                buttons[i : i + 2] for i in range(0, len(buttons), 2)
+            ]
+        },
+    }
+
+
+def legacy_url(host: str, method: str, params: dict) -> str:
+    params = {**params, "reply_markup": json.dumps(params["reply_markup"])}
+    return f"{urljoin(f'{host}/method', method)}?{urlencode(params)}"
+
+
+def bench_encode(accessor: TelegramApiAccessor, host: str) -> None:
+    params = make_params()
+    legacy = timeit.timeit(
+        lambda: legacy_url(host, "sendMessage", params), number=ENCODE_ROUNDS
+    )
+    new = timeit.timeit(
+        lambda: accessor._encoder.encode(params), number=ENCODE_ROUNDS
+    )
+    print(f"encode sendMessage, {ENCODE_ROUNDS} rounds:")
+    print(f"  GET query string: {legacy / ENCODE_ROUNDS * 1e6:8.2f} us/op")
+    print(f"  POST JSON body:   {new / ENCODE_ROUNDS * 1e6:8.2f} us/op")
+
+
+async def run_requests(call) -> Summary:
+    latencies = Summary(window=REQUESTS)
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one() -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            await call()
+            latencies.observe(time.perf_counter() - started)
+
+    await asyncio.gather(*(one() for _ in range(REQUESTS)))
+    return latencies
+
+
+def print_latencies(name: str, summary: Summary, elapsed: float) -> None:
+    snapshot = summary.snapshot()
+    print(
+        f"  {name}: p50 {snapshot['p50'] * 1e3:6.2f} ms, "
+        f"p95 {snapshot['p95'] * 1e3:6.2f} ms, "
+        f"{REQUESTS / elapsed:8.0f} req/s"
+    )
+
+
+async def main() -> None:
+    api = FakeBotApi()
+    path = await api.start()
+    config = BotConfig(path=path, token="TOKEN", mode=BotConfig.WEBHOOK)
+    app = SimpleNamespace(
+        on_startup=[],
+        on_cleanup=[],
+        config=SimpleNamespace(bot=config),
+        metrics=Metrics(),
+    )
+    accessor = TelegramApiAccessor(app)
+    await accessor.connect(app)
+    bench_encode(accessor, accessor.host)
+
+    params = make_params()
+    legacy_session = ClientSession(connector=TCPConnector(ssl=False))
+
+    async def legacy_call() -> None:
+        async with legacy_session.get(
+            legacy_url(accessor.host, "sendMessage", params)
+        ) as response:
+            await response.json()
+
+    async def new_call() -> None:
+        await accessor._request("sendMessage", params)
+
+    print(f"sendMessage latency, {REQUESTS} requests by {CONCURRENCY}:")
+    for name, call in (
+        ("GET query string", legacy_call),
+        ("POST JSON", new_call),
+    ):
+        started = time.perf_counter()
+        summary = await run_requests(call)
+        print_latencies(name, summary, time.perf_counter() - started)
+
+    await legacy_session.close()
+    await accessor.disconnect(app)
+    await api.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,142 @@
+"""Масштабирование обработки обновлений по числу процессов.
+
+Для каждого K из --processes бот запускается отдельным процессом
+(main.py-режим: процесс приема и K обработчиков, при K=1 - один
+процесс) против FakeBotApi и базы из конфига. В --chats чатах
+одновременно отправляется по --messages команд /info, замеряется
+пропускная способность и задержка до ответа бота.
+
+Запуск: python -m tests.bench.bench_cluster --processes 1,2,4
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import yaml
+
+from app.web.metrics import Summary
+from app.web.processes import run_cluster
+from tests.fake_bot_api import FakeBotApi
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+START_TIMEOUT = 60
+
+
+def make_config(args: argparse.Namespace, api_path: str, processes: int):
+    config = yaml.safe_load((BASE_DIR / "etc" / "config.yaml").read_text())
+    directory = Path(tempfile.mkdtemp())
+    config["bot"].update(
+        path=api_path,
+        mode="polling",
+        poll_timeout=1,
+        send_rate=10_000,
+        chat_send_rate=10_000,
+        processes=processes,
+        ipc_path=str(directory / "bot.sock"),
+    )
+    for key in ("host", "port", "user", "password", "database"):
+        value = getattr(args, f"db_{key}")
+        if value is not None:
+            config["database"][key] = value
+    path = directory / "config.yaml"
+    path.write_text(yaml.safe_dump(config))
+    return path
+
+
+async def wait_started(api: FakeBotApi, processes: int) -> None:
+    # getMe вызывает каждый процесс, опрос начинается после него.
+    deadline = time.monotonic() + START_TIMEOUT
+    while len(api.calls_of("getme")) < max(processes, 1) + (
+        processes > 1
+    ) or not api.calls_of("getupdates"):
+        if time.monotonic() > deadline:
+            raise TimeoutError("bot did not start")
+        await asyncio.sleep(0.1)
+    await asyncio.sleep(1)
+
+
+async def run(args: argparse.Namespace, processes: int) -> None:
+    api = FakeBotApi(first_update_id=int(time.time() * 1000))
+    path = make_config(args, await api.start(), processes)
+    bot = multiprocessing.get_context("spawn").Process(
+        target=run_cluster, args=(path,)
+    )
+    bot.start()
+    try:
+        await wait_started(api, processes)
+        latency = Summary(window=args.chats * args.messages)
+        waiters = []
+        started = time.perf_counter()
+        for number in range(args.messages):
+            for chat in range(args.chats):
+                update = api.make_message(
+                    chat_id=-(chat + 1), user_id=chat + 1, text="/info"
+                )
+                message_id = update["message"]["message_id"]
+                waiters.append(
+                    (
+                        time.perf_counter(),
+                        api.expect_message(
+                            -(chat + 1),
+                            lambda params, message_id=message_id: params.get(
+                                "reply_to_message_id"
+                            )
+                            == message_id,
+                        ),
+                    )
+                )
+                api.push_update(update)
+            if number % 10 == 9:
+                await asyncio.sleep(0)
+
+        async def track(pushed_at: float, waiter: asyncio.Future) -> None:
+            await asyncio.wait_for(waiter, args.timeout)
+            latency.observe(time.perf_counter() - pushed_at)
+
+        await asyncio.gather(*(track(*waiter) for waiter in waiters))
+        elapsed = time.perf_counter() - started
+        snapshot = latency.snapshot()
+        print(
+            f"  K={processes}: {len(waiters) / elapsed:8.1f} upd/s, "
+            f"p50 {snapshot['p50'] * 1e3:7.1f} ms, "
+            f"p95 {snapshot['p95'] * 1e3:7.1f} ms"
+        )
+    finally:
+        bot.terminate()
+        # Fake API должен отвечать, пока бот завершается.
+        await asyncio.to_thread(bot.join)
+        await api.stop()
+
+
+async def main(args: argparse.Namespace) -> None:
+    print(
+        f"{args.chats} chats x {args.messages} /info, "
+        f"{os.cpu_count()} CPUs available"
+    )
+    for processes in args.processes:
+        await run(args, processes)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--processes",
+        type=lambda value: [int(v) for v in value.split(",")],
+        default=[1, 2, 4],
+    )
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    for key in ("host", "user", "password", "database"):
+        parser.add_argument(f"--db-{key}")
+    parser.add_argument("--db-port", type=int)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,242 @@
+"""Сравнение разбора ответа getUpdates: json + dict-парсер против
+декодирования байтов в msgspec-структуры.
+
+Печатает время и объем памяти на 1000 обновлений.
+
+Запуск: python -m tests.bench.bench_decode
+"""
+
+import gc
+import json
+import timeit
+import tracemalloc
+from dataclasses import dataclass
+from functools import partial
+
+from app.telegram_bot.decoder import decode_updates_response
+from app.telegram_bot.utils import parse_callback_query, parse_message
+
+UPDATES = 1_000
+ROUNDS = 50
+
+
+@dataclass
+class LegacyFrom:
+    telegram_id: int
+    first_name: str
+    last_name: str | None = None
+    username: str | None = None
+
+
+@dataclass
+class LegacyEntity:
+    type: str | None = None
+
+
+@dataclass
+class LegacyReplyMessage:
+    message_id: int
+    from_: LegacyFrom
+    chat_id: str
+    text: str
+
+
+@dataclass
+class LegacyMessage:
+    message_id: int
+    from_: LegacyFrom
+    chat_id: str
+    date: int
+    entities: list[LegacyEntity]
+    text: str
+    reply_to_message: LegacyReplyMessage | None = None
+
+
+@dataclass
+class LegacyCallbackQuery:
+    callback_id: str
+    from_: LegacyFrom
+    chat_id: str | None = None
+    data: str | None = None
+    date: int | None = None
+
+
+@dataclass
+class LegacyUpdateObject:
+    message: LegacyMessage | None = None
+    callback_query: LegacyCallbackQuery | None = None
+
+
+@dataclass
+class LegacyUpdate:
+    update_id: int
+    object: LegacyUpdateObject
+
+
+def legacy_from(data: dict) -> LegacyFrom:
+    return LegacyFrom(
+        telegram_id=data["id"],
+        first_name=data["first_name"],
+        last_name=data.get("last_name"),
+        username=data.get("username"),
+    )
+
+
+def legacy_parse(result: dict) -> LegacyUpdate:
+    if "callback_query" in result:
+        callback = result["callback_query"]
+        return LegacyUpdate(
+            update_id=result["update_id"],
+            object=LegacyUpdateObject(
+                callback_query=LegacyCallbackQuery(
+                    callback_id=callback["id"],
+                    from_=legacy_from(callback["from"]),
+                    chat_id=str(callback["message"]["chat"]["id"]),
+                    date=callback["message"]["date"],
+                    data=callback["data"],
+                )
+            ),
+        )
+    msg = result["message"]
+    entities = msg.get("entities")
+    reply = msg.get("reply_to_message")
+    return LegacyUpdate(
+        update_id=result["update_id"],
+        object=LegacyUpdateObject(
+            message=LegacyMessage(
+                message_id=msg["message_id"],
+                from_=legacy_from(msg["from"]),
+                chat_id=str(msg["chat"]["id"]),
+                text=msg.get("text"),
+                date=msg["date"],
+                entities=[
+                    LegacyEntity(
+                        type=entities[-1]["type"] if entities else None
+                    )
+                ],
+                reply_to_message=LegacyReplyMessage(
+                    message_id=reply["message_id"],
+                    from_=legacy_from(reply["from"]),
+                    chat_id=reply["chat"]["id"],
+                    text=reply["text"],
+                )
+                if reply
+                else None,
+            )
+        ),
+    )
+
+
+def make_payload() -> bytes:
+    user = {
+        "id": 123456789,
+        "is_bot": False,
+        "first_name": "Player",
+        "last_name": "One",
+        "username": "player_one",
+        "language_code": "ru",
+    }
+    bot = {
+        "id": 1,
+        "is_bot": True,
+        "first_name": "Stock Exchange",
+        "username": "stock_exchange_bot",
+    }
+    chat = {
+        "id": -1001234567890,
+        "title": "Биржа",
+        "type": "supergroup",
+    }
+    keyboard = {
+        "inline_keyboard": [
+            [
+                {"text": f"Купить {i}", "callback_data": f"buy_{i}"},
+                {"text": f"Продать {i}", "callback_data": f"sell_{i}"},
+            ]
+            for i in range(6)
+        ]
+    }
+    updates = []
+    for update_id in range(UPDATES):
+        if update_id % 2:
+            updates.append(
+                {
+                    "update_id": update_id,
+                    "callback_query": {
+                        "id": str(update_id),
+                        "from": user,
+                        "message": {
+                            "message_id": update_id,
+                            "from": bot,
+                            "chat": chat,
+                            "date": 1700000000,
+                            "text": "🎯 Раунд 1. Выберите 👇",
+                            "reply_markup": keyboard,
+                        },
+                        "chat_instance": "-42",
+                        "data": "buy_AAPL",
+                    },
+                }
+            )
+        else:
+            updates.append(
+                {
+                    "update_id": update_id,
+                    "message": {
+                        "message_id": update_id,
+                        "from": user,
+                        "chat": chat,
+                        "date": 1700000000,
+                        "text": "10",
+                        "reply_to_message": {
+                            "message_id": update_id - 1,
+                            "from": bot,
+                            "chat": chat,
+                            "date": 1700000000,
+                            "text": "@player_one, сколько акций AAPL купить?",
+                        },
+                    },
+                }
+            )
+    return json.dumps({"ok": True, "result": updates}).encode()
+
+
+def legacy_decode(payload: bytes) -> list:
+    return [legacy_parse(upd) for upd in json.loads(payload)["result"]]
+
+
+def new_decode(payload: bytes) -> list:
+    return [
+        parse_message(upd) if upd.message else parse_callback_query(upd)
+        for upd in decode_updates_response(payload).result
+    ]
+
+
+def measure_memory(decode, payload: bytes) -> tuple[int, int]:
+    gc.collect()
+    tracemalloc.start()
+    result = decode(payload)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return retained, peak
+
+
+def main() -> None:
+    payload = make_payload()
+    print(f"getUpdates payload: {len(payload)} bytes, {UPDATES} updates")
+    for name, decode in (
+        ("json + dict parser", legacy_decode),
+        ("msgspec structs", new_decode),
+    ):
+        elapsed = timeit.timeit(partial(decode, payload), number=ROUNDS)
+        retained, peak = measure_memory(decode, payload)
+        print(
+            f"  {name:20}: {elapsed / ROUNDS * 1e3:7.2f} ms, "
+            f"retained {retained / 1024:7.1f} KiB, "
+            f"peak {peak / 1024:7.1f} KiB per {UPDATES} updates"
+        )
+
+
+if __name__ == "__main__":
+    main()
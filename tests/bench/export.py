@@ -0,0 +1,173 @@
+"""Потоковая выгрузка журнала сделок через /exchange_logs.export.
+
+В базу добавляется --rows сделок одной игры (INSERT ... SELECT
+generate_series), затем выгрузка скачивается по HTTP в каждом формате
+из --formats с сжатием и без. Печатаются скорость в строках в секунду,
+размер ответа и пиковая память процесса (ru_maxrss), которая при
+потоковой выгрузке не должна расти вместе с --rows. Добавленные строки
+затем удаляются.
+
+Запуск: python -m tests.bench.export --rows 1000000
+"""
+
+import argparse
+import asyncio
+import resource
+import tempfile
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+import yaml
+from aiohttp import ClientSession
+from aiohttp.test_utils import TestServer
+from aiohttp.web_middlewares import middleware
+from sqlalchemy import delete, text
+
+from app.admin.models import AdminModel
+from app.game.models import Exchange, GameModel, Session
+from app.user.models import UserModel
+from app.web.app import setup_app
+from app.web.middlewares import auth_middleware
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+
+
+def make_config(args: argparse.Namespace) -> Path:
+    config = yaml.safe_load((BASE_DIR / "etc" / "config.yaml").read_text())
+    config["database"]["echo"] = False
+    config["game"]["exchange_export_batch"] = args.batch
+    for key in ("host", "port", "user", "password", "database"):
+        value = getattr(args, f"db_{key}")
+        if value is not None:
+            config["database"][key] = value
+    path = Path(tempfile.mkdtemp()) / "config.yaml"
+    path.write_text(yaml.safe_dump(config))
+    return path
+
+
+@middleware
+async def bench_admin(request, handler):
+    request.admin = AdminModel(id=0, email="bench")
+    return await handler(request)
+
+
+async def seed(app, rows: int) -> int:
+    """Сделки одной игры, возвращает id сессии для удаления."""
+    stock_id = app.game.stocks.all()[0].id
+    async with app.database.session_scope() as session:
+        game = GameModel(
+            chat_id="export", is_active=False, created_at=datetime.now()
+        )
+        user = UserModel(telegram_id=int(time.time()), first_name="export")
+        session.add_all([game, user])
+        await session.flush()
+        game_session = Session(game_id=game.id, number=1)
+        session.add(game_session)
+        await session.flush()
+        await session.execute(
+            text(
+                "INSERT INTO exchange (session_id, user_id, chat_id, action, "
+                "stock_id, quantity, execution_time) "
+                "SELECT :session_id, :user_id, 'export', "
+                "CASE WHEN n % 2 = 0 THEN 'buy' ELSE 'sell' END, "
+                ":stock_id, n % 10 + 1, "
+                "localtimestamp - n * interval '1 millisecond' "
+                "FROM generate_series(1, :rows) AS n"
+            ),
+            {
+                "session_id": game_session.id,
+                "user_id": user.id,
+                "stock_id": stock_id,
+                "rows": rows,
+            },
+        )
+        return game_session.id
+
+
+async def download(client: ClientSession, url: str, compress: bool) -> tuple:
+    """Размер ответа и число строк в нем (без заголовка CSV)."""
+    size = 0
+    lines = 0
+    decompressor = zlib.decompressobj(wbits=31) if compress else None
+    async with client.get(url) as response:
+        response.raise_for_status()
+        async for chunk in response.content.iter_chunked(1 << 16):
+            size += len(chunk)
+            data = chunk
+            if decompressor is not None:
+                data = decompressor.decompress(chunk)
+            lines += data.count(b"\n")
+    return size, lines
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def main(args: argparse.Namespace) -> None:
+    app = setup_app(make_config(args))
+    # Бот не запускается, база с каталогами подключается здесь же. Остается
+    # только регистрация схем aiohttp_apispec (обычная функция, а не
+    # метод), без нее строка запроса не разбирается.
+    startup = [hook for hook in app.on_startup if not hasattr(hook, "__self__")]
+    app.on_startup.clear()
+    app.on_startup.extend(startup)
+    app.on_cleanup.clear()
+    # Вход администратора заменяется на подстановку после auth_middleware.
+    app.middlewares.insert(
+        app.middlewares.index(auth_middleware) + 1, bench_admin
+    )
+    await app.database.connect()
+    session_id = await seed(app, args.rows)
+    async with app.database.session_scope() as session:
+        total = await session.scalar(text("SELECT count(*) FROM exchange"))
+    server = TestServer(app)
+    await server.start_server()
+    print(f"{total} exchanges, peak rss {peak_rss_mb():.0f} MB before export")
+    try:
+        async with ClientSession(auto_decompress=False) as client:
+            for export_format in args.formats:
+                for compress in (False, True):
+                    url = server.make_url(
+                        "/exchange_logs.export"
+                        f"?format={export_format}&gzip={str(compress).lower()}"
+                    )
+                    started = time.perf_counter()
+                    size, lines = await download(client, url, compress)
+                    elapsed = time.perf_counter() - started
+                    exported = lines - (export_format == "csv")
+                    print(
+                        f"{export_format:>6} gzip={compress!s:5}: "
+                        f"{exported / elapsed:10.0f} rows/s, "
+                        f"{size / 2**20:8.1f} MB, "
+                        f"complete {exported == total}, "
+                        f"peak rss {peak_rss_mb():.0f} MB"
+                    )
+    finally:
+        await server.close()
+        async with app.database.session_scope() as session:
+            await session.execute(
+                delete(Exchange).filter(Exchange.session_id == session_id)
+            )
+        await app.database.disconnect()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=10_000)
+    parser.add_argument(
+        "--formats",
+        type=lambda value: value.split(","),
+        default=["ndjson", "csv"],
+    )
+    for key in ("host", "user", "password", "database"):
+        parser.add_argument(f"--db-{key}")
+    parser.add_argument("--db-port", type=int)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,217 @@
+"""Смена лидера при нескольких экземплярах бота с общей базой.
+
+Запускает --instances экземпляров бота (bot.leader_election) отдельными
+процессами против FakeBotApi и базы из конфига. Первый запущенный
+экземпляр становится лидером. Пока в --chats чатах идут команды /info,
+лидер убивается SIGKILL. Печатает, через сколько новый лидер начал
+опрос, сколько ответов потеряно или отправлено повторно и наибольшую
+задержку ответа после падения.
+
+Запуск: python -m tests.bench.failover --instances 3
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+import yaml
+from aiohttp.web import run_app
+
+from app.web.app import setup_app
+from tests.fake_bot_api import FakeBotApi
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+START_TIMEOUT = 60
+
+
+def run_instance(config_path: Path, port: int) -> None:
+    # Лог SQL (echo) на одном ядре задерживает сигналы живости.
+    logging.disable(logging.INFO)
+    run_app(setup_app(config_path), port=port, print=None)
+
+
+def make_config(
+    args: argparse.Namespace, api_path: str, directory: Path, index: int
+) -> Path:
+    config = yaml.safe_load((BASE_DIR / "etc" / "config.yaml").read_text())
+    config["bot"].update(
+        path=api_path,
+        mode="polling",
+        poll_timeout=1,
+        send_rate=10_000,
+        chat_send_rate=10_000,
+        leader_election=True,
+        instance_id=f"instance-{index}",
+        heartbeat_interval=args.heartbeat,
+        instance_ttl=args.ttl,
+    )
+    for key in ("host", "port", "user", "password", "database"):
+        value = getattr(args, f"db_{key}")
+        if value is not None:
+            config["database"][key] = value
+    path = directory / f"instance-{index}.yaml"
+    path.write_text(yaml.safe_dump(config))
+    return path
+
+
+async def wait_for(condition, timeout: float, error: str) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError(error)
+        await asyncio.sleep(0.01)
+
+
+class Traffic:
+    """Команды /info по кругу в нескольких чатах с ожиданием ответов."""
+
+    def __init__(self, api: FakeBotApi, chats: int) -> None:
+        self.api = api
+        self.chats = chats
+        # Новые чаты в каждом прогоне: владельцы прошлых остались в базе.
+        self.first_chat = int(time.time()) * 1000
+        self.sent: dict[int, tuple[float, asyncio.Future]] = {}
+        self.replied_at: dict[int, float] = {}
+
+    def push(self, number: int) -> None:
+        chat_id = -(self.first_chat + number % self.chats)
+        update = self.api.make_message(
+            chat_id=chat_id, user_id=-chat_id, text="/info"
+        )
+        message_id = update["message"]["message_id"]
+        future = self.api.expect_message(
+            chat_id,
+            lambda params: params.get("reply_to_message_id") == message_id,
+        )
+        future.add_done_callback(
+            lambda _: self.replied_at.setdefault(message_id, time.monotonic())
+        )
+        self.sent[message_id] = (time.monotonic(), future)
+        self.api.push_update(update)
+
+    async def run(self, rate: float, stop: asyncio.Event) -> None:
+        number = 0
+        while not stop.is_set():
+            self.push(number)
+            number += 1
+            await asyncio.sleep(1 / rate)
+
+    def duplicates(self) -> int:
+        replies = Counter(
+            params.get("reply_to_message_id")
+            for params in self.api.calls_of("sendmessage")
+        )
+        return sum(
+            count - 1
+            for message_id, count in replies.items()
+            if message_id in self.sent and count > 1
+        )
+
+
+async def main(args: argparse.Namespace) -> None:
+    api = FakeBotApi(first_update_id=int(time.time() * 1000))
+    api_path = await api.start()
+    directory = Path(tempfile.mkdtemp())
+    context = multiprocessing.get_context("spawn")
+    instances = [
+        context.Process(
+            target=run_instance,
+            args=(
+                make_config(args, api_path, directory, index),
+                args.port + index,
+            ),
+        )
+        for index in range(args.instances)
+    ]
+    instances[0].start()
+    try:
+        await wait_for(
+            lambda: api.calls_of("getupdates"), START_TIMEOUT, "no leader"
+        )
+        for instance in instances[1:]:
+            instance.start()
+        await wait_for(
+            lambda: len(api.calls_of("getme")) >= args.instances,
+            START_TIMEOUT,
+            "instances did not start",
+        )
+        # Все экземпляры успевают отметиться живыми.
+        await asyncio.sleep(args.heartbeat * 2)
+
+        traffic = Traffic(api, args.chats)
+        stop = asyncio.Event()
+        producer = asyncio.create_task(traffic.run(args.rate, stop))
+        await asyncio.sleep(args.before)
+
+        polls = len(api.calls_of("getupdates"))
+        killed_at = time.monotonic()
+        os.kill(instances[0].pid, signal.SIGKILL)
+        await wait_for(
+            lambda: len(api.calls_of("getupdates")) > polls,
+            args.timeout,
+            "no new leader",
+        )
+        takeover = time.monotonic() - killed_at
+
+        await asyncio.sleep(args.after)
+        stop.set()
+        await producer
+        await asyncio.wait(
+            [future for _, future in traffic.sent.values()],
+            timeout=args.timeout,
+        )
+        lost = sum(not future.done() for _, future in traffic.sent.values())
+        delays = [
+            traffic.replied_at[message_id] - max(sent_at, killed_at)
+            for message_id, (sent_at, _) in traffic.sent.items()
+            if message_id in traffic.replied_at
+            and traffic.replied_at[message_id] > killed_at
+        ]
+        print(
+            f"{args.instances} instances, {args.chats} chats, "
+            f"{len(traffic.sent)} /info at {args.rate:.0f}/s, "
+            f"heartbeat {args.heartbeat} s, ttl {args.ttl} s"
+        )
+        print(f"  new leader polling after {takeover:6.2f} s")
+        print(
+            f"  max reply delay after the kill {max(delays, default=0):6.2f} s"
+        )
+        print(
+            f"  lost replies {lost}, duplicate replies {traffic.duplicates()}"
+        )
+    finally:
+        for instance in instances:
+            if instance.is_alive():
+                instance.terminate()
+        for instance in instances:
+            if instance.pid is not None:
+                await asyncio.to_thread(instance.join)
+        await api.stop()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--instances", type=int, default=3)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=50.0, help="/info в с")
+    parser.add_argument("--heartbeat", type=float, default=1.0, help="с")
+    parser.add_argument("--ttl", type=float, default=5.0, help="с")
+    parser.add_argument("--before", type=float, default=3.0, help="с")
+    parser.add_argument("--after", type=float, default=10.0, help="с")
+    parser.add_argument("--timeout", type=float, default=60.0, help="с")
+    parser.add_argument("--port", type=int, default=18080)
+    for key in ("host", "user", "password", "database"):
+        parser.add_argument(f"--db-{key}")
+    parser.add_argument("--db-port", type=int)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
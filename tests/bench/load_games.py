@@ -0,0 +1,339 @@
+"""Нагрузочный прогон бота: N чатов по M игроков играют полные игры.
+
+Бот запускается в этом же процессе против FakeBotApi и базы из
+конфига. Игроки каждого чата проходят /start, присоединение,
+«Продолжить», в каждом раунде покупку или продажу акции ответом на
+вопрос бота и пропуск хода. Уровни нагрузки (число одновременных игр)
+прогоняются по очереди, для каждого печатаются перцентили задержки
+от отправки обновления до ответа бота, задержка ответа на нажатие
+кнопки (bot.callback.ack_latency), число запросов к базе, выдач
+соединений из пула и фиксаций транзакций на обновление, ожидание
+соединения (db.pool.checkout_wait) и ошибки.
+Уровень считается выдержанным, если нет таймаутов и p95 не превышает
+--slo.
+
+Запуск: python -m tests.bench.load_games --games 5,10,20 --players 3
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+from itertools import count
+from pathlib import Path
+
+import yaml
+from aiohttp import web
+from sqlalchemy import event
+
+from app.web.app import setup_app
+from app.web.metrics import Summary
+from tests.fake_bot_api import FakeBotApi
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+ROUND_HEADER = "🎯 Раунд"
+GAME_OVER = "Игра окончена"
+
+
+class LoadStats:
+    def __init__(self) -> None:
+        self.latency = Summary(window=1_000_000)
+        self.timeouts = 0
+        self.games = 0
+
+
+class GameScript:
+    def __init__(
+        self,
+        api: FakeBotApi,
+        stats: LoadStats,
+        chat_id: int,
+        players: list[int],
+        rounds: int,
+        timeout: float,
+    ) -> None:
+        self.api = api
+        self.stats = stats
+        self.chat_id = chat_id
+        self.players = players
+        self.rounds = rounds
+        self.timeout = timeout
+
+    async def wait(self, future: asyncio.Future, started: float | None) -> dict:
+        """Ожидание ответа бота. Если передано время отправки
+        обновления, задержка ответа попадает в статистику.
+        """
+        try:
+            result = await asyncio.wait_for(future, self.timeout)
+        except TimeoutError:
+            self.stats.timeouts += 1
+            raise
+        if started is not None:
+            self.stats.latency.observe(time.perf_counter() - started)
+        return result
+
+    def expect_text(self, prefix: str) -> asyncio.Future:
+        return self.api.expect_message(
+            self.chat_id, lambda params: params["text"].startswith(prefix)
+        )
+
+    def expect_button(self, callback_data: str) -> asyncio.Future:
+        def has_button(params: dict) -> bool:
+            keyboard = params.get("reply_markup") or {}
+            return any(
+                button.get("callback_data") == callback_data
+                for row in keyboard.get("inline_keyboard", ())
+                for button in row
+            )
+
+        return self.api.expect_message(self.chat_id, has_button)
+
+    def message(
+        self, user_id: int, text: str, reply_to_message: dict | None = None
+    ) -> dict:
+        return self.api.make_message(
+            chat_id=self.chat_id,
+            user_id=user_id,
+            text=text,
+            username=f"player{user_id}",
+            reply_to_message=reply_to_message,
+        )
+
+    def callback(self, user_id: int, data: str) -> dict:
+        return self.api.make_callback(
+            chat_id=self.chat_id,
+            user_id=user_id,
+            data=data,
+            username=f"player{user_id}",
+        )
+
+    async def push(self, update: dict, expected: asyncio.Future) -> dict:
+        started = time.perf_counter()
+        self.api.push_update(update)
+        return await self.wait(expected, started)
+
+    async def join(self, user_id: int) -> None:
+        update = self.callback(user_id, "Join_the_game")
+        answer = self.api.expect_answer(update["callback_query"]["id"])
+        await self.push(update, answer)
+
+    async def trade(self, user_id: int, act: str, stock: str) -> None:
+        question = self.api.expect_message(
+            self.chat_id,
+            lambda params: params["text"].startswith(
+                f"@player{user_id}, сколько акций {stock} "
+            ),
+        )
+        bot_message = await self.push(
+            self.callback(user_id, f"{act}_{stock}"), question
+        )
+        update = self.message(user_id, "1", reply_to_message=bot_message)
+        message_id = update["message"]["message_id"]
+        answer = self.api.expect_message(
+            self.chat_id,
+            lambda params: params.get("reply_to_message_id") == message_id,
+        )
+        await self.push(update, answer)
+
+    async def play_round(self, user_id: int, round_number: int, stock: str):
+        act = "buy" if round_number % 2 else "sell"
+        await self.trade(user_id, act, stock)
+        await self.push(
+            self.callback(user_id, "skip"),
+            self.expect_text(f"@player{user_id} "),
+        )
+
+    async def run(self, stocks: list[str]) -> None:
+        host, *guests = self.players
+        await self.push(
+            self.message(host, "/start"), self.expect_button("Join_the_game")
+        )
+        game_started = self.expect_button("continue")
+        await asyncio.gather(*(self.join(user_id) for user_id in guests))
+        await self.wait(game_started, None)
+        await self.push(
+            self.callback(host, "continue"),
+            self.expect_text(f"{ROUND_HEADER} 1."),
+        )
+        for round_number in range(1, self.rounds + 1):
+            if round_number == self.rounds:
+                next_round = self.expect_text(GAME_OVER)
+            else:
+                next_round = self.expect_text(
+                    f"{ROUND_HEADER} {round_number + 1}."
+                )
+            await asyncio.gather(
+                *(
+                    self.play_round(
+                        user_id,
+                        round_number,
+                        stocks[
+                            (user_id + (round_number - 1) // 2) % len(stocks)
+                        ],
+                    )
+                    for user_id in self.players
+                )
+            )
+            await self.wait(next_round, None)
+        self.stats.games += 1
+
+
+def make_config(args: argparse.Namespace, api_path: str) -> Path:
+    config = yaml.safe_load((BASE_DIR / "etc" / "config.yaml").read_text())
+    config["bot"].update(
+        path=api_path,
+        mode="polling",
+        poll_timeout=1,
+        webhook_url=None,
+    )
+    if not args.telegram_limits:
+        config["bot"].update(send_rate=10_000, chat_send_rate=10_000)
+    config["game"] = {
+        "join_timeout": args.join_timeout,
+        "round_duration": 60,
+        "rounds": args.rounds,
+    }
+    for key in ("host", "port", "user", "password", "database"):
+        value = getattr(args, f"db_{key}")
+        if value is not None:
+            config["database"][key] = value
+    path = Path(tempfile.mkdtemp()) / "config.yaml"
+    path.write_text(yaml.safe_dump(config))
+    return path
+
+
+async def run_level(
+    api: FakeBotApi,
+    app: web.Application,
+    args: argparse.Namespace,
+    games: int,
+    ids: count,
+    stocks: list[str],
+    db: dict[str, int],
+) -> bool:
+    stats = LoadStats()
+    received = app.metrics.counter("bot.updates.received")
+    received_before, db_before = received.value, dict(db)
+    scripts = [
+        GameScript(
+            api=api,
+            stats=stats,
+            chat_id=-next(ids),
+            players=[next(ids) for _ in range(args.players)],
+            rounds=args.rounds,
+            timeout=args.timeout,
+        )
+        for _ in range(games)
+    ]
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(script.run(stocks) for script in scripts), return_exceptions=True
+    )
+    elapsed = time.perf_counter() - started
+    errors = sum(
+        isinstance(r, Exception) and not isinstance(r, TimeoutError)
+        for r in results
+    )
+    updates = received.value - received_before
+    per_update = {
+        key: (value - db_before[key]) / max(updates, 1)
+        for key, value in db.items()
+    }
+    snapshot = stats.latency.snapshot()
+    ack = app.metrics.summary("bot.callback.ack_latency").snapshot()
+    pool_wait = app.metrics.summary("db.pool.checkout_wait").snapshot()
+    sustained = (
+        not stats.timeouts and not errors and snapshot["p95"] <= args.slo
+    )
+    print(
+        f"{games:5} games: {stats.games:5} finished in {elapsed:6.1f} s, "
+        f"{updates / elapsed:7.1f} upd/s, "
+        f"p50 {snapshot['p50'] * 1e3:7.1f} ms, "
+        f"p95 {snapshot['p95'] * 1e3:7.1f} ms, "
+        f"p99 {snapshot['p99'] * 1e3:7.1f} ms, "
+        f"ack p95 {ack['p95'] * 1e3:6.1f} ms, "
+        f"{per_update['queries']:5.1f} queries/upd, "
+        f"{per_update['checkouts']:4.1f} checkouts/upd, "
+        f"{per_update['commits']:4.1f} commits/upd, "
+        f"pool wait p95 {pool_wait['p95'] * 1e3:5.1f} ms, "
+        f"timeouts {stats.timeouts}, errors {errors}, "
+        f"429 {api.rate_limited}" + ("" if sustained else "  <- not sustained")
+    )
+    return sustained
+
+
+async def main(args: argparse.Namespace) -> None:
+    api = FakeBotApi(
+        latency=args.latency / 1e3,
+        jitter=args.jitter / 1e3,
+        rate_limit_ratio=args.rate_limit_ratio,
+        # Бот продолжает с сохраненной границы обновлений,
+        # поэтому id обновлений растут от запуска к запуску.
+        first_update_id=int(time.time() * 1000),
+    )
+    app = setup_app(make_config(args, await api.start()))
+    runner = web.AppRunner(app)
+    await runner.setup()
+    app.database.engine.echo = False
+
+    db = {"queries": 0, "checkouts": 0, "commits": 0}
+    engine = app.database.engine.sync_engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_query(*_) -> None:
+        db["queries"] += 1
+
+    @event.listens_for(engine.pool, "checkout")
+    def count_checkout(*_) -> None:
+        db["checkouts"] += 1
+
+    @event.listens_for(engine, "commit")
+    def count_commit(*_) -> None:
+        db["commits"] += 1
+
+    stocks = [stock.title for stock in await app.store.game.get_stocks()]
+    ids = count(int(time.time()) * 1000)
+    max_sustained = 0
+    print(
+        f"{args.players} players per game, {args.rounds} rounds, "
+        f"Bot API latency {args.latency} ms, 429 ratio {args.rate_limit_ratio}"
+    )
+    for games in args.games:
+        if not await run_level(api, app, args, games, ids, stocks, db):
+            break
+        max_sustained = games
+    print(f"max sustainable concurrent games per process: {max_sustained}")
+
+    await runner.cleanup()
+    await api.stop()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--games",
+        type=lambda value: [int(v) for v in value.split(",")],
+        default=[1, 5, 10, 20, 50, 100],
+        help="уровни нагрузки: число одновременных игр через запятую",
+    )
+    parser.add_argument("--players", type=int, default=3)
+    parser.add_argument("--rounds", type=int, default=6)
+    parser.add_argument("--join-timeout", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=20.0, help="мс")
+    parser.add_argument("--jitter", type=float, default=10.0, help="мс")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0)
+    parser.add_argument(
+        "--telegram-limits",
+        action="store_true",
+        help="оставить лимиты отправки Telegram из конфига",
+    )
+    parser.add_argument("--slo", type=float, default=1.0, help="p95, с")
+    parser.add_argument("--timeout", type=float, default=30.0, help="с")
+    for key in ("host", "user", "password", "database"):
+        parser.add_argument(f"--db-{key}")
+    parser.add_argument("--db-port", type=int)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,317 @@
+"""Проверка планов запросов GameAccessor и UserAccessor.
+
+В одной транзакции, которая затем откатывается, база заполняется
+--games играми (игроки, раунды с ценами, портфели, сделки), таблицы
+анализируются, и методы доступа выполняются на этих данных. Каждый
+выполненный ими запрос разбирается через EXPLAIN при выключенном
+последовательном чтении (enable_seqscan = off): если в плане все равно
+остается Seq Scan по большой таблице или обход всего индекса без
+условия, подходящего индекса нет. Печатает такие запросы и завершается
+с кодом 1.
+
+Запуск: python -m tests.bench.query_plans --games 500
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import yaml
+from sqlalchemy import event, insert, text
+
+from app.game.models import (
+    Exchange,
+    GameModel,
+    GameUser,
+    Session,
+    SessionStock,
+    UserStock,
+)
+from app.user.models import UserModel
+from app.web.app import setup_app
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+# Справочники из нескольких строк читаются целиком.
+SMALL_TABLES = {"stock", "phrase"}
+
+
+def make_config(args: argparse.Namespace) -> Path:
+    config = yaml.safe_load((BASE_DIR / "etc" / "config.yaml").read_text())
+    config["database"]["echo"] = False
+    for key in ("host", "port", "user", "password", "database"):
+        value = getattr(args, f"db_{key}")
+        if value is not None:
+            config["database"][key] = value
+    path = Path(tempfile.mkdtemp()) / "config.yaml"
+    path.write_text(yaml.safe_dump(config))
+    return path
+
+
+async def insert_rows(session, model, rows: list[dict]) -> list[int]:
+    result = await session.execute(insert(model).returning(model.id), rows)
+    return list(result.scalars())
+
+
+async def seed(session, args: argparse.Namespace, stocks: list[int]) -> dict:
+    """Заполнение базы, возвращает ключи последней игры для запросов."""
+    first_id = int(time.time()) * 1000
+    now = datetime.now()
+    game_ids = await insert_rows(
+        session,
+        GameModel,
+        [
+            {
+                "chat_id": str(-(first_id + index)),
+                "is_active": index % 10 == 0,
+                "created_at": now,
+            }
+            for index in range(args.games)
+        ],
+    )
+    user_ids = await insert_rows(
+        session,
+        UserModel,
+        [
+            {"telegram_id": first_id + index, "first_name": "plan"}
+            for index in range(args.games * args.players)
+        ],
+    )
+    players = {
+        game_id: user_ids[index * args.players : (index + 1) * args.players]
+        for index, game_id in enumerate(game_ids)
+    }
+    await insert_rows(
+        session,
+        GameUser,
+        [
+            {"game_id": game_id, "user_id": user_id, "cash_balance": 1000.0}
+            for game_id, users in players.items()
+            for user_id in users
+        ],
+    )
+    session_ids = await insert_rows(
+        session,
+        Session,
+        [
+            {"game_id": game_id, "number": number, "is_finished": False}
+            for game_id in game_ids
+            for number in range(1, args.rounds + 1)
+        ],
+    )
+    await insert_rows(
+        session,
+        SessionStock,
+        [
+            {
+                "session_id": session_id,
+                "stock_id": stock_id,
+                "price": round(random.uniform(10, 50), 2),
+            }
+            for session_id in session_ids
+            for stock_id in stocks
+        ],
+    )
+    await insert_rows(
+        session,
+        UserStock,
+        [
+            {
+                "game_id": game_id,
+                "user_id": user_id,
+                "stock_id": stock_id,
+                "total_quantity": 10,
+            }
+            for game_id, users in players.items()
+            for user_id in users
+            for stock_id in stocks
+        ],
+    )
+    rounds = iter(session_ids)
+    await insert_rows(
+        session,
+        Exchange,
+        [
+            {
+                "session_id": session_id,
+                "user_id": user_id,
+                "chat_id": "plan",
+                "action": "buy",
+                "stock_id": random.choice(stocks),
+                "quantity": 1,
+                "execution_time": now,
+            }
+            for game_id, users in players.items()
+            for session_id in [next(rounds) for _ in range(args.rounds)]
+            for user_id in users
+        ],
+    )
+    await session.execute(
+        text(
+            'ANALYZE game, "user", game_user, session, session_stock, '
+            "user_stock, exchange"
+        )
+    )
+    # Последняя активная игра.
+    index = (args.games - 1) // 10 * 10
+    game_id = game_ids[index]
+    return {
+        "game_id": game_id,
+        "chat_id": str(-(first_id + index)),
+        "user_id": players[game_id][0],
+        "telegram_id": first_id + index * args.players,
+        "session_id": session_ids[(index + 1) * args.rounds - 1],
+        "stock_id": stocks[0],
+    }
+
+
+def accessor_calls(app, keys: dict) -> dict:
+    game, user = app.store.game, app.store.user
+    trade = {
+        "game_id": keys["game_id"],
+        "user_id": keys["user_id"],
+        "stock_id": keys["stock_id"],
+        "chat_id": keys["chat_id"],
+        "quantity": 1,
+    }
+    return {
+        "find_active_game": lambda: game.find_active_game(keys["chat_id"]),
+        "find_game_user": lambda: game.find_game_user(
+            game_id=keys["game_id"], user_id=keys["user_id"]
+        ),
+        "find_game_session": lambda: game.find_game_session(keys["game_id"]),
+        "find_user_stock": lambda: game.find_user_stock(
+            game_id=keys["game_id"],
+            user_id=keys["user_id"],
+            stock_id=keys["stock_id"],
+        ),
+        "find_user_stock_by_user_id": lambda: game.find_user_stock_by_user_id(
+            game_id=keys["game_id"], user_id=keys["user_id"]
+        ),
+        "find_exchanges": lambda: game.find_exchanges(keys["user_id"]),
+        "get_exchange_page": lambda: game.get_exchange_page(limit=51),
+        "get_exchange_page after": lambda: game.get_exchange_page(
+            limit=51, after=(datetime.now(), 2**31)
+        ),
+        "get_exchange_page user": lambda: game.get_exchange_page(
+            limit=51, user_id=keys["user_id"]
+        ),
+        "get_exchange_page session": lambda: game.get_exchange_page(
+            limit=51, session_id=keys["session_id"]
+        ),
+        "get_exchange_page game": lambda: game.get_exchange_page(
+            limit=51, game_id=keys["game_id"], action=app.bot.BUY
+        ),
+        "get_standings": lambda: game.get_standings(
+            game_id=keys["game_id"], session_id=keys["session_id"]
+        ),
+        "execute_trade buy": lambda: game.execute_trade(
+            **trade, action=app.bot.BUY
+        ),
+        "execute_trade sell": lambda: game.execute_trade(
+            **trade, action=app.bot.SELL
+        ),
+        "create_session": lambda: game.create_session(
+            game_id=keys["game_id"], prices={keys["stock_id"]: 10.0}
+        ),
+        "get_user_by_telegram_id": lambda: user.get_user_by_telegram_id(
+            keys["telegram_id"]
+        ),
+    }
+
+
+def full_scans(plan: dict, limited: bool = False) -> list[str]:
+    """Чтения больших таблиц целиком: Seq Scan или обход всего индекса
+    без условия (например, первичного ключа ради ORDER BY id).
+    Обход индекса без условий и фильтров под Limit читает лишь первые
+    строки в нужном порядке и допустим (первая страница журнала).
+    """
+    found = []
+    relation = plan.get("Relation Name")
+    node = plan.get("Node Type")
+    limited = limited or node == "Limit"
+    if relation not in SMALL_TABLES:
+        if node == "Seq Scan":
+            found.append(f"seq scan on {relation}")
+        elif (
+            node in ("Index Scan", "Index Only Scan")
+            and "Index Cond" not in plan
+            and not (limited and "Filter" not in plan)
+        ):
+            found.append(f"full {plan['Index Name']} scan on {relation}")
+    for child in plan.get("Plans", ()):
+        found.extend(full_scans(child, limited))
+    return found
+
+
+async def explain_calls(app, args: argparse.Namespace) -> list[tuple]:
+    """Заполнение базы и разбор запросов методов доступа в транзакции,
+    которая затем откатывается. Возвращает для каждого запроса имя
+    метода, текст запроса и найденные чтения таблиц целиком.
+    """
+    stocks = [stock.id for stock in app.game.stocks.all()]
+    captured: list[tuple[str, tuple]] = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and not statement.startswith("EXPLAIN"):
+            captured.append((statement, parameters))
+
+    engine = app.database.engine.sync_engine
+    event.listen(engine, "before_cursor_execute", capture)
+    plans = []
+    try:
+        async with app.database.session_scope() as session:
+            keys = await seed(session, args, stocks)
+            connection = await session.connection()
+            await connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+            for name, call in accessor_calls(app, keys).items():
+                captured.clear()
+                await call()
+                # EXPLAIN-запросы в список не попадают.
+                for statement, parameters in captured:
+                    result = await connection.exec_driver_sql(
+                        "EXPLAIN (FORMAT JSON) " + statement, parameters
+                    )
+                    # asyncpg возвращает json уже разобранным.
+                    plan = result.scalar_one()[0]["Plan"]
+                    plans.append((name, statement, full_scans(plan)))
+            await session.rollback()
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    return plans
+
+
+async def main(args: argparse.Namespace) -> int:
+    app = setup_app(make_config(args))
+    await app.database.connect()
+    try:
+        plans = await explain_calls(app, args)
+    finally:
+        await app.database.disconnect()
+    failed = 0
+    for name, statement, scans in plans:
+        print(f"{name:28} {', '.join(scans) if scans else 'ok'}")
+        if scans:
+            failed += 1
+            print("    " + " ".join(statement.split()))
+    print(f"{failed} queries with full scans")
+    return 1 if failed else 0
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--games", type=int, default=500)
+    parser.add_argument("--players", type=int, default=3)
+    parser.add_argument("--rounds", type=int, default=3)
+    for key in ("host", "user", "password", "database"):
+        parser.add_argument(f"--db-{key}")
+    parser.add_argument("--db-port", type=int)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,156 @@
+"""Скорость сериализации ответов админского API.
+
+Без базы: --users объектов UserModel (как у /users) и --exchanges
+строк журнала сделок (как у /exchange_logs) переводятся в JSON-ответ
+тремя способами: схема на каждую строку и json из стандартной
+библиотеки (как было), одна схема с many=True и тот же json, и
+собранная один раз функция compile_dumper с кодированием msgspec
+(как сейчас). Печатаются строки в секунду,
+медиана из --repeat прогонов, и совпадение разобранных ответов.
+
+Запуск: python -m tests.bench.serialization --users 10000 --exchanges 100000
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from aiohttp.web import json_response as aiohttp_json_response
+
+from app.game.schemas import ExchangeSchema
+from app.game.views import dump_exchange
+from app.user.models import UserModel
+from app.user.schemas import UserSchema
+from app.user.views import dump_user
+from app.web.utils import json_response
+
+
+def make_users(count: int) -> list[UserModel]:
+    return [
+        UserModel(
+            id=index,
+            telegram_id=10**9 + index,
+            first_name=f"user{index}",
+            last_name=None,
+            username=f"nick{index}" if index % 2 else None,
+        )
+        for index in range(count)
+    ]
+
+
+def make_exchanges(count: int) -> list[dict]:
+    """Строки в виде результата GameAccessor.get_exchange_page."""
+    started = datetime.now()
+    return [
+        {
+            "id": index,
+            "session_id": index // 100,
+            "chat_id": "-100",
+            "action": random.choice(("buy", "sell")),
+            "stock_id": index % 6,
+            "quantity": random.randint(1, 10),
+            "execution_time": started - timedelta(microseconds=index * 997),
+            "user_id": index % 50,
+            "user_telegram_id": 10**9 + index % 50,
+            "user_first_name": "user",
+            "user_last_name": None,
+            "user_username": "nick",
+            "stock_title": "Apple",
+        }
+        for index in range(count)
+    ]
+
+
+def stdlib_response(key: str, rows: list[dict]) -> bytes:
+    return aiohttp_json_response(
+        data={"status": "ok", "data": {key: rows}}
+    ).body
+
+
+def user_variants(users: list[UserModel]) -> dict:
+    return {
+        "schema per row": lambda: stdlib_response(
+            "users", [UserSchema().dump(user) for user in users]
+        ),
+        "many=True": lambda: stdlib_response(
+            "users", UserSchema(many=True).dump(users)
+        ),
+        "compiled": lambda: json_response(
+            data={"users": [dump_user(user) for user in users]}
+        ).body,
+    }
+
+
+def nest(row: dict) -> dict:
+    """Строка журнала с вложенными игроком и акцией, как объект Exchange
+    со связями, который схема читала раньше.
+    """
+    return {
+        **row,
+        "user": {
+            "id": row["user_id"],
+            "telegram_id": row["user_telegram_id"],
+            "first_name": row["user_first_name"],
+            "last_name": row["user_last_name"],
+            "username": row["user_username"],
+        },
+        "stock": {"id": row["stock_id"], "title": row["stock_title"]},
+    }
+
+
+def exchange_variants(rows: list[dict]) -> dict:
+    nested = [nest(row) for row in rows]
+    return {
+        "schema per row": lambda: stdlib_response(
+            "exchanges", [ExchangeSchema().dump(row) for row in nested]
+        ),
+        "many=True": lambda: stdlib_response(
+            "exchanges", ExchangeSchema(many=True).dump(nested)
+        ),
+        "compiled": lambda: json_response(
+            data={"exchanges": [dump_exchange(row) for row in rows]}
+        ).body,
+    }
+
+
+def run(name: str, count: int, variants: dict, repeat: int) -> None:
+    bodies = {}
+    for variant, call in variants.items():
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            bodies[variant] = call()
+            timings.append(time.perf_counter() - started)
+        median = statistics.median(timings)
+        print(
+            f"{count:7} {name:9} {variant:>15}: "
+            f"{count / median:12.0f} rows/s, {median * 1e3:8.1f} ms"
+        )
+    parsed = [json.loads(body) for body in bodies.values()]
+    same = all(body == parsed[0] for body in parsed)
+    print(f"{count:7} {name:9} responses match {same}")
+
+
+def main(args: argparse.Namespace) -> None:
+    run("users", args.users, user_variants(make_users(args.users)), args.repeat)
+    run(
+        "exchanges",
+        args.exchanges,
+        exchange_variants(make_exchanges(args.exchanges)),
+        args.repeat,
+    )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--exchanges", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,214 @@
+"""Подсчет итогов раунда: прежний подсчет в Python против get_standings.
+
+Для каждого размера из --players создается активная игра с сессией,
+ценами всех акций и случайным портфелем у каждого игрока. Итоги
+считаются --repeat раз прежним способом (игра с игроками, сессия,
+цены, все UserStock и сложение в Python) и одним запросом
+GameAccessor.get_standings. Печатаются медиана и p95 времени,
+число запросов к базе и совпадение капитала игроков.
+
+Запуск: python -m tests.bench.standings --players 10,100,1000
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from itertools import count
+from pathlib import Path
+
+import yaml
+from sqlalchemy import event, select
+
+from app.game.models import (
+    GameModel,
+    GameUser,
+    Session,
+    SessionStock,
+    UserStock,
+)
+from app.user.models import UserModel
+from app.web.app import setup_app
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+
+
+def make_config(args: argparse.Namespace) -> Path:
+    config = yaml.safe_load((BASE_DIR / "etc" / "config.yaml").read_text())
+    config["database"]["echo"] = False
+    for key in ("host", "port", "user", "password", "database"):
+        value = getattr(args, f"db_{key}")
+        if value is not None:
+            config["database"][key] = value
+    path = Path(tempfile.mkdtemp()) / "config.yaml"
+    path.write_text(yaml.safe_dump(config))
+    return path
+
+
+async def create_game(app, players: int, ids: count) -> tuple[str, Session]:
+    stocks = app.game.stocks.all()
+    chat_id = str(-next(ids))
+    async with app.database.session_scope() as session:
+        game = GameModel(
+            chat_id=chat_id, is_active=True, created_at=datetime.now()
+        )
+        users = [
+            UserModel(telegram_id=next(ids), first_name=f"player{index}")
+            for index in range(players)
+        ]
+        session.add(game)
+        session.add_all(users)
+        await session.flush()
+        game_session = Session(game_id=game.id, number=1)
+        session.add(game_session)
+        session.add_all(
+            GameUser(
+                user_id=user.id,
+                game_id=game.id,
+                cash_balance=round(random.uniform(0, 1000), 2),
+            )
+            for user in users
+        )
+        await session.flush()
+        session.add_all(
+            SessionStock(
+                session_id=game_session.id,
+                stock_id=stock.id,
+                price=round(random.uniform(10, 50), 2),
+            )
+            for stock in stocks
+        )
+        session.add_all(
+            UserStock(
+                user_id=user.id,
+                game_id=game.id,
+                stock_id=stock.id,
+                total_quantity=random.randint(0, 20),
+            )
+            for user in users
+            for stock in random.sample(stocks, k=len(stocks) // 2)
+        )
+    return chat_id, game_session
+
+
+async def legacy_net_worth(app, chat_id: str) -> dict[int, float]:
+    """Подсчет так, как его вел MessageManager до get_standings."""
+    store = app.store.game
+    game = await store.find_active_game(chat_id=chat_id)
+    session = await store.find_game_session(game_id=game.id)
+    async with app.database.session_scope() as db_session:
+        stock_price = dict(
+            (
+                await db_session.execute(
+                    select(SessionStock.stock_id, SessionStock.price).filter(
+                        SessionStock.session_id == session.id
+                    )
+                )
+            ).all()
+        )
+    user_balance = {
+        game_user.user_id: game_user.cash_balance for game_user in game.users
+    }
+    async with app.database.session_scope() as db_session:
+        users_stocks = await db_session.scalars(
+            select(UserStock).filter(UserStock.game_id == game.id)
+        )
+    for user_stock in users_stocks:
+        user_balance[user_stock.user_id] += (
+            stock_price[user_stock.stock_id] * user_stock.total_quantity
+        )
+    return user_balance
+
+
+async def standings_net_worth(
+    app, chat_id: str, game_session: Session
+) -> dict[int, float]:
+    standings = await app.store.game.get_standings(
+        game_id=game_session.game_id, session_id=game_session.id
+    )
+    return {standing.user_id: standing.net_worth for standing in standings}
+
+
+async def measure(call, repeat: int, queries: list[int]):
+    timings = []
+    before = queries[0]
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = await call()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return (
+        result,
+        statistics.median(timings),
+        timings[min(len(timings) - 1, int(0.95 * len(timings)))],
+        (queries[0] - before) / repeat,
+    )
+
+
+async def main(args: argparse.Namespace) -> None:
+    app = setup_app(make_config(args))
+    await app.database.connect()
+    queries = [0]
+
+    @event.listens_for(app.database.engine.sync_engine, "before_cursor_execute")
+    def count_query(*_) -> None:
+        queries[0] += 1
+
+    ids = count(int(time.time()) * 1000)
+    try:
+        for players in args.players:
+            chat_id, game_session = await create_game(app, players, ids)
+            try:
+                legacy = await measure(
+                    lambda chat_id=chat_id: legacy_net_worth(app, chat_id),
+                    args.repeat,
+                    queries,
+                )
+                aggregate = await measure(
+                    lambda chat_id=chat_id, game_session=game_session: (
+                        standings_net_worth(app, chat_id, game_session)
+                    ),
+                    args.repeat,
+                    queries,
+                )
+            finally:
+                async with app.database.session_scope() as session:
+                    game = await session.get(GameModel, game_session.game_id)
+                    game.is_active = False
+            same = legacy[0].keys() == aggregate[0].keys() and all(
+                abs(legacy[0][user_id] - net_worth) < 1e-6
+                for user_id, net_worth in aggregate[0].items()
+            )
+            for name, (_, median, p95, per_call) in (
+                ("python", legacy),
+                ("sql", aggregate),
+            ):
+                print(
+                    f"{players:5} players {name:>6}: "
+                    f"median {median * 1e3:8.2f} ms, p95 {p95 * 1e3:8.2f} ms, "
+                    f"{per_call:4.1f} queries"
+                )
+            print(f"{players:5} players: results match {same}")
+    finally:
+        await app.database.disconnect()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--players",
+        type=lambda value: [int(v) for v in value.split(",")],
+        default=[10, 100, 1000],
+    )
+    parser.add_argument("--repeat", type=int, default=20)
+    for key in ("host", "user", "password", "database"):
+        parser.add_argument(f"--db-{key}")
+    parser.add_argument("--db-port", type=int)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,284 @@
+"""Параллельные сделки игроков: потерянные изменения и пропускная способность.
+
+У каждого из --players игроков --concurrency сделок одновременно
+(ответы игрока на вопросы бота обрабатываются параллельно), всего
+--trades сделок на игрока: покупка или продажа 1-3 акций. Сделки
+проводятся прежней последовательностью «прочитать, изменить,
+сохранить» отдельными транзакциями (legacy) и одним запросом
+GameAccessor.execute_trade (atomic). После прогона баланс и портфель
+каждого игрока сверяются с записями exchange: расхождения означают
+потерянные изменения.
+
+Запуск: python -m tests.bench.trade_stress --players 5 --trades 200
+"""
+
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+from itertools import count
+from pathlib import Path
+
+import yaml
+from sqlalchemy import select
+
+from app.game.models import (
+    Exchange,
+    GameModel,
+    GameUser,
+    Session,
+    SessionStock,
+    UserStock,
+)
+from app.user.models import UserModel
+from app.web.app import setup_app
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+INITIAL_CASH = 1_000_000.0
+INITIAL_QUANTITY = 1_000
+
+
+def make_config(args: argparse.Namespace) -> Path:
+    config = yaml.safe_load((BASE_DIR / "etc" / "config.yaml").read_text())
+    config["database"].update(
+        echo=False, pool_size=args.players * args.concurrency, max_overflow=0
+    )
+    for key in ("host", "port", "user", "password", "database"):
+        value = getattr(args, f"db_{key}")
+        if value is not None:
+            config["database"][key] = value
+    path = Path(tempfile.mkdtemp()) / "config.yaml"
+    path.write_text(yaml.safe_dump(config))
+    return path
+
+
+async def save(app, model) -> None:
+    """Запись модели отдельной транзакцией."""
+    async with app.database.session_scope() as session:
+        session.add(model)
+        await session.flush()
+
+
+async def create_players(app, players: int, ids: count) -> list[GameUser]:
+    store = app.store.game
+    game = await store.save_game(
+        GameModel(
+            chat_id=str(-next(ids)), is_active=False, created_at=datetime.now()
+        )
+    )
+    session = await store.save_game_session(Session(game_id=game.id))
+    for stock in app.game.stocks.all():
+        await save(
+            app,
+            SessionStock(
+                session_id=session.id,
+                stock_id=stock.id,
+                price=round(random.uniform(10, 50), 2),
+            ),
+        )
+    game_users = []
+    for _ in range(players):
+        user = await app.store.user.save_user(
+            UserModel(telegram_id=next(ids), first_name="bench")
+        )
+        game_user = await store.save_game_user(
+            GameUser(
+                user_id=user.id, game_id=game.id, cash_balance=INITIAL_CASH
+            )
+        )
+        for stock in app.game.stocks.all():
+            await save(
+                app,
+                UserStock(
+                    user_id=user.id,
+                    game_id=game.id,
+                    stock_id=stock.id,
+                    total_quantity=INITIAL_QUANTITY,
+                ),
+            )
+        game_users.append(game_user)
+    return game_users
+
+
+async def legacy_trade(
+    app, game_user: GameUser, stock_id: int, action: str, quantity: int
+) -> None:
+    """Сделка так, как ее проводил MessageManager до execute_trade:
+    каждое чтение и каждая запись отдельной транзакцией.
+    """
+    store = app.store.game
+    session = await store.find_game_session(game_user.game_id)
+    async with app.database.session_scope() as db_session:
+        price = await db_session.scalar(
+            select(SessionStock.price).filter(
+                SessionStock.session_id == session.id,
+                SessionStock.stock_id == stock_id,
+            )
+        )
+    game_user = await store.find_game_user(
+        game_id=game_user.game_id, user_id=game_user.user_id
+    )
+    user_stock = await store.find_user_stock(
+        game_id=game_user.game_id, user_id=game_user.user_id, stock_id=stock_id
+    )
+    amount = quantity * price
+    if action == app.bot.BUY:
+        if game_user.cash_balance < amount:
+            return
+        game_user.cash_balance = round(game_user.cash_balance - amount, 2)
+        user_stock.total_quantity += quantity
+    else:
+        if user_stock.total_quantity < quantity:
+            return
+        game_user.cash_balance = round(game_user.cash_balance + amount, 2)
+        user_stock.total_quantity -= quantity
+    await store.save_game_user(game_user)
+    await save(app, user_stock)
+    await save(
+        app,
+        Exchange(
+            session_id=session.id,
+            user_id=game_user.user_id,
+            chat_id="bench",
+            action=action,
+            stock_id=stock_id,
+            quantity=quantity,
+            execution_time=datetime.now(),
+        ),
+    )
+
+
+async def atomic_trade(
+    app, game_user: GameUser, stock_id: int, action: str, quantity: int
+) -> None:
+    await app.store.game.execute_trade(
+        game_id=game_user.game_id,
+        user_id=game_user.user_id,
+        stock_id=stock_id,
+        chat_id="bench",
+        action=action,
+        quantity=quantity,
+    )
+
+
+async def run_player(
+    app, trade, game_user: GameUser, args: argparse.Namespace
+) -> int:
+    stocks = [stock.id for stock in app.game.stocks.all()]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    errors = 0
+
+    async def one() -> None:
+        nonlocal errors
+        action = random.choice((app.bot.BUY, app.bot.SELL))
+        async with semaphore:
+            try:
+                await trade(
+                    app,
+                    game_user,
+                    random.choice(stocks),
+                    action,
+                    random.randint(1, 3),
+                )
+            except Exception:
+                errors += 1
+
+    await asyncio.gather(*(one() for _ in range(args.trades)))
+    return errors
+
+
+async def check_player(app, game_user: GameUser) -> tuple[int, float, int]:
+    """Число сделок, расхождение баланса и число акций с расхождением."""
+    store = app.store.game
+    exchanges = [
+        exchange
+        for exchange in await store.find_exchanges(game_user.user_id)
+        if exchange.chat_id == "bench"
+    ]
+    session = await store.find_game_session(game_user.game_id)
+    async with app.database.session_scope() as db_session:
+        prices = dict(
+            (
+                await db_session.execute(
+                    select(SessionStock.stock_id, SessionStock.price).filter(
+                        SessionStock.session_id == session.id
+                    )
+                )
+            ).all()
+        )
+    cash = INITIAL_CASH
+    quantities = Counter()
+    for exchange in exchanges:
+        sign = 1 if exchange.action == app.bot.BUY else -1
+        cash -= sign * exchange.quantity * prices[exchange.stock_id]
+        quantities[exchange.stock_id] += sign * exchange.quantity
+    actual = await store.find_game_user(
+        game_id=game_user.game_id, user_id=game_user.user_id
+    )
+    holdings = await store.find_user_stock_by_user_id(
+        game_id=game_user.game_id, user_id=game_user.user_id
+    )
+    diverged = sum(
+        holding.total_quantity
+        != INITIAL_QUANTITY + quantities[holding.stock_id]
+        for holding in holdings
+    )
+    return len(exchanges), abs(actual.cash_balance - cash), diverged
+
+
+async def run_mode(app, name: str, trade, args, ids: count) -> None:
+    game_users = await create_players(app, args.players, ids)
+    started = time.perf_counter()
+    errors = await asyncio.gather(
+        *(run_player(app, trade, game_user, args) for game_user in game_users)
+    )
+    elapsed = time.perf_counter() - started
+    checks = [await check_player(app, game_user) for game_user in game_users]
+    trades = sum(executed for executed, _, _ in checks)
+    cash_drift = sum(drift for _, drift, _ in checks)
+    diverged = sum(count for _, _, count in checks)
+    print(
+        f"{name:>7}: {args.players * args.trades / elapsed:7.1f} trades/s, "
+        f"{trades} executed, errors {sum(errors)}, "
+        f"cash drift {cash_drift:10.2f}, diverged holdings {diverged}"
+    )
+
+
+async def main(args: argparse.Namespace) -> None:
+    app = setup_app(make_config(args))
+    await app.database.connect()
+    ids = count(int(time.time()) * 1000)
+    print(
+        f"{args.players} players, {args.trades} trades each, "
+        f"{args.concurrency} at once per player"
+    )
+    try:
+        for mode in args.modes:
+            trade = legacy_trade if mode == "legacy" else atomic_trade
+            await run_mode(app, mode, trade, args, ids)
+    finally:
+        await app.database.disconnect()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--players", type=int, default=5)
+    parser.add_argument("--trades", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument(
+        "--modes",
+        type=lambda value: value.split(","),
+        default=["legacy", "atomic"],
+        help="legacy,atomic",
+    )
+    for key in ("host", "user", "password", "database"):
+        parser.add_argument(f"--db-{key}")
+    parser.add_argument("--db-port", type=int)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -1 +1,110 @@
+"""Общие фикстуры тестов.
 
+Тесты с базой получают приложение через фикстуру `db_app`.
+Конфигурация берется из etc/config.yaml, параметры подключения
+переопределяются переменными окружения TEST_DB_HOST, TEST_DB_PORT,
+TEST_DB_USER, TEST_DB_PASSWORD и TEST_DB_DATABASE. Если Postgres
+недоступен, такие тесты пропускаются, иначе база один раз за прогон
+обновляется миграциями до последней версии.
+"""
+
+import asyncio
+import os
+from pathlib import Path
+from types import SimpleNamespace
+
+import asyncpg
+import pytest
+import yaml
+from sqlalchemy import URL
+
+from alembic import command
+from alembic.config import Config as AlembicConfig
+from app.telegram_bot.scheduler import OutboundRequest
+from app.web.app import Application, setup_app
+from app.web.config import DatabaseConfig
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+CONNECT_TIMEOUT = 5
+
+
+@pytest.fixture(scope="session")
+def config_path(tmp_path_factory) -> Path:
+    config = yaml.safe_load((BASE_DIR / "etc" / "config.yaml").read_text())
+    database = config["database"]
+    database["echo"] = False
+    for key in ("host", "port", "user", "password", "database"):
+        value = os.environ.get(f"TEST_DB_{key.upper()}")
+        if value is not None:
+            database[key] = int(value) if key == "port" else value
+    path = tmp_path_factory.mktemp("config") / "config.yaml"
+    path.write_text(yaml.safe_dump(config))
+    return path
+
+
+@pytest.fixture(scope="session")
+def app(config_path) -> Application:
+    # setup_app настраивает общий экземпляр приложения, поэтому
+    # вызывается один раз за прогон.
+    return setup_app(config_path)
+
+
+async def _probe(config: DatabaseConfig) -> None:
+    connection = await asyncpg.connect(
+        host=config.host,
+        port=config.port,
+        user=config.user,
+        password=config.password,
+        database=config.database,
+        timeout=CONNECT_TIMEOUT,
+    )
+    await connection.close()
+
+
+def _alembic_url(config: DatabaseConfig) -> str:
+    # Путь к unix-сокету в строке URL передается параметром host.
+    socket = config.host.startswith("/")
+    url = URL.create(
+        drivername="postgresql+asyncpg",
+        username=config.user,
+        password=config.password,
+        host=None if socket else config.host,
+        port=None if socket else config.port,
+        database=config.database,
+        query={"host": config.host} if socket else {},
+    )
+    return url.render_as_string(hide_password=False)
+
+
+@pytest.fixture(scope="session")
+def migrated_database(app) -> None:
+    config = app.config.database
+    try:
+        asyncio.run(_probe(config))
+    except (OSError, TimeoutError, asyncpg.PostgresError) as e:
+        pytest.skip(f"Postgres is unreachable: {e}")
+    alembic = AlembicConfig()
+    alembic.set_main_option("script_location", str(BASE_DIR / "alembic"))
+    # ConfigParser считает % началом подстановки.
+    alembic.set_main_option(
+        "sqlalchemy.url", _alembic_url(config).replace("%", "%%")
+    )
+    command.upgrade(alembic, "head")
+
+
+@pytest.fixture
+async def db_app(app, migrated_database) -> Application:
+    """Приложение с подключенной базой и загруженными каталогами."""
+    await app.database.connect()
+    yield app
+    await app.database.disconnect()
+
+
+@pytest.fixture
+def submitted(db_app, monkeypatch) -> list[OutboundRequest]:
+    """Запросы, переданные планировщику отправки вместо Bot API."""
+    submitted = []
+    monkeypatch.setattr(
+        db_app.bot.api, "scheduler", SimpleNamespace(submit=submitted.append)
+    )
+    return submitted
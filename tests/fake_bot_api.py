@@ -0,0 +1,285 @@
+"""Локальная замена Telegram Bot API.
+
+Поддерживает getMe, getUpdates (long polling), sendMessage,
+answerCallbackQuery, setWebhook и deleteWebhook. Апдейты добавляются
+через `push_update`: при установленном вебхуке они отправляются боту
+POST-запросом, иначе отдаются через getUpdates.
+
+Задержка ответа (`latency` ± `jitter` секунд) и доля ответов 429
+на отправку (`rate_limit_ratio`) настраиваются в конструкторе.
+`expect_message` и `expect_answer` возвращают future, которые
+завершаются, когда бот отправит подходящий ответ.
+
+Пример:
+    api = FakeBotApi()
+    path = await api.start()  # значение для BotConfig.path
+    api.push_update(api.make_message(chat_id=1, user_id=10, text="/start"))
+"""
+
+import asyncio
+import random
+import time
+from collections import defaultdict
+from collections.abc import Callable
+from itertools import count
+from typing import Any
+
+from aiohttp import ClientSession, web
+
+__all__ = ("FakeBotApi",)
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class FakeBotApi:
+    BOT_USER = {
+        "id": 1,
+        "is_bot": True,
+        "first_name": "Stock Exchange",
+        "username": "stock_exchange_bot",
+    }
+
+    SEND_METHODS = frozenset(("sendmessage", "answercallbackquery"))
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        rate_limit_ratio: float = 0.0,
+        retry_after: int = 1,
+        first_update_id: int = 1,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.rate_limited = 0
+        self.updates: list[dict] = []
+        self.calls: list[tuple[str, dict]] = []
+        self.webhook_url: str | None = None
+        self.secret_token: str | None = None
+        self.webhook_statuses: list[int] = []
+
+        self._update_ids = count(first_update_id)
+        self._message_ids = count(1)
+        self._callback_ids = count(1)
+        self._new_updates = asyncio.Event()
+        self._runner: web.AppRunner | None = None
+        self._session: ClientSession | None = None
+        self._deliveries: set[asyncio.Task] = set()
+        self._message_waiters: dict[
+            int, list[tuple[Callable[[dict], bool], asyncio.Future]]
+        ] = defaultdict(list)
+        self._answer_waiters: dict[str, asyncio.Future] = {}
+
+        self.app = web.Application()
+        self.app.router.add_route("*", "/bot{token}/{method}", self.handle)
+
+    async def start(self) -> str:
+        self._session = ClientSession()
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return f"http://{self.host}:{self.port}/bot"
+
+    async def stop(self) -> None:
+        for task in list(self._deliveries):
+            task.cancel()
+        if self._session:
+            await self._session.close()
+        if self._runner:
+            await self._runner.cleanup()
+
+    def calls_of(self, method: str) -> list[dict]:
+        method = method.lower()
+        return [params for name, params in self.calls if name == method]
+
+    def expect_message(
+        self, chat_id: int, predicate: Callable[[dict], bool]
+    ) -> asyncio.Future:
+        """Future с первым сообщением бота в чат, подходящим под условие."""
+        future = asyncio.get_running_loop().create_future()
+        self._message_waiters[chat_id].append((predicate, future))
+        return future
+
+    def expect_answer(self, callback_query_id: str) -> asyncio.Future:
+        """Future, которая завершится ответом бота на callback-запрос."""
+        future = asyncio.get_running_loop().create_future()
+        self._answer_waiters[callback_query_id] = future
+        return future
+
+    def push_update(self, update: dict) -> dict:
+        update["update_id"] = next(self._update_ids)
+        if self.webhook_url:
+            task = asyncio.create_task(self._deliver(update))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+        else:
+            self.updates.append(update)
+            self._new_updates.set()
+        return update
+
+    async def delivered(self) -> None:
+        """Ожидание завершения отправленных на вебхук обновлений."""
+        await asyncio.gather(*self._deliveries)
+
+    async def _deliver(self, update: dict) -> None:
+        headers = {}
+        if self.secret_token:
+            headers[SECRET_TOKEN_HEADER] = self.secret_token
+        async with self._session.post(
+            self.webhook_url, json=update, headers=headers
+        ) as response:
+            self.webhook_statuses.append(response.status)
+
+    def make_message(
+        self,
+        chat_id: int,
+        user_id: int,
+        text: str,
+        first_name: str = "Player",
+        username: str | None = None,
+        reply_to_message: dict | None = None,
+    ) -> dict:
+        message = {
+            "message_id": next(self._message_ids),
+            "from": self._make_user(user_id, first_name, username),
+            "chat": {"id": chat_id, "type": "group"},
+            "date": int(time.time()),
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [
+                {
+                    "type": "bot_command",
+                    "offset": 0,
+                    "length": len(text.split()[0]),
+                }
+            ]
+        if reply_to_message:
+            message["reply_to_message"] = reply_to_message
+        return {"message": message}
+
+    def make_callback(
+        self,
+        chat_id: int,
+        user_id: int,
+        data: str,
+        first_name: str = "Player",
+        username: str | None = None,
+    ) -> dict:
+        return {
+            "callback_query": {
+                "id": str(next(self._callback_ids)),
+                "from": self._make_user(user_id, first_name, username),
+                "message": {
+                    "message_id": next(self._message_ids),
+                    "from": self.BOT_USER,
+                    "chat": {"id": chat_id, "type": "group"},
+                    "date": int(time.time()),
+                    "text": "",
+                },
+                "chat_instance": str(chat_id),
+                "data": data,
+            }
+        }
+
+    @staticmethod
+    def _make_user(user_id: int, first_name: str, username: str | None) -> dict:
+        user = {"id": user_id, "is_bot": False, "first_name": first_name}
+        if username:
+            user["username"] = username
+        return user
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        params: dict[str, Any] = dict(request.query)
+        if request.can_read_body:
+            params.update(await request.json())
+        self.calls.append((method, params))
+
+        if self.latency or self.jitter:
+            await asyncio.sleep(
+                max(0.0, self.latency + random.uniform(-1, 1) * self.jitter)
+            )
+        if (
+            method in self.SEND_METHODS
+            and self.rate_limit_ratio
+            and random.random() < self.rate_limit_ratio
+        ):
+            self.rate_limited += 1
+            return web.json_response(
+                {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": "Too Many Requests: "
+                    f"retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after},
+                },
+                status=429,
+            )
+
+        handler = getattr(self, f"_method_{method}", None)
+        if handler is None:
+            return web.json_response(
+                {"ok": False, "error_code": 404, "description": "Not Found"},
+                status=404,
+            )
+        return web.json_response({"ok": True, "result": await handler(params)})
+
+    async def _method_getme(self, _: dict) -> dict:
+        return self.BOT_USER
+
+    async def _method_getupdates(self, params: dict) -> list[dict]:
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+        self.updates = [u for u in self.updates if u["update_id"] >= offset]
+        if not self.updates and timeout:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except TimeoutError:
+                return []
+        return self.updates[:limit]
+
+    async def _method_sendmessage(self, params: dict) -> dict:
+        chat_id = int(params["chat_id"])
+        message = {
+            "message_id": next(self._message_ids),
+            "from": self.BOT_USER,
+            "chat": {"id": chat_id, "type": "group"},
+            "date": int(time.time()),
+            "text": params.get("text", ""),
+        }
+        waiters = self._message_waiters.get(chat_id)
+        if waiters:
+            for waiter in list(waiters):
+                predicate, future = waiter
+                if future.done():
+                    waiters.remove(waiter)
+                elif predicate(params):
+                    waiters.remove(waiter)
+                    future.set_result(message)
+        return message
+
+    async def _method_answercallbackquery(self, params: dict) -> bool:
+        future = self._answer_waiters.pop(params["callback_query_id"], None)
+        if future is not None and not future.done():
+            future.set_result(params)
+        return True
+
+    async def _method_setwebhook(self, params: dict) -> bool:
+        self.webhook_url = params.get("url") or None
+        self.secret_token = params.get("secret_token")
+        return True
+
+    async def _method_deletewebhook(self, _: dict) -> bool:
+        self.webhook_url = None
+        return True
@@ -0,0 +1,86 @@
+import asyncio
+import gzip
+from types import SimpleNamespace
+
+import msgspec
+import pytest
+from aiohttp import ClientPayloadError
+from aiohttp.web_middlewares import middleware
+from aiohttp_apispec import setup_aiohttp_apispec, validation_middleware
+
+from app.admin.models import AdminModel
+from app.game.models import Exchange
+from app.game.views import ExchangeExportView
+from app.web.app import Application
+from app.web.config import GameConfig
+from app.web.middlewares import error_handling_middleware
+
+COLUMNS = Exchange.__table__.columns.keys()
+BATCHES = [
+    [(1, 1, 1, "-100", "buy", 1, 2, "2024-01-01T00:00:00")],
+    [(2, 1, 1, "-100", "sell", 1, 1, "2024-01-01T00:00:01")],
+]
+
+
+@middleware
+async def admin_middleware(request, handler):
+    request.admin = AdminModel(id=1, email="admin@admin.com")
+    return await handler(request)
+
+
+@pytest.fixture
+def exchanges() -> SimpleNamespace:
+    """Пачки строк выгрузки и исключение, выбрасываемое после них."""
+    return SimpleNamespace(batches=list(BATCHES), error=None)
+
+
+@pytest.fixture
+async def client(exchanges, aiohttp_client):
+    async def stream_exchanges(batch_size: int):
+        for batch in exchanges.batches:
+            await asyncio.sleep(0)
+            yield batch
+        if exchanges.error is not None:
+            raise exchanges.error
+
+    app = Application()
+    app.config = SimpleNamespace(game=GameConfig())
+    app.store = SimpleNamespace(
+        game=SimpleNamespace(stream_exchanges=stream_exchanges)
+    )
+    app.middlewares.extend(
+        [admin_middleware, error_handling_middleware, validation_middleware]
+    )
+    app.router.add_view("/exchange_logs.export", ExchangeExportView)
+    setup_aiohttp_apispec(app)
+    return await aiohttp_client(app)
+
+
+class TestExchangeExportView:
+    async def test_ndjson(self, client):
+        response = await client.get("/exchange_logs.export")
+
+        assert response.status == 200
+        assert response.content_type == "application/x-ndjson"
+        lines = (await response.read()).splitlines()
+        assert [msgspec.json.decode(line)["id"] for line in lines] == [1, 2]
+
+    async def test_csv_gzip(self, client):
+        response = await client.get(
+            "/exchange_logs.export", params={"format": "csv", "gzip": "true"}
+        )
+
+        assert response.status == 200
+        body = gzip.decompress(await response.read()).decode()
+        assert body.splitlines()[0] == ",".join(COLUMNS)
+        assert len(body.splitlines()) == 3
+
+    async def test_failure_truncates_stream(self, client, exchanges):
+        exchanges.error = RuntimeError("cursor lost")
+        response = await client.get("/exchange_logs.export")
+
+        # Заголовки уже ушли со статусом 200, обрыв тела без
+        # завершающего чанка сообщает клиенту, что выгрузка неполная.
+        assert response.status == 200
+        with pytest.raises(ClientPayloadError):
+            await response.read()
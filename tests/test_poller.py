@@ -0,0 +1,41 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.telegram_bot.decoder import RawUpdate
+from app.telegram_bot.poller import Poller
+from app.telegram_bot.update_queue import UpdateQueue
+from tests.test_tracker import FakeBotStore, make_tracker
+
+
+class FakeApi:
+    """Ответы getUpdates по порядку, затем ожидание остановки."""
+
+    def __init__(self, batches: list[list[int]]) -> None:
+        self.batches = list(batches)
+        self.tracker = make_tracker(FakeBotStore())
+        self.polled = asyncio.Event()
+
+    async def poll(self, limit: int) -> list[RawUpdate]:
+        if not self.batches:
+            self.polled.set()
+            await asyncio.Event().wait()
+        return [RawUpdate(update_id=i) for i in self.batches.pop(0)]
+
+
+async def test_only_accepted_updates_counted():
+    api = FakeApi([[1, 2, 3], [2, 3, 4], [4]])
+    app = SimpleNamespace(
+        bot=SimpleNamespace(api=api),
+        metrics=api.tracker.app.metrics,
+        config=api.tracker.app.config,
+    )
+    queue = UpdateQueue(maxsize=10)
+    poller = Poller(app, queue, [RawUpdate(update_id=0)])
+    await poller.start()
+    await asyncio.wait_for(api.polled.wait(), 1)
+    await poller.stop()
+
+    queued = [queue.get_nowait()[1].update_id for _ in range(queue.qsize())]
+    assert queued == [0, 1, 2, 3, 4]
+    assert app.metrics.counter("bot.updates.received").value == 4
+    assert sorted(api.tracker.app.store.bot.pending) == [1, 2, 3, 4]
@@ -0,0 +1,23 @@
+from argparse import Namespace
+
+from tests.bench.query_plans import explain_calls
+
+
+async def test_no_full_scans(db_app):
+    plans = await explain_calls(
+        db_app, Namespace(games=200, players=3, rounds=3)
+    )
+
+    assert {name for name, _, _ in plans} >= {
+        "find_active_game",
+        "get_exchange_page",
+        "get_standings",
+        "execute_trade buy",
+        "execute_trade sell",
+    }
+    full_scans = {
+        name: (scans, " ".join(statement.split()))
+        for name, statement, scans in plans
+        if scans
+    }
+    assert not full_scans
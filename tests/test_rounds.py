@@ -0,0 +1,141 @@
+import time
+from datetime import datetime
+
+import pytest
+from sqlalchemy import delete, select
+
+from app.game.models import GameModel, GameUser, Session, SessionStock
+from app.telegram_bot.dataclasses import CallbackQuery, From
+
+
+@pytest.fixture
+def chat_id() -> str:
+    return str(-time.time_ns())
+
+
+@pytest.fixture
+def callback(chat_id) -> CallbackQuery:
+    return CallbackQuery(
+        callback_id="1",
+        from_=From(telegram_id=1, first_name="Ann"),
+        chat_id=chat_id,
+    )
+
+
+@pytest.fixture
+async def start_game(db_app, chat_id):
+    """Создание активной игры в чате, игры удаляются после теста."""
+    game_ids = []
+
+    async def start_game() -> GameModel:
+        async with db_app.database.session_scope():
+            game = await db_app.store.game.save_game(
+                GameModel(
+                    chat_id=chat_id, is_active=True, created_at=datetime.now()
+                )
+            )
+        game_ids.append(game.id)
+        return game
+
+    yield start_game
+
+    async with db_app.database.session_scope() as session:
+        await session.execute(
+            delete(GameUser).filter(GameUser.game_id.in_(game_ids))
+        )
+        sessions = select(Session.id).filter(Session.game_id.in_(game_ids))
+        await session.execute(
+            delete(SessionStock).filter(SessionStock.session_id.in_(sessions))
+        )
+        await session.execute(
+            delete(Session).filter(Session.game_id.in_(game_ids))
+        )
+        await session.execute(
+            delete(GameModel).filter(GameModel.id.in_(game_ids))
+        )
+
+
+async def first_round(db_app, callback) -> Session:
+    async with db_app.database.session_scope():
+        return await db_app.bot.msg_manager.start_session(obj_callback=callback)
+
+
+async def is_active(db_app, game_id: int) -> bool:
+    async with db_app.database.session_scope() as session:
+        return await session.scalar(
+            select(GameModel.is_active).filter(GameModel.id == game_id)
+        )
+
+
+async def test_rounds_then_game_over(db_app, callback, start_game, submitted):
+    game = await start_game()
+    game_session = await first_round(db_app, callback)
+    clb_manager = db_app.bot.clb_manager
+
+    for number in range(2, db_app.config.game.rounds + 1):
+        game_session = await clb_manager.finish_round(callback, game_session)
+        assert game_session.number == number
+    assert await clb_manager.finish_round(callback, game_session) is None
+
+    assert not await is_active(db_app, game.id)
+    assert submitted[-1].params["text"] == "Игра окончена. 🤑"
+
+
+async def test_stopped_game_ends_rounds(
+    db_app, callback, start_game, submitted
+):
+    game = await start_game()
+    game_session = await first_round(db_app, callback)
+    async with db_app.database.session_scope():
+        await db_app.game.service.deactivate_game(game)
+    submitted.clear()
+
+    assert (
+        await db_app.bot.clb_manager.finish_round(callback, game_session)
+        is None
+    )
+    assert not submitted
+
+
+async def test_new_game_not_touched_by_old_rounds(
+    db_app, callback, start_game, submitted
+):
+    old_game = await start_game()
+    game_session = await first_round(db_app, callback)
+    async with db_app.database.session_scope():
+        await db_app.game.service.deactivate_game(old_game)
+    new_game = await start_game()
+    submitted.clear()
+
+    assert (
+        await db_app.bot.clb_manager.finish_round(callback, game_session)
+        is None
+    )
+    assert await is_active(db_app, new_game.id)
+    assert not submitted
+
+
+async def test_join_confirmed_in_callback_answer(
+    db_app, callback, start_game, submitted
+):
+    await start_game()
+    callback.data = "Join_the_game"
+    callback.dequeued_at = time.monotonic()
+    clb_manager = db_app.bot.clb_manager
+
+    answers = []
+    for _ in range(2):
+        async with db_app.database.session_scope():
+            await clb_manager.handle_callback_join(callback, player_name="Ann")
+            # Ответ уходит только после фиксации.
+            assert not submitted
+        answers.extend(submitted)
+        submitted.clear()
+
+    assert [answer.method for answer in answers] == ["answerCallbackQuery"] * 2
+    assert all(answer.urgent for answer in answers)
+    assert answers[0].latency_from == callback.dequeued_at
+    # Первое нажатие подтверждается текстом, повторное - пустым ответом.
+    joined = db_app.game.phrases.get("joined_the_game")
+    assert answers[0].params["text"] == f"Ann {joined}"
+    assert "text" not in answers[1].params
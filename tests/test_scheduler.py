@@ -0,0 +1,158 @@
+import asyncio
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from app.telegram_bot.scheduler import (
+    OutboundRequest,
+    OutboundScheduler,
+    TokenBucket,
+)
+from app.web.config import BotConfig
+from app.web.metrics import Metrics
+
+OK = {"ok": True, "result": {}}
+
+
+def rate_limited(retry_after: float) -> dict:
+    return {
+        "ok": False,
+        "error_code": 429,
+        "parameters": {"retry_after": retry_after},
+    }
+
+
+class FakeSend:
+    """Запись отправленных запросов вместо вызова Bot API."""
+
+    def __init__(self, responses: list[dict] | None = None) -> None:
+        self.sent: list[dict] = []
+        self.responses = list(responses or [])
+
+    async def __call__(self, method: str, params: dict) -> dict:
+        self.sent.append(params)
+        await asyncio.sleep(random.uniform(0, 0.002))
+        if self.responses:
+            return self.responses.pop(0)
+        return OK
+
+    def texts(self, chat_id: str | None = None) -> list[str]:
+        return [
+            params["text"]
+            for params in self.sent
+            if chat_id is None or params.get("chat_id") == chat_id
+        ]
+
+
+@pytest.fixture
+def app() -> SimpleNamespace:
+    return SimpleNamespace(
+        metrics=Metrics(),
+        config=SimpleNamespace(
+            bot=BotConfig(
+                path="http://bot/",
+                token="1:test",
+                send_rate=1000,
+                chat_send_rate=1000,
+                chat_send_burst=1000,
+            )
+        ),
+    )
+
+
+def message(chat_id: str | None, text: str, urgent: bool = False):
+    return OutboundRequest(
+        method="sendMessage",
+        params={"chat_id": chat_id, "text": text},
+        chat_id=chat_id,
+        urgent=urgent,
+    )
+
+
+class TestTokenBucket:
+    def test_burst_then_rate(self):
+        bucket = TokenBucket(rate=2, capacity=3)
+        now = bucket.updated_at
+        for _ in range(3):
+            assert bucket.delay(now) == 0
+            bucket.consume(now)
+        assert bucket.delay(now) == pytest.approx(0.5)
+        assert bucket.delay(now + 0.5) == 0
+
+    def test_refill_capped_by_capacity(self):
+        bucket = TokenBucket(rate=10, capacity=2)
+        now = bucket.updated_at
+        bucket.consume(now)
+        bucket.consume(now)
+        assert not bucket.is_full(now)
+        assert bucket.is_full(now + 100)
+        assert bucket.tokens == 2
+
+
+class TestOutboundScheduler:
+    async def test_chat_order_kept(self, app):
+        send = FakeSend()
+        scheduler = OutboundScheduler(app, send)
+        await scheduler.start()
+        for index in range(20):
+            for chat_id in ("a", "b", "c"):
+                scheduler.submit(message(chat_id, f"{chat_id}{index}"))
+        await scheduler.stop()
+
+        for chat_id in ("a", "b", "c"):
+            assert send.texts(chat_id) == [f"{chat_id}{i}" for i in range(20)]
+
+    async def test_urgent_first(self, app):
+        send = FakeSend()
+        scheduler = OutboundScheduler(app, send)
+        for index in range(5):
+            scheduler.submit(message("a", f"a{index}"))
+        scheduler.submit(message("a", "callback", urgent=True))
+        scheduler.submit(message(None, "no chat"))
+        await scheduler.start()
+        await scheduler.stop()
+
+        assert send.texts()[:2] == ["callback", "no chat"]
+        assert send.texts()[2:] == [f"a{i}" for i in range(5)]
+
+    async def test_chat_rate_limit(self, app):
+        app.config.bot.chat_send_rate = 20
+        app.config.bot.chat_send_burst = 1
+        send = FakeSend()
+        scheduler = OutboundScheduler(app, send)
+        await scheduler.start()
+        started = asyncio.get_running_loop().time()
+        for index in range(4):
+            scheduler.submit(message("a", f"a{index}"))
+        await scheduler.stop()
+
+        assert send.texts("a") == [f"a{i}" for i in range(4)]
+        assert asyncio.get_running_loop().time() - started >= 3 / 20
+
+    async def test_retry_after_keeps_order(self, app):
+        send = FakeSend([rate_limited(0.05), rate_limited(0.05)])
+        scheduler = OutboundScheduler(app, send)
+        await scheduler.start()
+        started = asyncio.get_running_loop().time()
+        scheduler.submit(message("a", "first"))
+        scheduler.submit(message("a", "second"))
+        await scheduler.stop()
+
+        assert send.texts() == ["first", "first", "first", "second"]
+        assert asyncio.get_running_loop().time() - started >= 0.1
+        assert app.metrics.counter("bot.outbound.rate_limited").value == 2
+
+    async def test_retry_gives_up_after_max_attempts(self, app):
+        attempts = OutboundScheduler.MAX_ATTEMPTS
+        send = FakeSend([rate_limited(0.01)] * (attempts + 1))
+        scheduler = OutboundScheduler(app, send)
+        await scheduler.start()
+        scheduler.submit(message("a", "dropped"))
+        scheduler.submit(message("a", "next"))
+        await scheduler.stop()
+
+        # После MAX_ATTEMPTS ответов 429 запрос отбрасывается, следующий
+        # запрос чата получает оставшийся ответ 429 и свои повторы.
+        assert send.texts() == ["dropped"] * attempts + ["next", "next"]
+        assert scheduler._pending == 0
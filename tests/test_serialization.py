@@ -0,0 +1,53 @@
+from datetime import datetime
+
+import pytest
+from marshmallow import Schema, fields
+
+from app.game.schemas import ExchangeSchema
+from app.user.models import UserModel
+from app.user.schemas import UserSchema
+from app.web.serialization import compile_dumper
+
+ROW = {
+    "id": 1,
+    "session_id": 2,
+    "chat_id": "-100",
+    "action": "buy",
+    "stock_id": 3,
+    "quantity": 4,
+    "execution_time": datetime(2024, 5, 6, 7, 8, 9, 123456),
+    "user_id": 5,
+    "user_telegram_id": 600,
+    "user_first_name": "Ann",
+    "user_last_name": None,
+    "user_username": "ann",
+    "stock_title": "Apple",
+}
+
+
+class TestCompileDumper:
+    def test_object_matches_schema(self):
+        user = UserModel(id=1, telegram_id=2, first_name="Ann", username=None)
+        assert compile_dumper(UserSchema)(user) == UserSchema().dump(user)
+
+    def test_flat_row_matches_nested_schema(self):
+        nested = {
+            **ROW,
+            "user": {
+                "id": ROW["user_id"],
+                "telegram_id": ROW["user_telegram_id"],
+                "first_name": ROW["user_first_name"],
+                "last_name": ROW["user_last_name"],
+                "username": ROW["user_username"],
+            },
+            "stock": {"id": ROW["stock_id"], "title": ROW["stock_title"]},
+        }
+        dump = compile_dumper(ExchangeSchema, mapping=True)
+        assert dump(ROW) == ExchangeSchema().dump(nested)
+
+    def test_flat_row_rejects_nested_list(self):
+        class ListSchema(Schema):
+            users = fields.Nested(UserSchema, many=True)
+
+        with pytest.raises(ValueError, match="users"):
+            compile_dumper(ListSchema, mapping=True)
@@ -0,0 +1,128 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.telegram_bot.decoder import RawUpdate
+from app.telegram_bot.tracker import UpdateTracker
+from app.web.config import BotConfig
+from app.web.metrics import Metrics
+
+
+class FakeBotStore:
+    """Граница и записанные обновления в памяти вместо базы."""
+
+    def __init__(self) -> None:
+        self.checkpoint: SimpleNamespace | None = None
+        self.pending: dict[int, bytes] = {}
+
+    async def get_checkpoint(self, bot_id: str) -> SimpleNamespace | None:
+        return self.checkpoint
+
+    async def save_checkpoint(
+        self,
+        bot_id: str,
+        update_id: int,
+        processed_ids: list[int],
+        drop_processed: bool = True,
+    ) -> None:
+        self.checkpoint = SimpleNamespace(
+            update_id=update_id, processed_ids=processed_ids
+        )
+        for pending_id in list(self.pending):
+            if pending_id <= update_id or pending_id in processed_ids:
+                del self.pending[pending_id]
+
+    async def get_pending_updates(self, bot_id: str) -> list[bytes]:
+        return [self.pending[i] for i in sorted(self.pending)]
+
+    async def save_pending_updates(
+        self, bot_id: str, updates: list[tuple[int, bytes]]
+    ) -> None:
+        self.pending.update(updates)
+
+
+def make_tracker(store: FakeBotStore) -> UpdateTracker:
+    app = SimpleNamespace(
+        metrics=Metrics(),
+        store=SimpleNamespace(bot=store),
+        config=SimpleNamespace(
+            bot=BotConfig(path="http://bot/", token="1:test", dedup_size=100)
+        ),
+    )
+    return UpdateTracker(app)
+
+
+@pytest.fixture
+def store() -> FakeBotStore:
+    return FakeBotStore()
+
+
+@pytest.fixture
+def tracker(store) -> UpdateTracker:
+    return make_tracker(store)
+
+
+class TestUpdateTracker:
+    def test_watermark_waits_for_lowest_pending(self, tracker):
+        for update_id in (10, 11, 12, 13):
+            assert tracker.accept(update_id)
+
+        tracker.done(12)
+        assert tracker.watermark == 9
+        tracker.done(13)
+        assert tracker.watermark == 9
+        assert tracker.lowest_pending == 10
+
+        tracker.done(10)
+        assert tracker.watermark == 10
+        assert tracker.lowest_pending == 11
+
+        tracker.done(11)
+        assert tracker.watermark == 13
+        assert tracker.lowest_pending is None
+
+    def test_watermark_never_moves_back(self, tracker):
+        tracker.accept(1)
+        tracker.done(1)
+        tracker.accept(5)
+        tracker.accept(3)
+        tracker.done(5)
+        assert tracker.watermark == 2
+        tracker.done(3)
+        assert tracker.watermark == 5
+
+    def test_duplicates_rejected(self, tracker):
+        assert tracker.accept(1)
+        assert not tracker.accept(1)
+        tracker.done(1)
+        assert not tracker.accept(1)
+        assert tracker.app.metrics.counter("bot.updates.duplicate").value == 2
+
+    def test_forget_allows_redelivery(self, tracker):
+        tracker.accept(7)
+        tracker.forget(7)
+        assert tracker.lowest_pending is None
+        assert tracker.accept(7)
+
+    async def test_pending_updates_recovered(self, tracker, store):
+        updates = [RawUpdate(update_id=i) for i in (1, 2, 3, 4)]
+        for update in updates:
+            tracker.accept(update.update_id)
+        await tracker.save_pending(updates)
+        tracker.done(1)
+        tracker.done(3)
+        await tracker.flush()
+
+        # Процесс упал: 2 и 4 подтверждены Telegram, но не обработаны.
+        restarted = make_tracker(store)
+        recovered = await restarted.load()
+
+        assert [update.update_id for update in recovered] == [2, 4]
+        assert restarted.watermark == 1
+        assert not restarted.accept(3)
+        assert not restarted.accept(4)
+        restarted.done(2)
+        restarted.done(4)
+        assert restarted.watermark == 4
+        await restarted.flush()
+        assert not store.pending
@@ -0,0 +1,191 @@
+import asyncio
+import random
+import time
+from collections import Counter
+from datetime import datetime
+
+import pytest
+from sqlalchemy import delete, select
+
+from app.game.models import (
+    Exchange,
+    GameModel,
+    GameUser,
+    Session,
+    SessionStock,
+    UserStock,
+)
+from app.telegram_bot import Bot
+from app.user.models import UserModel
+
+PLAYERS = 3
+TRADES = 60
+CONCURRENCY = 5
+# Денег и акций мало, чтобы часть сделок упиралась в проверки.
+INITIAL_CASH = 200.0
+INITIAL_QUANTITY = 3
+
+
+@pytest.fixture
+async def game(db_app):
+    """Игра с одной сессией и PLAYERS игроками, удаляется после теста."""
+    stocks = [stock.id for stock in db_app.game.stocks.all()]
+    first_id = time.time_ns()
+    async with db_app.database.session_scope() as session:
+        game = GameModel(
+            chat_id=str(-first_id), is_active=True, created_at=datetime.now()
+        )
+        users = [
+            UserModel(telegram_id=first_id + index, first_name="trade")
+            for index in range(PLAYERS)
+        ]
+        session.add(game)
+        session.add_all(users)
+        await session.flush()
+        game_session = Session(game_id=game.id, number=1)
+        session.add(game_session)
+        await session.flush()
+        session.add_all(
+            SessionStock(
+                session_id=game_session.id,
+                stock_id=stock_id,
+                price=round(random.uniform(10, 50), 2),
+            )
+            for stock_id in stocks
+        )
+        session.add_all(
+            GameUser(
+                game_id=game.id, user_id=user.id, cash_balance=INITIAL_CASH
+            )
+            for user in users
+        )
+        session.add_all(
+            UserStock(
+                game_id=game.id,
+                user_id=user.id,
+                stock_id=stock_id,
+                total_quantity=INITIAL_QUANTITY,
+            )
+            for user in users
+            for stock_id in stocks
+        )
+    yield game, game_session, [user.id for user in users], stocks
+
+    user_ids = [user.id for user in users]
+    async with db_app.database.session_scope() as session:
+        for statement in (
+            delete(Exchange).filter(Exchange.session_id == game_session.id),
+            delete(UserStock).filter(UserStock.game_id == game.id),
+            delete(GameUser).filter(GameUser.game_id == game.id),
+            delete(SessionStock).filter(
+                SessionStock.session_id == game_session.id
+            ),
+            delete(Session).filter(Session.game_id == game.id),
+            delete(GameModel).filter(GameModel.id == game.id),
+            delete(UserModel).filter(UserModel.id.in_(user_ids)),
+        ):
+            await session.execute(statement)
+
+
+async def test_parallel_trades_keep_accounts_consistent(db_app, game):
+    game_model, game_session, user_ids, stocks = game
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def trade(user_id: int):
+        async with semaphore:
+            return await db_app.store.game.execute_trade(
+                game_id=game_model.id,
+                user_id=user_id,
+                stock_id=random.choice(stocks),
+                chat_id=game_model.chat_id,
+                action=random.choice((Bot.BUY, Bot.SELL)),
+                quantity=random.randint(1, 3),
+            )
+
+    results = await asyncio.gather(
+        *(trade(user_id) for user_id in user_ids for _ in range(TRADES))
+    )
+    executed = sum(result.executed for result in results)
+    assert 0 < executed < len(results)
+
+    async with db_app.database.session_scope() as session:
+        prices = dict(
+            (
+                await session.execute(
+                    select(SessionStock.stock_id, SessionStock.price).filter(
+                        SessionStock.session_id == game_session.id
+                    )
+                )
+            ).all()
+        )
+        exchanges = (
+            await session.scalars(
+                select(Exchange).filter(Exchange.session_id == game_session.id)
+            )
+        ).all()
+        balances = dict(
+            (
+                await session.execute(
+                    select(GameUser.user_id, GameUser.cash_balance).filter(
+                        GameUser.game_id == game_model.id
+                    )
+                )
+            ).all()
+        )
+        holdings = {
+            (user_id, stock_id): quantity
+            for user_id, stock_id, quantity in await session.execute(
+                select(
+                    UserStock.user_id,
+                    UserStock.stock_id,
+                    UserStock.total_quantity,
+                ).filter(UserStock.game_id == game_model.id)
+            )
+        }
+
+    assert len(exchanges) == executed
+    assert min(balances.values()) >= 0
+    assert min(holdings.values()) >= 0
+
+    # Баланс и портфель сходятся с журналом сделок: ни одно изменение
+    # не потеряно при параллельных сделках игрока.
+    cash = dict.fromkeys(user_ids, INITIAL_CASH)
+    quantities = Counter()
+    for exchange in exchanges:
+        sign = 1 if exchange.action == Bot.BUY else -1
+        cash[exchange.user_id] -= (
+            sign * exchange.quantity * prices[exchange.stock_id]
+        )
+        quantities[exchange.user_id, exchange.stock_id] += (
+            sign * exchange.quantity
+        )
+    for user_id in user_ids:
+        assert balances[user_id] == pytest.approx(cash[user_id], abs=0.01)
+        for stock_id in stocks:
+            assert (
+                holdings[user_id, stock_id]
+                == INITIAL_QUANTITY + quantities[user_id, stock_id]
+            )
+
+
+@pytest.mark.parametrize(
+    ("action", "quantity"),
+    [(Bot.BUY, 1000), (Bot.SELL, INITIAL_QUANTITY + 1)],
+)
+async def test_trade_rejected_without_funds(db_app, game, action, quantity):
+    game_model, _, user_ids, stocks = game
+
+    trade = await db_app.store.game.execute_trade(
+        game_id=game_model.id,
+        user_id=user_ids[0],
+        stock_id=stocks[0],
+        chat_id=game_model.chat_id,
+        action=action,
+        quantity=quantity,
+    )
+
+    assert not trade.executed
+    game_user = await db_app.store.game.find_game_user(
+        game_id=game_model.id, user_id=user_ids[0]
+    )
+    assert game_user.cash_balance == INITIAL_CASH
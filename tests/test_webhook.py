@@ -0,0 +1,105 @@
+from types import SimpleNamespace
+
+import pytest
+from aiohttp import ClientSession
+
+from app.telegram_bot.accessor import TelegramApiAccessor
+from app.telegram_bot.views import WebhookView
+from app.web.app import Application
+from app.web.config import BotConfig
+from app.web.metrics import Metrics
+from app.web.middlewares import error_handling_middleware
+from tests.fake_bot_api import FakeBotApi
+
+SECRET = "s3cret"
+
+
+@pytest.fixture
+async def fake_api():
+    api = FakeBotApi()
+    path = await api.start()
+    yield api, path
+    await api.stop()
+
+
+@pytest.fixture
+async def bot_app(fake_api, aiohttp_server):
+    """Приложение с одним маршрутом вебхука и очередью на одно обновление.
+
+    Обработчик не запускается, поэтому принятые обновления остаются
+    в очереди. Вебхук регистрируется в FakeBotApi через setWebhook.
+    """
+    _, path = fake_api
+    app = Application()
+    app.config = SimpleNamespace(
+        bot=BotConfig(
+            path=path,
+            token="1:test",
+            mode=BotConfig.WEBHOOK,
+            secret_token=SECRET,
+            queue_size=1,
+        )
+    )
+    app.metrics = Metrics()
+    app.bot = SimpleNamespace(api=TelegramApiAccessor(app))
+    app.on_startup.clear()
+    app.on_cleanup.clear()
+    app.middlewares.append(error_handling_middleware)
+    app.router.add_view(app.config.bot.webhook_path, WebhookView)
+    server = await aiohttp_server(app)
+
+    accessor = app.bot.api
+    accessor.session = ClientSession()
+    app.config.bot.webhook_url = str(
+        server.make_url(app.config.bot.webhook_path)
+    )
+    await accessor.set_webhook()
+    yield app
+    await accessor.session.close()
+
+
+def push_message(api: FakeBotApi) -> dict:
+    return api.push_update(api.make_message(chat_id=1, user_id=2, text="hi"))
+
+
+class TestWebhookView:
+    async def test_webhook_registered(self, fake_api, bot_app):
+        api, _ = fake_api
+        assert api.webhook_url == bot_app.config.bot.webhook_url
+        assert api.secret_token == SECRET
+
+    async def test_update_accepted(self, fake_api, bot_app):
+        api, _ = fake_api
+        update = push_message(api)
+        await api.delivered()
+
+        assert api.webhook_statuses == [200]
+        _, queued = bot_app.bot.api.queue.get_nowait()
+        assert queued.update_id == update["update_id"]
+        assert bot_app.metrics.counter("bot.updates.received").value == 1
+
+    @pytest.mark.parametrize("secret_token", ["wrong", None])
+    async def test_invalid_secret_rejected(
+        self, fake_api, bot_app, secret_token
+    ):
+        api, _ = fake_api
+        api.secret_token = secret_token
+        push_message(api)
+        await api.delivered()
+
+        assert api.webhook_statuses == [403]
+        assert bot_app.bot.api.queue.empty()
+        assert bot_app.bot.api.tracker.lowest_pending is None
+
+    async def test_full_queue_rejected(self, fake_api, bot_app):
+        api, _ = fake_api
+        push_message(api)
+        await api.delivered()
+        rejected = push_message(api)
+        await api.delivered()
+
+        assert api.webhook_statuses == [200, 503]
+        assert bot_app.metrics.counter("bot.updates.rejected").value == 1
+        # Telegram доставит отклоненное обновление повторно, оно не должно
+        # считаться уже принятым.
+        assert bot_app.bot.api.tracker.accept(rejected["update_id"])
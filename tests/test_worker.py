@@ -0,0 +1,139 @@
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import delete
+
+from app.telegram_bot.dataclasses import Message
+from app.telegram_bot.decoder import (
+    RawCallbackQuery,
+    RawChat,
+    RawMessage,
+    RawUpdate,
+    RawUser,
+)
+from app.telegram_bot.models import ProcessedUpdate
+from app.telegram_bot.worker import Worker
+
+
+@pytest.fixture
+async def worker(db_app):
+    worker = Worker(db_app, db_app.bot.api.queue, 1, on_done=lambda _: None)
+    yield worker
+    async with db_app.database.session_scope() as session:
+        await session.execute(
+            delete(ProcessedUpdate).filter(
+                ProcessedUpdate.bot_id == db_app.config.bot.bot_id
+            )
+        )
+
+
+@pytest.fixture
+def handled(db_app, monkeypatch, submitted) -> list[int]:
+    """Обновления, дошедшие до обработчика сообщений. Обработчик
+    отвечает в чат, а на текст "fail" падает после ответа.
+    """
+    handled = []
+
+    async def handle_update_message(update):
+        message = update.object.message
+        handled.append(update.update_id)
+        await db_app.bot.api.send_message(
+            Message(chat_id=message.chat_id, text=message.text)
+        )
+        assert not submitted
+        if message.text == "fail":
+            raise RuntimeError("handler failed")
+
+    monkeypatch.setattr(
+        db_app.bot.msg_manager, "handle_update_message", handle_update_message
+    )
+    return handled
+
+
+def make_update(text: str) -> RawUpdate:
+    return RawUpdate(
+        update_id=time.time_ns(),
+        message=RawMessage(
+            message_id=1,
+            from_=RawUser(id=1, first_name="Ann"),
+            chat=RawChat(id=-1),
+            date=0,
+            text=text,
+        ),
+    )
+
+
+async def test_replayed_update_skipped(db_app, worker, handled, submitted):
+    update = make_update("/buy")
+
+    await worker.handle_update(update)
+    await worker.handle_update(update)
+
+    assert handled == [update.update_id]
+    assert [request.params["text"] for request in submitted] == ["/buy"]
+    assert db_app.metrics.counter("bot.updates.replayed").value == 1
+
+
+async def test_failed_update_not_marked(worker, handled, submitted):
+    update = make_update("fail")
+
+    with pytest.raises(RuntimeError):
+        await worker.handle_update(update)
+    with pytest.raises(RuntimeError):
+        await worker.handle_update(update)
+
+    assert handled == [update.update_id, update.update_id]
+    # Ответы откаченной единицы работы не отправляются.
+    assert not submitted
+
+
+@pytest.mark.parametrize(
+    "update",
+    [
+        RawUpdate(
+            update_id=1,
+            message=RawMessage(
+                message_id=1, chat=RawChat(id=-1), date=0, text="/buy"
+            ),
+        ),
+        RawUpdate(
+            update_id=1,
+            callback_query=RawCallbackQuery(
+                id="1", from_=RawUser(id=1, first_name="Ann")
+            ),
+        ),
+    ],
+    ids=["message_without_sender", "inline_callback"],
+)
+async def test_unsupported_update_skipped(db_app, worker, handled, update):
+    unsupported = db_app.metrics.counter("bot.updates.unsupported")
+    before = unsupported.value
+
+    await worker.handle_update(update)
+
+    assert not handled
+    assert unsupported.value == before + 1
+    async with db_app.database.session_scope():
+        # Пропуск не оставляет отметки об обработке.
+        assert await db_app.store.bot.mark_processed(
+            db_app.config.bot.bot_id, update.update_id
+        )
+
+
+async def test_lane_job_runs_after_chat_updates(db_app, worker, handled):
+    updates = [make_update("/buy"), make_update("/sell")]
+    await worker.start()
+    for update in updates:
+        await worker.queue.put(update)
+    while not worker.queue.empty():
+        await asyncio.sleep(0)
+
+    async def job() -> list[int]:
+        await asyncio.sleep(0)
+        return list(handled)
+
+    assert await worker.run_in_lane("-1", job) == [
+        update.update_id for update in updates
+    ]
+    await worker.stop()